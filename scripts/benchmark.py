@@ -0,0 +1,72 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src"))
+
+from tetris_rl.benchmark import run_suite, compare, save_report, load_report
+
+DEFAULT_BASELINE = project_root / "benchmark_baseline.json"
+
+
+# runs the benchmark suite, writes the JSON report and compares it with the baseline
+# exits with 1 if the engines disagree, a metric regressed past the tolerance or there
+# is no baseline to compare against (unless --no-baseline skips the comparison)
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the engines, features, agent and replay buffer")
+    parser.add_argument("--output", help="write the JSON report here (default: print it)")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="baseline report to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--no-baseline", action="store_true",
+                        help="skip the regression check (a missing baseline is an error otherwise)")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown (default 0.2)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--quick", action="store_true", help="small corpora, for a smoke run")
+    parser.add_argument("--repeats", type=int, default=3, help="keep the best of this many runs per benchmark")
+    args = parser.parse_args()
+
+    report = run_suite(seed=args.seed, quick=args.quick, repeats=args.repeats)
+
+    if args.output:
+        save_report(report, args.output)
+    else:
+        print(json.dumps(report, indent=2))
+
+    failed = False
+    parity = report['parity']
+    if parity['mismatches']:
+        failed = True
+        print(f"PARITY: {len(parity['mismatches'])} mismatches between {', '.join(parity['engines'])}",
+              file=sys.stderr)
+        for mismatch in parity['mismatches'][:20]:
+            print(f"  {mismatch}", file=sys.stderr)
+    else:
+        print(f"PARITY: {', '.join(parity['engines'])} agree on {parity['positions']} positions",
+              file=sys.stderr)
+
+    if args.save_baseline:
+        save_report(report, args.baseline)
+        print(f"Saved baseline to {args.baseline}", file=sys.stderr)
+    elif args.no_baseline:
+        print("Regression check skipped (--no-baseline)", file=sys.stderr)
+    elif Path(args.baseline).exists():
+        regressions = compare(report, load_report(args.baseline), args.tolerance)
+        for name, metric, base, value in regressions:
+            print(f"REGRESSION: {name} {metric}: {base:.1f} -> {value:.1f}", file=sys.stderr)
+        if regressions:
+            failed = True
+        else:
+            print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})", file=sys.stderr)
+    else:
+        # without a baseline nothing can be reported as a regression, so the gate must not pass
+        failed = True
+        print(f"NO BASELINE: {args.baseline} does not exist, run with --save-baseline first "
+              f"(or --no-baseline to skip the regression check)", file=sys.stderr)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+import numpy as np
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src"))
+
+from tetris_rl.engines import ENGINE_NAMES
+from tetris_rl.evaluation import evaluate, evaluate_linear, format_summary
+
+# greedy evaluation of a saved policy on seeded games, see tetris_rl/evaluation.py
+#   python scripts/evaluate.py --agent tabular --policy tabular.npy --episodes 500 --workers 4
+#   python scripts/evaluate.py --agent tabular --policy tabular.npy --depth 2 --beam-width 4 --time-budget 0.05
+#   python scripts/evaluate.py --agent linear --weights -0.51 -0.36 -0.18 0 --episodes 1000 --workers 4
+#   python scripts/evaluate.py --agent linear --policy linear.npy --depth 2
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate a trained Tetris policy")
+    # training.AGENT_NAMES, not imported so evaluating a .npz DQN policy never loads torch
+    # 'linear' at depth 1 plays whole games inside the C++ engine, see engines.rollout_linear
+    parser.add_argument("--agent", choices=("tabular", "dqn", "linear"), required=True)
+    parser.add_argument("--weights", type=float, nargs="+",
+                        help="linear policy: agg_height, holes, bumpiness, max_height weights [, reward weight]")
+    parser.add_argument("--policy", help="file written by --save (omit for an untrained policy), .npz for a torch-free DQN, "
+                                         ".npy weights for a linear policy")
+    parser.add_argument("--engine", choices=ENGINE_NAMES, default="bitboard")
+    parser.add_argument("--episodes", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0, help="episode i plays the pieces of seed + i")
+    parser.add_argument("--workers", type=int, default=1, help="evaluation processes")
+    parser.add_argument("--max-pieces", type=int, default=5000, help="placements before a game is cut off")
+    parser.add_argument("--hidden-layer-size", type=int, default=64)
+    parser.add_argument("--depth", type=int, default=1, help="pieces the lookahead planner looks at (1: greedy)")
+    parser.add_argument("--beam-width", type=int, default=4, help="afterstates the planner expands per board and piece")
+    parser.add_argument("--time-budget", type=float, help="planner seconds per move")
+    parser.add_argument("--output", help="write the summary and the per-episode results to this JSON file")
+    args = parser.parse_args()
+
+    if args.agent == "linear" and args.depth <= 1:
+        if args.weights is None and args.policy is None:
+            parser.error("--agent linear needs --weights or --policy")
+        weights = args.weights if args.weights is not None else np.load(args.policy)
+        # the C++ engine plays the games, the workers are its OpenMP threads
+        results = evaluate_linear(weights, episodes=args.episodes, seed=args.seed,
+                                  max_pieces=args.max_pieces, threads=args.workers)
+    else:
+        if args.agent == "linear" and args.policy is None:
+            parser.error("--agent linear with --depth > 1 needs --policy")
+        results = evaluate(args.agent, args.policy, engine_name=args.engine, episodes=args.episodes,
+                           seed=args.seed, workers=args.workers, max_pieces=args.max_pieces,
+                           hidden_layer_size=args.hidden_layer_size, depth=args.depth,
+                           beam_width=args.beam_width, time_budget=args.time_budget)
+    print(format_summary(results))
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote the results to {args.output}.")
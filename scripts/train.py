@@ -0,0 +1,45 @@
+import argparse
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src"))
+
+from tetris_rl.engines import ENGINE_NAMES
+from tetris_rl.training import AGENT_NAMES, train
+
+# one entry point for every engine/agent combination, see tetris_rl/training.py
+#   python scripts/train.py --engine cpp --agent dqn --learn-every 4 --batch-size 256
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train a Tetris agent")
+    parser.add_argument("--engine", choices=ENGINE_NAMES, default="bitboard")
+    parser.add_argument("--agent", choices=AGENT_NAMES, default="dqn")
+    parser.add_argument("--episodes", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--queue-len", type=int, default=100000, help="replay buffer capacity")
+    parser.add_argument("--hidden-layer-size", type=int, default=64)
+    parser.add_argument("--learn-every", type=int, default=1, help="learn after every k placements")
+    parser.add_argument("--gradient-steps", type=int, default=1, help="gradient steps per learn")
+    parser.add_argument("--warmup", type=int, default=0, help="buffer size before learning starts")
+    parser.add_argument("--prioritized", action="store_true", help="prioritized replay (sum tree, TD error priorities)")
+    parser.add_argument("--cache-size", type=int, default=0,
+                        help="LRU cache entries for candidate features and values (0 turns caching off)")
+    parser.add_argument("--max-pieces", type=int,
+                        help="placements before a game is cut off (default: 5000 for dqn, no limit for tabular)")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--checkpoint-dir", help="save checkpoints (and the memory-mapped replay buffer) here")
+    parser.add_argument("--checkpoint-every", type=int, default=100, help="episodes between checkpoints")
+    parser.add_argument("--resume", action="store_true", help="continue from the checkpoint in --checkpoint-dir")
+    parser.add_argument("--save", help="write the trained policy here (.npy table / .pt or torch-free .npz weights)")
+    parser.add_argument("--log", help="stream telemetry to this .jsonl or .csv file")
+    parser.add_argument("--no-profile", action="store_true", help="turn the phase timers off")
+    args = parser.parse_args()
+
+    train(engine_name=args.engine, agent_name=args.agent, episodes=args.episodes,
+          batch_size=args.batch_size, queue_len=args.queue_len,
+          hidden_layer_size=args.hidden_layer_size, learn_every=args.learn_every,
+          gradient_steps=args.gradient_steps, warmup=args.warmup, max_pieces=args.max_pieces,
+          profile=not args.no_profile, log_path=args.log, seed=args.seed,
+          checkpoint_dir=args.checkpoint_dir, checkpoint_every=args.checkpoint_every,
+          resume=args.resume, save_path=args.save, prioritized=args.prioritized,
+          cache_size=args.cache_size)
@@ -0,0 +1,35 @@
+import argparse
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src"))
+
+from tetris_rl.cem import OBJECTIVES, train_cem
+from tetris_rl.engines import ENGINE_NAMES
+
+# cross-entropy method for a linear policy over the four board features, see tetris_rl/cem.py
+#   python scripts/train_cem.py --engine cpp --generations 30 --population 50 --games 5 --save linear.npy
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune a linear Tetris policy with the cross-entropy method")
+    parser.add_argument("--engine", choices=ENGINE_NAMES, default="cpp")
+    parser.add_argument("--generations", type=int, default=30)
+    parser.add_argument("--population", type=int, default=50)
+    parser.add_argument("--elite-frac", type=float, default=0.2)
+    parser.add_argument("--games", type=int, default=5, help="games per policy and generation")
+    parser.add_argument("--max-pieces", type=int, default=2000, help="placements before a game is cut off")
+    parser.add_argument("--init-std", type=float, default=1.0)
+    parser.add_argument("--noise", type=float, default=0.5, help="variance added after every refit")
+    parser.add_argument("--noise-decay", type=float, default=0.9, help="per-generation decay of --noise")
+    parser.add_argument("--learn-reward", action="store_true", help="also tune the weight of the reward")
+    parser.add_argument("--objective", choices=OBJECTIVES, default="score")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=0, help="threads (cpp) or processes, 0 for all cores")
+    parser.add_argument("--save", help="write the final weights here (.npy)")
+    args = parser.parse_args()
+
+    train_cem(engine_name=args.engine, generations=args.generations, population=args.population,
+              elite_frac=args.elite_frac, games=args.games, max_pieces=args.max_pieces,
+              init_std=args.init_std, noise=args.noise, noise_decay=args.noise_decay,
+              learn_reward=args.learn_reward, objective=args.objective, seed=args.seed,
+              workers=args.workers, save_path=args.save)
@@ -0,0 +1,42 @@
+import argparse
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src"))
+
+from tetris_rl.actor_learner import train_dqn_parallel
+from tetris_rl.engines import ENGINE_NAMES
+
+# DQN training with several actor processes feeding one learner
+# see tetris_rl/actor_learner.py for the options (actors, weight sync, per-actor epsilon)
+#   python scripts/train_dqn_parallel.py --actors 4 --engine cpp --weight-sync 100 --epsilons 0.4 0.1 0.02 0.005
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the DQN agent with K actor processes and one learner")
+    parser.add_argument("--actors", type=int, default=4)
+    parser.add_argument("--engine", choices=ENGINE_NAMES, default="bitboard")
+    parser.add_argument("--episodes", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--queue-len", type=int, default=100000, help="replay buffer capacity")
+    parser.add_argument("--hidden-layer-size", type=int, default=64)
+    parser.add_argument("--weight-sync", type=int, default=100, help="learn steps between weight publishes")
+    parser.add_argument("--weight-poll", type=int, default=50, help="placements between actor weight checks")
+    parser.add_argument("--epsilons", type=float, nargs="+",
+                        help="one exploration rate per actor (default: Ape-X style spread)")
+    parser.add_argument("--warmup", type=int, default=1000, help="buffer size before learning starts")
+    parser.add_argument("--learn-every", type=int, default=1, help="learn after every k transitions from the actors")
+    parser.add_argument("--gradient-steps", type=int, default=1, help="gradient steps per learn")
+    parser.add_argument("--cache-size", type=int, default=0,
+                        help="LRU cache entries for the actors' candidate features and values (0 turns caching off)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.epsilons is not None and len(args.epsilons) != args.actors:
+        parser.error("--epsilons needs one value per actor")
+
+    train_dqn_parallel(num_actors=args.actors, engine_name=args.engine, batch_size=args.batch_size,
+                       queue_len=args.queue_len, hidden_layer_size=args.hidden_layer_size,
+                       episodes=args.episodes, weight_sync_freq=args.weight_sync,
+                       weight_poll_freq=args.weight_poll, epsilons=args.epsilons,
+                       warmup=args.warmup, learn_every=args.learn_every,
+                       gradient_steps=args.gradient_steps, cache_size=args.cache_size, seed=args.seed)
@@ -1,3 +1,4 @@
+import argparse
 import sys
 from pathlib import Path
 
@@ -5,56 +6,21 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root / "src"))
 
-from tetris_rl.environment import TetrisEngine
-from tetris_rl.agents.tabular import TabularAgent
-from tetris_rl.features import get_features
+from tetris_rl.training import train as run_training
 
-def train(episodes=10000):
-    env = TetrisEngine()
-    agent = TabularAgent()
-
-    print("Starting to train the tabular agent...")
-    print(f"{episodes} episodes.")
-    # rolling window to see learning trend despite variance
-    score_window = []
-
-    for episode in range(episodes):
-        board = env.reset()
-        game_over = False
-        current_features = get_features(board)
-
-        while not game_over:
-            # state *before* we take the action (needed for correct TD update)
-            state_before = get_features(env.board)
-
-            # get all possible moves
-            possible_moves = env.get_next_states()
-
-            # if there are no possible moves game is over
-            if not possible_moves:
-                break
-
-            best_action = agent.select_action(possible_moves)
-            reward, game_over = env.step(best_action)
-
-            # state we landed in (for TD bootstrap)
-            state_after = get_features(env.board)
-            agent.update(state_before, reward, state_after, game_over)
-            current_features = state_after
-
-            
-
-        score_window.append(env.score)
-        if len(score_window) > 100:
-            score_window.pop(0)
-
-        # decay exploration and learning rate over time
-        agent.epsilon = max(0.02, agent.epsilon * 0.9997)
-        agent.learning_rate = max(0.02, agent.learning_rate * 0.99995)
-
-        if (episode + 1) % 100 == 0:
-            avg = sum(score_window) / len(score_window)
-            print(f"Episode: {episode + 1} | Score: {env.score} | Avg100: {avg:.1f} | Epsilon: {agent.epsilon:.3f} | LR: {agent.learning_rate:.4f} | States: {len(agent.q_table)}")
+# tabular agent on the bitboard engine (same interface as environment.TetrisEngine,
+# about 4-5x faster here since the tabular agent needs every candidate board,
+# see scripts/benchmark.py)
+# same loop as scripts/train.py, see tetris_rl/training.py for all the options
+def train(episodes=10000, profile=True, log_path=None, **options):
+    return run_training(engine_name='bitboard', agent_name='tabular', episodes=episodes,
+                 profile=profile, log_path=log_path, **options)
 
 if __name__ == "__main__":
-    train()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--episodes", type=int, default=10000)
+    parser.add_argument("--log", help="stream telemetry to this .jsonl or .csv file")
+    parser.add_argument("--no-profile", action="store_true", help="turn the phase timers off")
+    args = parser.parse_args()
+
+    train(episodes=args.episodes, profile=not args.no_profile, log_path=args.log)
@@ -0,0 +1,39 @@
+import argparse
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root / "src"))
+
+from tetris_rl.engines import ENGINE_NAMES
+from tetris_rl.hogwild import DEFAULT_SCHEDULE, train_tabular_parallel
+
+# tabular agent with K worker processes updating one shared value table
+# see tetris_rl/hogwild.py for the lock-free and the averaging mode
+#   python scripts/train_tabular_parallel.py --workers 4 --epsilons 0.5 0.3 0.1 0.05
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--engine", choices=ENGINE_NAMES, default="bitboard")
+    parser.add_argument("--episodes", type=int, default=10000, help="total over all workers")
+    parser.add_argument("--epsilons", type=float, nargs="+", help="start epsilon of every worker")
+    parser.add_argument("--average-every", type=int,
+                        help="average private tables every k episodes instead of sharing one (reproducible)")
+    parser.add_argument("--cache-size", type=int, default=0,
+                        help="LRU cache entries for candidate features (0 turns caching off)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="write the trained value table here (.npy)")
+    args = parser.parse_args()
+
+    schedules = None
+    if args.epsilons is not None:
+        _, decay, epsilon_min = DEFAULT_SCHEDULE
+        schedules = [(epsilon, decay, epsilon_min) for epsilon in args.epsilons]
+
+    agent = train_tabular_parallel(num_workers=args.workers, engine_name=args.engine,
+                                   episodes=args.episodes, schedules=schedules,
+                                   average_every=args.average_every, cache_size=args.cache_size,
+                                   seed=args.seed)
+    if args.save is not None:
+        agent.save(args.save)
+        print(f"Saved the trained value table to {args.save}.")
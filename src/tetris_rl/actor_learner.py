@@ -0,0 +1,285 @@
+import multiprocessing as mp
+import queue
+import random
+import time
+from collections import deque
+import numpy as np
+import torch
+from torch.nn.utils import parameters_to_vector, vector_to_parameters
+from tetris_rl.agents.dqn import DQNAgent
+from tetris_rl.engines import make_engine
+from tetris_rl.features import get_features
+from tetris_rl.models.dqn import INPUT_SIZE
+
+# multi-process DQN training:
+#   - K actor processes each run their own engine and a copy of the model, and
+#     write their transitions into a shared memory ring buffer
+#   - the learner (the main process) owns the DQNAgent, drains the rings into its
+#     replay buffer, runs the gradient steps and publishes new weights
+# nothing is pickled per transition and no locks are taken on the hot path
+
+MAX_PIECES_IN_GAME = 5000
+
+
+# ring of transitions written by one actor and read by the learner
+# single producer / single consumer: the actor fills a slot and then bumps the
+# write counter, the learner only reads slots below the counter it saw
+class SharedTransitions:
+    def __init__(self, ctx, capacity):
+        self.capacity = capacity
+        self.shared = {
+            'states': ctx.RawArray('f', capacity * INPUT_SIZE),
+            'rewards': ctx.RawArray('f', capacity),
+            'next_states': ctx.RawArray('f', capacity * INPUT_SIZE),
+            'game_overs': ctx.RawArray('b', capacity),
+        }
+        self.written = ctx.RawValue('q', 0)
+        self.read = 0
+        self.attach()
+
+    # builds numpy views on the shared arrays (has to run again after pickling)
+    def attach(self):
+        self.states = np.frombuffer(self.shared['states'], dtype=np.float32).reshape(self.capacity, INPUT_SIZE)
+        self.rewards = np.frombuffer(self.shared['rewards'], dtype=np.float32)
+        self.next_states = np.frombuffer(self.shared['next_states'], dtype=np.float32).reshape(self.capacity, INPUT_SIZE)
+        self.game_overs = np.frombuffer(self.shared['game_overs'], dtype=np.int8)
+
+    def __getstate__(self):
+        return {'capacity': self.capacity, 'shared': self.shared, 'written': self.written, 'read': self.read}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.attach()
+
+    # actor side: store one transition
+    def put(self, state, reward, next_state, game_over):
+        n = self.written.value
+        i = n % self.capacity
+        self.states[i] = state
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.game_overs[i] = game_over
+        self.written.value = n + 1
+
+    # learner side: copy out every transition written since the last call
+    # if the actor lapped the learner the oldest unread transitions are dropped
+    def drain(self):
+        written = self.written.value
+        start = max(self.read, written - self.capacity)
+        self.read = written
+        if start == written:
+            return None
+
+        idx = np.arange(start, written) % self.capacity
+        return (self.states[idx], self.rewards[idx], self.next_states[idx],
+                self.game_overs[idx].astype(bool))
+
+
+# model weights shared with the actors as one flat float array
+# a seqlock keeps readers from seeing a half written copy: the version is odd
+# while the learner writes and readers retry if it changed during their copy
+class SharedWeights:
+    def __init__(self, ctx, num_params):
+        self.shared = ctx.RawArray('f', num_params)
+        self.version = ctx.RawValue('q', 0)
+        self.attach()
+
+    def attach(self):
+        self.weights = np.frombuffer(self.shared, dtype=np.float32)
+
+    def __getstate__(self):
+        return {'shared': self.shared, 'version': self.version}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.attach()
+
+    # learner side: copy the model parameters into shared memory
+    def publish(self, model):
+        self.version.value += 1
+        self.weights[:] = parameters_to_vector(model.parameters()).detach().numpy()
+        self.version.value += 1
+
+    # actor side: load the weights if they changed since `seen`, returns the loaded version
+    def load_into(self, model, seen):
+        while True:
+            before = self.version.value
+            if before == seen:
+                return seen
+            if before % 2 == 1:
+                continue
+            weights = self.weights.copy()
+            if self.version.value == before:
+                break
+
+        vector_to_parameters(torch.from_numpy(weights), model.parameters())
+        return before
+
+
+# Ape-X style per-actor exploration: actor i uses base ** (1 + alpha * i / (K - 1))
+# so some actors mostly exploit while others keep exploring
+def actor_epsilons(num_actors, base=0.4, alpha=7.0):
+    if num_actors == 1:
+        return [base]
+    return [base ** (1 + alpha * i / (num_actors - 1)) for i in range(num_actors)]
+
+
+# body of an actor process: plays games with its own engine and model copy
+def run_actor(actor_id, engine_name, hidden_layer_size, cache_size, epsilon, weight_poll_freq,
+              transitions, weights, stats, stop, seed):
+    # every actor gets one core, torch's own thread pool would only fight the other actors
+    torch.set_num_threads(1)
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+    env = make_engine(engine_name)
+    # only the actors act, so only they get the feature/value caches
+    agent = DQNAgent(queue_len=1, hidden_layer_size=hidden_layer_size, cache_size=cache_size)
+    agent.epsilon = epsilon
+    version = weights.load_into(agent.model, -1)
+    agent.invalidate_values()
+
+    pieces_since_poll = 0
+    while not stop.is_set():
+        env.reset()
+        game_over = False
+        pieces = 0
+        state_before = get_features(env.board)
+
+        while not game_over and not stop.is_set():
+            possible_moves = env.get_next_states()
+            if not possible_moves:
+                break
+
+            best_action = agent.act(possible_moves, env.next_features)
+            reward, game_over = env.step(best_action)
+
+            state_after = agent.chosen_features
+            transitions.put(state_before, reward, state_after, game_over)
+            state_before = state_after
+
+            pieces += 1
+            if pieces >= MAX_PIECES_IN_GAME:
+                game_over = True
+
+            # refresh the model copy every weight_poll_freq placements
+            pieces_since_poll += 1
+            if pieces_since_poll >= weight_poll_freq:
+                loaded = weights.load_into(agent.model, version)
+                if loaded != version:
+                    # new weights, the numpy snapshot used by act has to be refreshed
+                    agent.invalidate_values()
+                    version = loaded
+                pieces_since_poll = 0
+
+        stats.put((actor_id, env.score, pieces))
+
+
+# trains a DQNAgent with num_actors actor processes feeding a single learner
+#   weight_sync_freq -> learner publishes new weights every this many learn() calls
+#   weight_poll_freq -> actors check for new weights every this many placements
+#   epsilons         -> one exploration rate per actor (defaults to actor_epsilons)
+#   warmup           -> buffer size before the learner starts taking gradient steps
+#   learn_every      -> learn after every k transitions drained from the actors, so the
+#                       number of gradient steps follows the data like train(learn_every=k)
+#   gradient_steps   -> gradient steps per learn
+def train_dqn_parallel(num_actors=4, engine_name='bitboard', batch_size=64, queue_len=100000,
+                       hidden_layer_size=64, episodes=10000, weight_sync_freq=100,
+                       weight_poll_freq=50, epsilons=None, warmup=1000, learn_every=1,
+                       gradient_steps=1, ring_capacity=65536, cache_size=0, seed=0):
+    if learn_every < 1 or gradient_steps < 1:
+        raise ValueError("learn_every and gradient_steps must be at least 1")
+    if epsilons is None:
+        epsilons = actor_epsilons(num_actors)
+    if len(epsilons) != num_actors:
+        raise ValueError("need one epsilon per actor")
+
+    torch.manual_seed(seed)
+    agent = DQNAgent(batch_size, queue_len, hidden_layer_size)
+    num_params = sum(p.numel() for p in agent.model.parameters())
+
+    # spawn works the same on every platform and doesn't fork torch's thread state
+    ctx = mp.get_context('spawn')
+    weights = SharedWeights(ctx, num_params)
+    weights.publish(agent.model)
+    rings = [SharedTransitions(ctx, ring_capacity) for _ in range(num_actors)]
+    stats = ctx.Queue()
+    stop = ctx.Event()
+
+    actors = [
+        ctx.Process(target=run_actor, daemon=True,
+                    args=(i, engine_name, hidden_layer_size, cache_size, epsilons[i], weight_poll_freq,
+                          rings[i], weights, stats, stop, seed + 1 + i))
+        for i in range(num_actors)
+    ]
+    for actor in actors:
+        actor.start()
+
+    print(f"Starting to train the DQN agent with {num_actors} actors...")
+    print(f"{episodes} episodes. Epsilons: {', '.join(f'{e:.3f}' for e in epsilons)}")
+    print(f"Learning every {learn_every} transitions: {gradient_steps} x {batch_size} samples, "
+          f"warmup {warmup}.")
+
+    score_window = deque(maxlen=100)
+    finished = 0
+    transitions_seen = 0
+    # transitions drained since the last learn, they pay for the next ones
+    pending = 0
+    start_time = time.perf_counter()
+
+    try:
+        while finished < episodes:
+            # move everything the actors produced into the replay buffer
+            new = 0
+            for ring in rings:
+                batch = ring.drain()
+                if batch is not None:
+                    agent.buffer.save_many(*batch)
+                    new += len(batch[1])
+            transitions_seen += new
+
+            if agent.buffer.size() >= max(warmup, batch_size):
+                # one learn per learn_every new transitions, never more steps than the
+                # actors paid for however fast (or slow) they are
+                pending += new
+                while pending >= learn_every:
+                    pending -= learn_every
+                    for _ in range(gradient_steps):
+                        agent.learn()
+                        if agent.learn_steps % weight_sync_freq == 0:
+                            weights.publish(agent.model)
+            if new == 0:
+                # nothing new to learn from, don't spin
+                time.sleep(0.001)
+
+            # collect finished games for logging
+            while True:
+                try:
+                    actor_id, score, pieces = stats.get_nowait()
+                except queue.Empty:
+                    break
+
+                finished += 1
+                score_window.append(score)
+
+                if finished % 100 == 0:
+                    avg = sum(score_window) / len(score_window)
+                    elapsed = time.perf_counter() - start_time
+                    print(f"Episode: {finished} | Score: {score} | Avg100: {avg:.1f} | "
+                          f"Buffer: {agent.buffer.size()} | Learn steps: {agent.learn_steps} | "
+                          f"Transitions/sec: {transitions_seen / elapsed:.0f}")
+
+            # the actors only stop when told to, so if all of them are gone (a failing
+            # engine import, an exception in run_actor) no more episodes will come
+            if stats.empty() and not any(actor.is_alive() for actor in actors):
+                codes = [actor.exitcode for actor in actors]
+                raise RuntimeError(f"the actors exited before finishing the episodes (exit codes {codes})")
+    finally:
+        stop.set()
+        for actor in actors:
+            actor.join(timeout=5)
+            if actor.is_alive():
+                actor.terminate()
+
+    return agent
@@ -2,5 +2,6 @@
 
 from .tabular import TabularAgent
 from .dqn import DQNAgent
+from .linear import LinearAgent
 
-__all__ = ['TabularAgent', 'DQNAgent']
+__all__ = ['TabularAgent', 'DQNAgent', 'LinearAgent']
@@ -1,45 +1,24 @@
 import numpy as np
-from collections import deque
 import random
 import torch
 from tetris_rl.models.dqn import DQNModel
-from tetris_rl.features import get_features
+from tetris_rl.features import get_features, get_features_batch
+from tetris_rl.agents.replay import PrioritizedReplayBuffer, ReplayBuffer
+from tetris_rl.cache import LRUCache, feature_keys, get_features_cached
+from tetris_rl.telemetry import NULL_TELEMETRY
+from tetris_rl.inference import NumpyDQN
+from tetris_rl import checkpoint
 import torch.nn as nn
 import torch.optim as optim
 
-class ReplayBuffer:
-    def __init__(self, queue_len):
-        # create the memory queue using dequeue with a fixed length
-        self.memqueue = deque(maxlen=queue_len)
-
-    # saves a specific experience inside the replay buffer
-    def save(self, current_state_features, reward, next_state_features, game_over):
-        # save the experience inside the buffer
-        self.memqueue.append((current_state_features, reward, next_state_features, game_over))
-
-    # selects random experiences from the replay buffer
-    def recall(self, batch_size=64):
-        # get random experiences from the buffer
-        exps = random.sample(self.memqueue, k=batch_size)
-
-        # create 4 different lists from the tuples
-        states, rewards, next_states, game_overs = zip(*exps)
-
-        # convert each group into its own strict PyTorch tensor
-        states_t = torch.tensor(np.array(states), dtype=torch.float32)
-        rewards_t = torch.tensor(rewards, dtype=torch.float32)
-        next_states_t = torch.tensor(np.array(next_states), dtype=torch.float32)
-        
-        # game over is also a float for math purposes
-        game_overs_t = torch.tensor(game_overs, dtype=torch.float32)
-
-        return states_t, rewards_t, next_states_t, game_overs_t
-    
-    def size(self):
-        return len(self.memqueue)
-    
 class DQNAgent:
-    def __init__(self, batch_size=64, queue_len=100000, hidden_layer_size=64):
+    # cache_size > 0 memoizes candidate features (by board) and value estimates
+    # (by features) in LRU caches of that size, see tetris_rl/cache.py
+    # buffer_path keeps the replay buffer in memory-mapped files in that directory
+    # prioritized samples the replay buffer by TD error (PrioritizedReplayBuffer) and
+    # scales every sample's loss by its importance-sampling weight
+    def __init__(self, batch_size=64, queue_len=100000, hidden_layer_size=64, cache_size=0,
+                 buffer_path=None, prioritized=False):
         self.learning_rate = 1e-3
         self.gamma = 0.98
         self.epsilon = 0.5
@@ -47,7 +26,11 @@ class DQNAgent:
         self.epsilon_decay = 0.995
         self.batch_size = batch_size
 
-        self.buffer = ReplayBuffer(queue_len)
+        self.prioritized = prioritized
+        if prioritized:
+            self.buffer = PrioritizedReplayBuffer(queue_len, path=buffer_path)
+        else:
+            self.buffer = ReplayBuffer(queue_len, path=buffer_path)
         self.model = DQNModel(hidden_layer_size)
 
         # target network: frozen copy of model, synced every target_update_freq learn() calls
@@ -56,50 +39,213 @@ class DQNAgent:
         self.target_update_freq = 500
         self.learn_steps = 0
 
+        # features of the afterstate picked by the last act/act_arrays call, so the
+        # training loop can build the replay transition without recomputing them
+        self.chosen_features = None
+
+        # value entries are dropped whenever the model weights change
+        self.feature_cache = LRUCache(cache_size) if cache_size > 0 else None
+        self.value_cache = LRUCache(cache_size) if cache_size > 0 else None
+
+        # numpy snapshot of the model for action selection (see tetris_rl/inference.py),
+        # re-synced lazily after the weights change; batches larger than
+        # numpy_max_batch still go through torch, which wins on big batches
+        self.inference = NumpyDQN.from_model(self.model)
+        self.inference_stale = False
+        self.numpy_max_batch = 4096
+
+        # phase timers (convert, features, sample, gradient), see tetris_rl/telemetry.py
+        self.telemetry = NULL_TELEMETRY
+
         self.loss_fun = nn.MSELoss()
         self.optimizer = optim.Adam(self.model.parameters(), lr=self.learning_rate)
 
-    # wraps board features inside a tensor
+    # value of a single board's features
     def predict_value(self, features):
-        features_t = torch.tensor(features, dtype=torch.float32)
+        features = np.asarray(features, dtype=np.float32).reshape(1, -1)
 
-        # no need to calculate gradients since we are just playing the game in this step
-        with torch.no_grad():
-            pred = self.model(features_t)
-        
-        # return the raw prediction
-        return pred.item()
+        # a single state always fits the numpy snapshot, no torch call needed
+        return float(self.predict_values(features)[0])
     
+    # evaluates a whole batch of board features with a single forward pass
+    # returns a (N,) float32 numpy array
+    def predict_values(self, features):
+        features = np.asarray(features, dtype=np.float32)
+        if self.value_cache is not None:
+            return self.predict_values_cached(features)
+
+        return self.forward(features)
+
+    # model values of a float32 feature batch, through the numpy snapshot for small batches
+    def forward(self, features):
+        if len(features) <= self.numpy_max_batch:
+            if self.inference_stale:
+                self.inference.sync(self.model)
+                self.inference_stale = False
+            return self.inference(features)
+
+        with torch.no_grad():
+            return self.model(torch.from_numpy(features)).numpy()
+
+    # predict_values through the value cache, only the misses go through the model
+    def predict_values_cached(self, features):
+        keys = feature_keys(features)
+        values = np.empty(len(keys), dtype=np.float32)
+        missing = []
+        for i, key in enumerate(keys):
+            value = self.value_cache.get(key)
+            if value is None:
+                missing.append(i)
+            else:
+                values[i] = value
+
+        if missing:
+            computed = self.forward(features[missing])
+            values[missing] = computed
+            for i, value in zip(missing, computed):
+                self.value_cache.put(keys[i], float(value))
+
+        return values
+
+    # features of a (N, 20, 10) board stack, through the feature cache if there is one
+    def extract_features(self, boards):
+        with self.telemetry.phase('features'):
+            if self.feature_cache is not None:
+                return get_features_cached(boards, self.feature_cache)
+            return get_features_batch(boards)
+
+    # hit/miss/eviction counters of both caches (None if caching is off)
+    def cache_stats(self):
+        if self.feature_cache is None:
+            return None
+        return {'features': self.feature_cache.stats(), 'values': self.value_cache.stats()}
+
+    # splits a next_states dict into parallel arrays of actions, features, rewards and game overs
+    # features can be passed in when the engine already computed them (engine.next_features)
+    def unpack_states(self, next_states, features=None):
+        with self.telemetry.phase('convert'):
+            actions = list(next_states.keys())
+            rewards = np.array([reward for (_, reward, _) in next_states.values()], dtype=np.float32)
+            game_overs = np.array([game_over for (_, _, game_over) in next_states.values()], dtype=np.float32)
+            if features is None:
+                boards = np.stack([board for (board, _, _) in next_states.values()])
+
+        if features is None:
+            features = self.extract_features(boards)
+
+        return actions, features, rewards, game_overs
+
+    # score = immediate reward + discounted future value (matches tabular agent)
+    # no future value if game over
+    def score_states(self, features, rewards, game_overs):
+        next_values = self.predict_values(features)
+
+        return rewards + self.gamma * next_values * (1.0 - game_overs)
+
     # selects the best action given possible next states using the neural network
-    def act(self, next_states):
+    # features: optional (K, 4) features of the candidates in next_states order
+    def act(self, next_states, features=None):
 
         # if we choose epsilon
         if random.random() < self.epsilon:
             # just return a random aciton 
-            return random.choice(list(next_states.keys()))
+            index = random.randrange(len(next_states))
+            action = list(next_states.keys())[index]
+            if features is not None:
+                self.chosen_features = features[index]
+            else:
+                with self.telemetry.phase('features'):
+                    self.chosen_features = get_features(next_states[action][0])
+            return action
         
-        # if we are doing greedy
-        # initialize placeholders for best score and action
-        best_score = -float('inf')
-        best_action = None
-
-        # iterate through possible next states and select the best action
-        for action, (board, reward, game_over) in next_states.items():
-            features = get_features(board)
-            next_value = self.predict_value(features)
-            
-            # score = immediate reward + discounted future value (matches tabular agent)
-            # no future value if game over
-            if game_over:
-                score = reward  
+        # if we are doing greedy, score every candidate with one forward pass
+        actions, features, rewards, game_overs = self.unpack_states(next_states, features)
+        return self.best_action(actions, features, rewards, game_overs)
+
+    # epsilon-greedy selection when the candidates are already arrays
+    # (e.g. the features computed natively by the C++ engine)
+    def act_arrays(self, actions, features, rewards, game_overs):
+        if random.random() < self.epsilon:
+            index = random.randrange(len(actions))
+            self.chosen_features = features[index]
+            return actions[index]
+
+        return self.best_action(actions, features, rewards, game_overs)
+
+    # greedy choice among candidates given as parallel arrays
+    def best_action(self, actions, features, rewards, game_overs):
+        scores = self.score_states(features, np.asarray(rewards, dtype=np.float32),
+                                   np.asarray(game_overs, dtype=np.float32))
+
+        # argmax returns the first best candidate, same tie breaking as a strict > scan
+        index = int(np.argmax(scores))
+        self.chosen_features = features[index]
+        return actions[index]
+
+    # selects actions for several environments at once
+    # takes a list of next_states dicts and returns one action per dict (None if it is empty)
+    # all greedy candidates across the environments go through a single forward pass
+    def act_batch(self, next_states_list):
+        chosen = [None] * len(next_states_list)
+        greedy = []
+
+        for i, next_states in enumerate(next_states_list):
+            if not next_states:
+                continue
+            if random.random() < self.epsilon:
+                chosen[i] = random.choice(list(next_states.keys()))
             else:
-                score = reward + self.gamma * next_value
+                greedy.append((i, self.unpack_states(next_states)))
+
+        if not greedy:
+            return chosen
+
+        features = np.concatenate([unpacked[1] for (_, unpacked) in greedy])
+        rewards = np.concatenate([unpacked[2] for (_, unpacked) in greedy])
+        game_overs = np.concatenate([unpacked[3] for (_, unpacked) in greedy])
+        offsets = np.cumsum([0] + [len(unpacked[0]) for (_, unpacked) in greedy])
+        best = self.select_best(features, rewards, game_overs, offsets)
+
+        for (i, (actions, _, _, _)), index in zip(greedy, best - offsets[:-1]):
+            chosen[i] = actions[index]
 
-            if score > best_score:
-                best_score = score
-                best_action = action
+        return chosen
 
-        return best_action
+    # greedy selection over flat candidate arrays grouped by environment
+    # (the format of VecTetrisEngine.get_next_states), candidates of environment i
+    # are offsets[i]:offsets[i + 1]
+    # returns the flat index of the best candidate of every environment (-1 if it has none)
+    def select_best(self, features, rewards, game_overs, offsets):
+        offsets = np.asarray(offsets)
+        counts = np.diff(offsets)
+        best = np.full(len(counts), -1, dtype=np.int64)
+        if len(features) == 0:
+            return best
+
+        scores = self.score_states(features, np.asarray(rewards, dtype=np.float32),
+                                   np.asarray(game_overs, dtype=np.float32))
+
+        # max score of every environment, then the first candidate that reaches it
+        has_moves = counts > 0
+        env = np.repeat(np.arange(len(counts)), counts)
+        env_max = np.maximum.reduceat(scores, offsets[:-1][has_moves])
+        is_best = scores == np.repeat(env_max, counts[has_moves])
+        first = np.flatnonzero(is_best)
+        envs, first_idx = np.unique(env[first], return_index=True)
+        best[envs] = first[first_idx]
+
+        return best
+
+    # epsilon-greedy selection for a VecTetrisEngine, returns one flat candidate index per game
+    def act_vec(self, env, candidates, features):
+        actions = self.select_best(features, candidates['reward'], candidates['game_over'],
+                                   candidates['offsets'])
+
+        explore = np.random.random(env.num_envs) < self.epsilon
+        if explore.any():
+            actions[explore] = env.random_actions()[explore]
+
+        return actions
     
     # function that applies Bellman logic using the replay buffer
     def learn(self):
@@ -108,8 +254,31 @@ class DQNAgent:
             return
         
         # get the tensors
-        states, rewards, next_states, game_overs = self.buffer.recall(self.batch_size)
+        with self.telemetry.phase('sample'):
+            if self.prioritized:
+                states, rewards, next_states, game_overs, weights, idx = self.buffer.recall_weighted(self.batch_size)
+            else:
+                states, rewards, next_states, game_overs = self.buffer.recall(self.batch_size)
+                weights = None
+
+        with self.telemetry.phase('gradient'):
+            td_errors = self.gradient_step(states, rewards, next_states, game_overs, weights)
+        self.telemetry.count('learn_steps')
 
+        # the sampled transitions get their new TD errors as priorities
+        if self.prioritized:
+            with self.telemetry.phase('priorities'):
+                self.buffer.update_priorities(idx, td_errors)
+
+        # periodically sync target network with main model
+        self.learn_steps += 1
+        if self.learn_steps % self.target_update_freq == 0:
+            self.target_model.load_state_dict(self.model.state_dict())
+            self.invalidate_values()
+
+    # one TD step on a sampled batch, returns the (batch,) numpy TD errors
+    # weights: importance-sampling weights of the samples (None: plain mean squared error)
+    def gradient_step(self, states, rewards, next_states, game_overs, weights=None):
         # use target network for stable TD targets (no gradient needed)
         with torch.no_grad():
             next_preds = self.target_model(next_states)
@@ -118,8 +287,11 @@ class DQNAgent:
         # predictions from the main model (gradients flow here)
         preds = self.model(states)
 
-        # calculate our loss
-        loss = self.loss_fun(preds, targets)
+        # calculate our loss, every squared error scaled by its sample's weight
+        if weights is None:
+            loss = self.loss_fun(preds, targets)
+        else:
+            loss = (weights * (preds - targets) ** 2).mean()
 
         # zero out optimizers memory
         self.optimizer.zero_grad()
@@ -129,13 +301,66 @@ class DQNAgent:
 
         # update weights of the model based on the loss
         self.optimizer.step()
+        self.invalidate_values()
 
-        # periodically sync target network with main model
-        self.learn_steps += 1
-        if self.learn_steps % self.target_update_freq == 0:
-            self.target_model.load_state_dict(self.model.state_dict())
+        return (targets - preds).detach().numpy()
+
+    # cached value estimates (and the numpy snapshot) are stale once the weights change
+    def invalidate_values(self):
+        self.inference_stale = True
+        if self.value_cache is not None:
+            self.value_cache.clear()
 
     # function for decaying epsilon over time
     def update_epsilon(self):
         if self.epsilon > self.epsilon_min:
             self.epsilon *= self.epsilon_decay
+
+    # saves everything needed to continue training: both networks, the optimizer,
+    # epsilon, learn_steps, the RNG states and the replay buffer (a flush if it is
+    # memory-mapped, otherwise its arrays go into the checkpoint); `extra` is stored
+    # as is for the training loop (episode counter, score window, ...)
+    def save_checkpoint(self, path, **extra):
+        self.buffer.flush()
+        checkpoint.atomic_save({
+            'model': self.model.state_dict(),
+            'target_model': self.target_model.state_dict(),
+            'optimizer': self.optimizer.state_dict(),
+            'epsilon': self.epsilon,
+            'learn_steps': self.learn_steps,
+            'buffer': self.buffer.state_dict(),
+            'rng': checkpoint.get_rng_state(),
+            'extra': extra,
+        }, path)
+
+    # restores a save_checkpoint file and returns its `extra` dict
+    # a memory-mapped buffer must already be open on the directory it was saved in
+    def load_checkpoint(self, path):
+        state = checkpoint.load(path)
+        self.model.load_state_dict(state['model'])
+        self.target_model.load_state_dict(state['target_model'])
+        self.optimizer.load_state_dict(state['optimizer'])
+        self.epsilon = state['epsilon']
+        self.learn_steps = state['learn_steps']
+        self.buffer.load_state_dict(state['buffer'])
+        checkpoint.set_rng_state(state['rng'])
+        self.invalidate_values()
+        return state['extra']
+
+    # the value network's weights, enough to deploy or evaluate the policy
+    # a .npz path writes the numpy snapshot instead, which loads without torch
+    # (inference.NumpyDQNPolicy)
+    def save(self, path):
+        if str(path).endswith('.npz'):
+            NumpyDQN.from_model(self.model).save(path)
+        else:
+            torch.save(self.model.state_dict(), path)
+
+    def load(self, path):
+        if str(path).endswith('.npz'):
+            with np.load(path) as arrays:
+                self.model.load_state_dict({k: torch.from_numpy(v) for k, v in arrays.items()})
+        else:
+            self.model.load_state_dict(torch.load(path))
+        self.target_model.load_state_dict(self.model.state_dict())
+        self.invalidate_values()
@@ -0,0 +1,66 @@
+import numpy as np
+import random
+from tetris_rl.features import get_features_batch
+
+# number of feature weights: agg_height, holes, bumpiness, max_height
+NUM_WEIGHTS = 4
+
+
+# greedy linear policy over the four board features, the controller tuned by
+# tetris_rl/cem.py; a candidate scores
+#   reward_weight * reward + (game over ? 0 : weights . features)
+# same choice as engines.rollout_linear, which plays it natively in the C++ engine
+class LinearAgent:
+    # weights: 4 feature weights, optionally followed by the reward weight (default 1)
+    def __init__(self, weights=(0.0, 0.0, 0.0, 0.0)):
+        self.set_weights(weights)
+        # exploration is off, the policy is only ever played greedily
+        self.epsilon = 0.0
+        # the planner scores r + gamma * V, so V is the plain weighted sum
+        self.gamma = 1.0
+        self.chosen_features = None
+
+    def set_weights(self, weights):
+        weights = np.asarray(weights, dtype=np.float64)
+        if weights.shape not in ((NUM_WEIGHTS,), (NUM_WEIGHTS + 1,)):
+            raise ValueError("weights must have 4 feature weights and optionally a reward weight")
+        self.weights = weights[:NUM_WEIGHTS].copy()
+        self.reward_weight = float(weights[NUM_WEIGHTS]) if len(weights) > NUM_WEIGHTS else 1.0
+
+    # all the weights, in the format set_weights and rollout_linear take
+    def get_weights(self):
+        return np.append(self.weights, self.reward_weight)
+
+    # weighted feature sums, summed term by term like the C++ kernel so both pick the same move
+    def predict_values(self, features):
+        f = np.asarray(features, dtype=np.float64).reshape(-1, NUM_WEIGHTS)
+        w = self.weights
+        return f[:, 0] * w[0] + f[:, 1] * w[1] + f[:, 2] * w[2] + f[:, 3] * w[3]
+
+    def act(self, next_states, features=None):
+        actions = list(next_states.keys())
+        rewards = np.fromiter((reward for (_, reward, _) in next_states.values()),
+                              dtype=np.float64, count=len(actions))
+        game_overs = np.fromiter((game_over for (_, _, game_over) in next_states.values()),
+                                 dtype=bool, count=len(actions))
+        if features is None:
+            features = get_features_batch(np.stack([board for (board, _, _) in next_states.values()]))
+        return self.act_arrays(actions, features, rewards, game_overs)
+
+    def act_arrays(self, actions, features, rewards, game_overs):
+        if random.random() < self.epsilon:
+            index = random.randrange(len(actions))
+        else:
+            scores = (self.reward_weight * np.asarray(rewards, dtype=np.float64)
+                      + np.where(np.asarray(game_overs, dtype=bool), 0.0, self.predict_values(features)))
+            # argmax returns the first best candidate, same tie breaking as the other agents
+            index = int(np.argmax(scores))
+        self.chosen_features = features[index]
+        return actions[index]
+
+    # the weights as a .npy file
+    def save(self, path):
+        np.save(path, self.get_weights())
+
+    def load(self, path):
+        self.set_weights(np.load(path))
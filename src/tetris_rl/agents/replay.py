@@ -0,0 +1,504 @@
+import json
+import os
+import numpy as np
+import torch
+from tetris_rl.environment import BOARD_HEIGHT, BOARD_WIDTH
+from tetris_rl.models.dqn import INPUT_SIZE
+
+# storage modes: the 4 summary features, bit-packed full boards, or both
+STORAGE_MODES = ('features', 'boards', 'both')
+
+BOARD_CELLS = BOARD_HEIGHT * BOARD_WIDTH
+# 200 cells -> 25 bytes per board
+PACKED_BOARD_BYTES = (BOARD_CELLS + 7) // 8
+
+
+# packs a board or a (N, 20, 10) stack of boards into 25 bytes per board, one bit per cell
+def pack_boards(boards):
+    boards = np.asarray(boards)
+    cells = (boards != 0).reshape(-1, BOARD_CELLS)
+    packed = np.packbits(cells, axis=1)
+    return packed[0] if boards.ndim == 2 else packed
+
+
+# (N, 25) packed boards -> (N, 20, 10) float32 boards of 0s and 1s
+def unpack_boards(packed):
+    cells = np.unpackbits(packed, axis=1, count=BOARD_CELLS)
+    return cells.reshape(len(packed), BOARD_HEIGHT, BOARD_WIDTH).astype(np.float32)
+
+
+# fixed capacity replay buffer backed by preallocated contiguous arrays
+# new experiences overwrite the oldest ones once the buffer is full (ring buffer)
+# storage='boards' keeps the raw boards instead of the features, packed to 25 bytes
+# each, so a full-board transition costs ~55 bytes and millions of them fit in RAM
+# path: directory of memory-mapped .npy files backing the arrays (one per field); the
+# OS pages them in and out, so the buffer can be larger than RAM, saving it is a flush
+# and reopening the directory picks up where the last flush() left off
+class ReplayBuffer:
+    def __init__(self, queue_len, feature_size=INPUT_SIZE, storage='features', path=None):
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"unknown storage '{storage}', expected one of {STORAGE_MODES}")
+        self.capacity = queue_len
+        self.storage = storage
+        self.store_features = storage in ('features', 'both')
+        self.store_boards = storage in ('boards', 'both')
+        self.path = path
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+        # one array per field instead of a python tuple per experience
+        # (a field that isn't stored gets a zero width array)
+        self.allocate_fields(feature_size if self.store_features else 0,
+                             PACKED_BOARD_BYTES if self.store_boards else 0)
+
+        # index of the next slot to write and number of valid experiences
+        self.pos = 0
+        self.count = 0
+
+        self.rng = np.random.default_rng()
+
+        # reopening a flushed buffer restores its position
+        if path is not None and os.path.exists(self.meta_path()):
+            with open(self.meta_path()) as f:
+                self.load_state_dict(json.load(f))
+
+    def allocate_fields(self, feature_size, board_bytes):
+        self.states = self.allocate('states', (self.capacity, feature_size), np.float32)
+        self.rewards = self.allocate('rewards', (self.capacity,), np.float32)
+        self.next_states = self.allocate('next_states', (self.capacity, feature_size), np.float32)
+        self.game_overs = self.allocate('game_overs', (self.capacity,), np.bool_)
+        self.boards = self.allocate('boards', (self.capacity, board_bytes), np.uint8)
+        self.next_boards = self.allocate('next_boards', (self.capacity, board_bytes), np.uint8)
+
+    # a zeroed array, or a memory-mapped .npy file under self.path
+    def allocate(self, name, shape, dtype):
+        # zero-width fields hold no data and can't be memory-mapped
+        if self.path is None or 0 in shape:
+            return np.zeros(shape, dtype=dtype)
+
+        file = os.path.join(self.path, f"{name}.npy")
+        if os.path.exists(file):
+            array = np.load(file, mmap_mode='r+')
+            if array.shape != shape or array.dtype != dtype:
+                raise ValueError(f"{file} holds a {array.shape} {array.dtype} array, "
+                                 f"expected {shape} {np.dtype(dtype)}")
+            return array
+        return np.lib.format.open_memmap(file, mode='w+', dtype=dtype, shape=shape)
+
+    def meta_path(self):
+        return os.path.join(self.path, "meta.json")
+
+    # position and sampling RNG (plus the data itself if the buffer lives in RAM)
+    def state_dict(self):
+        state = {
+            'capacity': self.capacity,
+            'storage': self.storage,
+            'pos': self.pos,
+            'count': self.count,
+            'rng': self.rng.bit_generator.state,
+        }
+        if self.path is None:
+            state['data'] = {name: getattr(self, name) for name in self.fields()}
+        return state
+
+    def load_state_dict(self, state):
+        if state['capacity'] != self.capacity or state['storage'] != self.storage:
+            raise ValueError(f"buffer state is for a {state['capacity']} transition "
+                             f"'{state['storage']}' buffer")
+        for name, array in state.get('data', {}).items():
+            getattr(self, name)[...] = array
+        self.pos = state['pos']
+        self.count = state['count']
+        self.rng.bit_generator.state = state['rng']
+
+    def fields(self):
+        return ('states', 'rewards', 'next_states', 'game_overs', 'boards', 'next_boards')
+
+    # writes the memory-mapped arrays back to disk and records the position
+    # (the metadata is written after the data, so a crash in between only loses
+    # the newest transitions)
+    def flush(self):
+        if self.path is None:
+            return
+
+        for name in self.fields():
+            array = getattr(self, name)
+            if isinstance(array, np.memmap):
+                array.flush()
+
+        state = self.state_dict()
+        tmp = f"{self.meta_path()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp, self.meta_path())
+
+    # forgets every stored experience (the arrays are left as they are)
+    def clear(self):
+        self.pos = 0
+        self.count = 0
+
+    # saves a specific experience inside the replay buffer
+    # board/next_board are the (20, 10) boards, needed when the buffer stores boards
+    # (the features can be None when it only stores boards)
+    def save(self, current_state_features, reward, next_state_features, game_over,
+             board=None, next_board=None):
+        i = self.pos
+        if self.store_features:
+            self.states[i] = current_state_features
+            self.next_states[i] = next_state_features
+        if self.store_boards:
+            self.boards[i] = pack_boards(board)
+            self.next_boards[i] = pack_boards(next_board)
+        self.rewards[i] = reward
+        self.game_overs[i] = game_over
+
+        self.pos = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    # saves a batch of experiences at once, every argument has one row per experience
+    # boards/next_boards are (N, 20, 10) stacks, packed in one vectorized call
+    def save_many(self, current_state_features, rewards, next_state_features, game_overs,
+                  boards=None, next_boards=None):
+        n = len(rewards)
+        if n == 0:
+            return
+
+        # if the batch is larger than the buffer only the newest experiences survive
+        skip = max(0, n - self.capacity)
+        idx = (self.pos + skip + np.arange(n - skip)) % self.capacity
+
+        if self.store_features:
+            self.states[idx] = np.asarray(current_state_features)[skip:]
+            self.next_states[idx] = np.asarray(next_state_features)[skip:]
+        if self.store_boards:
+            self.boards[idx] = pack_boards(np.asarray(boards)[skip:])
+            self.next_boards[idx] = pack_boards(np.asarray(next_boards)[skip:])
+        self.rewards[idx] = np.asarray(rewards)[skip:]
+        self.game_overs[idx] = np.asarray(game_overs)[skip:]
+
+        self.pos = (self.pos + n) % self.capacity
+        self.count = min(self.count + n, self.capacity)
+
+    # slots of batch_size experiences drawn uniformly with replacement in one vectorized call
+    def sample_indices(self, batch_size):
+        return self.rng.integers(0, self.count, size=batch_size)
+
+    # selects random experiences from the replay buffer
+    def recall(self, batch_size=64):
+        if not self.store_features:
+            raise ValueError("this buffer stores boards only, use recall_boards")
+        return self.gather(self.sample_indices(batch_size))
+
+    # (states, rewards, next_states, game_overs) tensors of the experiences in slots idx
+    def gather(self, idx):
+        # fancy indexing gathers each batch into a fresh contiguous array,
+        # torch.from_numpy then wraps it without another copy
+        states_t = torch.from_numpy(self.states[idx])
+        rewards_t = torch.from_numpy(self.rewards[idx])
+        next_states_t = torch.from_numpy(self.next_states[idx])
+
+        # game over is also a float for math purposes
+        game_overs_t = torch.from_numpy(self.game_overs[idx].astype(np.float32))
+
+        return states_t, rewards_t, next_states_t, game_overs_t
+
+    # same as recall but with (batch, 20, 10) float32 board tensors in place of the features,
+    # unpacked from the 25 byte rows of the sampled experiences only
+    def recall_boards(self, batch_size=64):
+        if not self.store_boards:
+            raise ValueError("this buffer stores features only, create it with storage='boards'")
+        return self.gather_boards(self.sample_indices(batch_size))
+
+    def gather_boards(self, idx):
+        boards_t = torch.from_numpy(unpack_boards(self.boards[idx]))
+        rewards_t = torch.from_numpy(self.rewards[idx])
+        next_boards_t = torch.from_numpy(unpack_boards(self.next_boards[idx]))
+        game_overs_t = torch.from_numpy(self.game_overs[idx].astype(np.float32))
+
+        return boards_t, rewards_t, next_boards_t, game_overs_t
+
+    # bytes held by the storage arrays
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self.fields())
+
+    def size(self):
+        return self.count
+
+    def __len__(self):
+        return self.count
+
+
+# array-based sum tree over `capacity` non-negative priorities
+# every node has FANOUT children and holds their sum; levels[0] is the root and
+# levels[-1] the priorities themselves (capacity rounded up to a power of FANOUT),
+# the children of node j of a level are j * FANOUT ... j * FANOUT + FANOUT - 1 of
+# the next one, so levels[d + 1].reshape(-1, FANOUT)[j] is one contiguous row
+# an update rewrites one node per level and a proportional draw walks one path
+# down, both O(log n); with 16 children a 1M slot tree is 5 levels deep, which
+# keeps the number of vectorized steps (not the arithmetic) small
+FANOUT = 16
+
+
+class SumTree:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.depth = 0
+        while FANOUT ** self.depth < capacity:
+            self.depth += 1
+        self.levels = [np.zeros(FANOUT ** d, dtype=np.float64) for d in range(self.depth + 1)]
+        self.leaves = self.levels[-1]
+
+    def total(self):
+        return self.levels[0][0]
+
+    # priorities of the slots idx
+    def get(self, idx):
+        return self.leaves[idx]
+
+    # sets the priority of slot i, the path to the root is recomputed from the children
+    # (never adjusted by the difference, so the sums can't drift)
+    def set(self, i, priority):
+        self.leaves[i] = priority
+        for d in range(self.depth - 1, -1, -1):
+            i //= FANOUT
+            self.levels[d][i] = self.levels[d + 1][i * FANOUT:(i + 1) * FANOUT].sum()
+
+    # sets the priorities of the slots idx, one vectorized pass per level
+    # (a node reached twice is written twice with the same sum)
+    def update(self, idx, priorities):
+        nodes = np.asarray(idx, dtype=np.intp)
+        self.leaves[nodes] = priorities
+        for d in range(self.depth - 1, -1, -1):
+            nodes = nodes // FANOUT
+            self.levels[d][nodes] = self.levels[d + 1].reshape(-1, FANOUT)[nodes].sum(axis=1)
+
+    # replaces every priority (slots past len(priorities) get 0) and rebuilds the sums in O(n)
+    def build(self, priorities):
+        self.leaves[:] = 0.0
+        self.leaves[:len(priorities)] = priorities
+        for d in range(self.depth - 1, -1, -1):
+            self.levels[d][:] = self.levels[d + 1].reshape(-1, FANOUT).sum(axis=1)
+
+    # slot of every value in [0, total): the leaf whose prefix sum interval holds it
+    def find(self, values):
+        values = np.array(values, dtype=np.float64)
+        nodes = np.zeros(len(values), dtype=np.intp)
+        rows = np.arange(len(values))
+        for d in range(1, self.depth + 1):
+            sums = np.cumsum(self.levels[d].reshape(-1, FANOUT)[nodes], axis=1)
+            # first child whose running sum passes the value (the last one if rounding
+            # put the value past all of them)
+            child = np.minimum((sums <= values[:, None]).sum(axis=1), FANOUT - 1)
+            values -= np.where(child > 0, sums[rows, child - 1], 0.0)
+            nodes = nodes * FANOUT + child
+        return nodes
+
+    def nbytes(self):
+        return sum(level.nbytes for level in self.levels)
+
+
+# replay buffer that samples experience i with probability p_i^alpha / sum_k p_k^alpha
+# (prioritized experience replay, Schaul et al. 2015) instead of uniformly
+#   p_i          -> |TD error| + epsilon of the last time the experience was learned from;
+#                   new experiences get the highest priority seen so far, so each one is
+#                   sampled at least about once
+#   alpha        -> 0 is uniform sampling, 1 fully proportional
+#   beta         -> strength of the importance-sampling correction, annealed linearly to 1
+#                   over beta_steps recall_weighted calls
+# the defaults (alpha 0.2, epsilon 0.1) were the best of a seeded sweep on the cpp engine;
+# with the paper's alpha 0.6 and a tiny epsilon the game-over TD errors dominate the
+# priorities and training falls behind uniform sampling
+# recall_weighted also returns the (N * P(i))^-beta weights (divided by their batch
+# maximum) for the loss, and the slots to pass back to update_priorities with the new
+# TD errors; plain recall/recall_boards sample by priority as well but without weights
+# the priorities are stored as one more field (memory-mapped like the others under
+# path), the sum tree is rebuilt from them when a buffer is reopened or loaded
+class PrioritizedReplayBuffer(ReplayBuffer):
+    def __init__(self, queue_len, feature_size=INPUT_SIZE, storage='features', path=None,
+                 alpha=0.2, beta=0.4, beta_steps=100000, epsilon=0.1):
+        self.alpha = alpha
+        self.beta_start = beta
+        self.beta_steps = beta_steps
+        self.epsilon = epsilon
+        # p^alpha of every slot, the priorities field mirrors its leaves for saving
+        self.tree = SumTree(queue_len)
+        self.max_priority = 1.0
+        self.sampled = 0
+        super().__init__(queue_len, feature_size, storage, path)
+
+    def allocate_fields(self, feature_size, board_bytes):
+        super().allocate_fields(feature_size, board_bytes)
+        self.priorities = self.allocate('priorities', (self.capacity,), np.float64)
+
+    def fields(self):
+        return super().fields() + ('priorities',)
+
+    # copies the tree's leaves into the priorities field
+    def sync_priorities(self):
+        self.priorities[:] = self.tree.leaves[:self.capacity]
+
+    def state_dict(self):
+        self.sync_priorities()
+        state = super().state_dict()
+        state.update(max_priority=self.max_priority, sampled=self.sampled)
+        return state
+
+    def load_state_dict(self, state):
+        if 'max_priority' not in state:
+            raise ValueError("buffer state is for a uniform buffer, not a prioritized one")
+        super().load_state_dict(state)
+        self.max_priority = state['max_priority']
+        self.sampled = state['sampled']
+        self.tree.build(self.priorities)
+
+    def flush(self):
+        if self.path is not None:
+            self.sync_priorities()
+        super().flush()
+
+    def clear(self):
+        super().clear()
+        self.tree.build(())
+        self.max_priority = 1.0
+        self.sampled = 0
+
+    def save(self, current_state_features, reward, next_state_features, game_over,
+             board=None, next_board=None):
+        i = self.pos
+        super().save(current_state_features, reward, next_state_features, game_over, board, next_board)
+        self.tree.set(i, self.max_priority ** self.alpha)
+
+    def save_many(self, current_state_features, rewards, next_state_features, game_overs,
+                  boards=None, next_boards=None):
+        n = len(rewards)
+        pos = self.pos
+        super().save_many(current_state_features, rewards, next_state_features, game_overs,
+                          boards, next_boards)
+        if n == 0:
+            return
+        # the slots the base class wrote, see ReplayBuffer.save_many
+        skip = max(0, n - self.capacity)
+        idx = (pos + skip + np.arange(n - skip)) % self.capacity
+        self.tree.update(idx, self.max_priority ** self.alpha)
+
+    # stratified proportional draw: one value in each of batch_size equal slices of the total
+    def sample_indices(self, batch_size):
+        segment = self.tree.total() / batch_size
+        values = (np.arange(batch_size) + self.rng.random(batch_size)) * segment
+        # rounding can walk past the last written slot
+        return np.minimum(self.tree.find(values), self.count - 1)
+
+    def beta(self):
+        return min(1.0, self.beta_start + (1.0 - self.beta_start) * self.sampled / self.beta_steps)
+
+    # (N * P(i))^-beta of the slots idx, divided by the largest one so they only scale updates down
+    def importance_weights(self, idx):
+        probs = self.tree.get(idx) / self.tree.total()
+        weights = (self.count * probs) ** -self.beta()
+        return (weights / weights.max()).astype(np.float32)
+
+    # recall (or recall_boards with boards=True) plus the importance-sampling weights
+    # tensor and the sampled slots: (states, rewards, next_states, game_overs, weights, idx)
+    def recall_weighted(self, batch_size=64, boards=False):
+        if boards and not self.store_boards:
+            raise ValueError("this buffer stores features only, create it with storage='boards'")
+        if not boards and not self.store_features:
+            raise ValueError("this buffer stores boards only, use boards=True")
+        idx = self.sample_indices(batch_size)
+        batch = self.gather_boards(idx) if boards else self.gather(idx)
+        weights_t = torch.from_numpy(self.importance_weights(idx))
+        self.sampled += 1
+        return batch + (weights_t, idx)
+
+    # new priorities |td_errors| + epsilon for the slots idx of a recall_weighted batch
+    def update_priorities(self, idx, td_errors):
+        priorities = np.abs(np.asarray(td_errors, dtype=np.float64)) + self.epsilon
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.update(idx, priorities ** self.alpha)
+
+    # the sum tree comes on top of the storage arrays
+    def nbytes(self):
+        return super().nbytes() + self.tree.nbytes()
+
+
+# round trip check of the packed board storage
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    boards = (rng.random((1000, BOARD_HEIGHT, BOARD_WIDTH)) < 0.4).astype(int)
+    next_boards = (rng.random((1000, BOARD_HEIGHT, BOARD_WIDTH)) < 0.4).astype(int)
+
+    assert np.array_equal(unpack_boards(pack_boards(boards)), boards)
+    assert np.array_equal(unpack_boards(pack_boards(boards[0])[None])[0], boards[0])
+
+    buffer = ReplayBuffer(1000, storage='boards')
+    buffer.save_many(None, np.arange(1000), None, np.zeros(1000, dtype=bool),
+                     boards=boards, next_boards=next_boards)
+    buffer.save(None, 1000, None, True, board=boards[0], next_board=next_boards[0])
+
+    # the rewards identify the experience every sampled board belongs to
+    sampled, rewards, sampled_next, game_overs = buffer.recall_boards(256)
+    for board, reward, next_board in zip(sampled.numpy(), rewards.numpy().astype(int), sampled_next.numpy()):
+        i = reward % 1000
+        assert np.array_equal(board, boards[i]) and np.array_equal(next_board, next_boards[i])
+
+    # a memory-mapped buffer comes back with its data and position after a flush
+    import tempfile
+    with tempfile.TemporaryDirectory() as path:
+        mapped = ReplayBuffer(1000, storage='both', path=path)
+        mapped.save_many(rng.random((600, INPUT_SIZE)), np.arange(600), rng.random((600, INPUT_SIZE)),
+                         np.zeros(600, dtype=bool), boards=boards[:600], next_boards=next_boards[:600])
+        mapped.flush()
+        expected = mapped.recall(32)
+        del mapped
+
+        # same position, same data and the sampling RNG as of the flush
+        reopened = ReplayBuffer(1000, storage='both', path=path)
+        assert reopened.size() == 600 and reopened.pos == 600
+        assert np.array_equal(unpack_boards(reopened.boards[:600]), boards[:600])
+        for a, b in zip(reopened.recall(32), expected):
+            assert torch.equal(a, b)
+        del reopened
+    print("Memory-mapped buffer reopens with its data and position.")
+
+    # the sum tree samples in proportion to the priorities and keeps exact sums
+    tree = SumTree(1000)
+    priorities = rng.random(1000) * (rng.random(1000) < 0.5)
+    tree.build(priorities)
+    tree.update(np.arange(0, 1000, 7), rng.random(143))
+    priorities[::7] = tree.get(np.arange(0, 1000, 7))
+    tree.set(999, 5.0)
+    priorities[999] = 5.0
+    assert np.isclose(tree.total(), priorities.sum())
+    drawn = tree.find(rng.random(200000) * tree.total())
+    assert np.all(priorities[drawn] > 0)
+    frequencies = np.bincount(drawn, minlength=1000) / len(drawn)
+    assert np.abs(frequencies - priorities / priorities.sum()).max() < 0.005
+
+    # rare high-error transitions dominate the prioritized batches, and their weights are the smallest
+    prioritized = PrioritizedReplayBuffer(1 << 20, alpha=0.6, epsilon=1e-3)
+    n = 1 << 20
+    prioritized.save_many(rng.random((n, INPUT_SIZE)), np.ones(n), rng.random((n, INPUT_SIZE)),
+                          np.zeros(n, dtype=bool))
+    rare = rng.choice(n, 1000, replace=False)
+    td_errors = np.full(n, 0.01)
+    td_errors[rare] = 50.0
+    prioritized.update_priorities(np.arange(n), td_errors)
+    *_, weights, idx = prioritized.recall_weighted(256)
+    hits = np.isin(idx, rare)
+    assert hits.mean() > 0.05 and weights.numpy()[hits].max() <= weights.numpy()[~hits].min()
+    print(f"Prioritized buffer at 2^20 slots: {hits.mean():.0%} of a batch from 0.1% of the transitions.")
+
+    with tempfile.TemporaryDirectory() as path:
+        mapped = PrioritizedReplayBuffer(1000, path=path)
+        mapped.save_many(rng.random((600, INPUT_SIZE)), np.arange(600), rng.random((600, INPUT_SIZE)),
+                         np.zeros(600, dtype=bool))
+        mapped.update_priorities(np.arange(600), rng.random(600) * 10)
+        mapped.flush()
+        total = mapped.tree.total()
+        del mapped
+        reopened = PrioritizedReplayBuffer(1000, path=path)
+        assert np.isclose(reopened.tree.total(), total)
+        del reopened
+
+    per_transition = ReplayBuffer(100000, storage='boards').nbytes() / 100000
+    print(f"Packed boards round trip. {per_transition:.0f} bytes per board-only transition.")
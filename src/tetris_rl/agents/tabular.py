@@ -1,13 +1,35 @@
 import numpy as np
 import random
-from tetris_rl.features import get_features
-from collections import defaultdict
+from tetris_rl.features import get_features, get_features_batch
+from tetris_rl.cache import LRUCache, get_features_cached
+from tetris_rl.telemetry import NULL_TELEMETRY
+from tetris_rl import checkpoint
+
+# number of buckets per feature: agg_height, holes, bumpiness, max_height
+BUCKETS = (8, 8, 7, 8)
+# 3584 discretized states
+NUM_STATES = int(np.prod(BUCKETS))
+
+
+# vectorized discretize: (N, 4) features -> (N,) flat state indices into the value table
+def discretize_batch(features):
+    features = np.asarray(features, dtype=np.float64).reshape(-1, 4)
+    agg_bucket = np.minimum(7, (features[:, 0] / 15).astype(np.int64))
+    holes_bucket = np.minimum(7, features[:, 1].astype(np.int64))
+    bump_bucket = np.minimum(6, (features[:, 2] / 4).astype(np.int64))
+    max_h_bucket = np.minimum(7, (features[:, 3] / 3).astype(np.int64))
+
+    return np.ravel_multi_index((agg_bucket, holes_bucket, bump_bucket, max_h_bucket), BUCKETS)
+
 
 class TabularAgent:
-    def __init__(self):
+    # cache_size > 0 memoizes candidate features in an LRU cache keyed by the packed
+    # board, see tetris_rl/cache.py
+    def __init__(self, cache_size=0):
         
-        # a dictionary mapping states to a Q-value
-        self.q_table = defaultdict(float)
+        # dense value table indexed by the flat state index of discretize_batch
+        # (the bucket space is bounded, so every state gets a slot up front)
+        self.q_table = np.zeros(NUM_STATES, dtype=np.float64)
         
         # hyperparameters for learning (will be decayed in training)
         
@@ -17,6 +39,20 @@ class TabularAgent:
         self.gamma = 0.98
         # was previously 0.1
         self.epsilon = 0.5
+        # per-episode decay of exploration and learning rate (see update_epsilon)
+        self.epsilon_min = 0.02
+        self.epsilon_decay = 0.9997
+        self.learning_rate_min = 0.02
+        self.learning_rate_decay = 0.99995
+
+        # features of the afterstate picked by the last select_action call, so the
+        # training loop can run the TD update without recomputing them
+        self.chosen_features = None
+
+        self.feature_cache = LRUCache(cache_size) if cache_size > 0 else None
+
+        # phase timers (features), see tetris_rl/telemetry.py
+        self.telemetry = NULL_TELEMETRY
 
     
     # given the features, this function assigns values into buckets for easier state mapping
@@ -34,57 +70,141 @@ class TabularAgent:
         max_h_bucket = min(7, int(max_height / 3))
 
         return (agg_bucket, holes_bucket, bump_bucket, max_h_bucket)
+
+    # flat index into q_table of a single feature vector (row-major over BUCKETS,
+    # same as discretize_batch)
+    def state_index(self, features):
+        agg_bucket, holes_bucket, bump_bucket, max_h_bucket = self.discretize(features)
+        return ((agg_bucket * BUCKETS[1] + holes_bucket) * BUCKETS[2] + bump_bucket) * BUCKETS[3] + max_h_bucket
+
+    # number of states that have been updated at least once
+    def num_states(self):
+        return int(np.count_nonzero(self.q_table))
+
+    # hit/miss/eviction counters of the feature cache (None if caching is off)
+    def cache_stats(self):
+        if self.feature_cache is None:
+            return None
+        return {'features': self.feature_cache.stats()}
     
     # selects the best action given the possible next_states using epsilon-greedy strategy
-    def select_action(self, next_states):
+    # features: optional (K, 4) features of the candidates in next_states order
+    def select_action(self, next_states, features=None):
         
         # if we are selecting at random as part of epsilon
         if random.random() < self.epsilon:
             # select a random next_state
-            return random.choice(list(next_states.keys()))
+            index = random.randrange(len(next_states))
+            action = list(next_states.keys())[index]
+            if features is not None:
+                self.chosen_features = features[index]
+            else:
+                with self.telemetry.phase('features'):
+                    self.chosen_features = get_features(next_states[action][0])
+            return action
         
         # if we didn't hit the epsilon, we are doing greedy
 
-        # initialize best score to negative infinity and aciton to none
-        best_score = -float('inf')
-        best_action = None
-
-        # for every action and possible results following
-        for action, (board, reward, game_over) in next_states.items():
-            
-            # get the feature from the board
-            features = get_features(board)
-            
-            # assign features to buckets
-            buckets = self.discretize(features)
-            
-            # score = immediate reward + discounted value of next state
-            score = reward + self.gamma * self.q_table.get(buckets, 0.0)
-            
-            if score > best_score:
-                best_score = score
-                best_action = action
+        # get the features of every candidate board in one batched call
+        # (unless the engine already maintained them)
+        if features is not None:
+            all_features = features
+        else:
+            with self.telemetry.phase('convert'):
+                boards = np.stack([board for (board, _, _) in next_states.values()])
+            with self.telemetry.phase('features'):
+                if self.feature_cache is not None:
+                    all_features = get_features_cached(boards, self.feature_cache)
+                else:
+                    all_features = get_features_batch(boards)
 
-        return best_action
+        # score = immediate reward + discounted value of next state, for all candidates at once
+        rewards = np.fromiter((reward for (_, reward, _) in next_states.values()),
+                              dtype=np.float64, count=len(next_states))
+        scores = rewards + self.gamma * self.q_table[discretize_batch(all_features)]
+
+        # argmax returns the first best candidate, same tie breaking as a strict > scan
+        index = int(np.argmax(scores))
+        self.chosen_features = all_features[index]
+        return list(next_states.keys())[index]
     
     # Updates V(state) using TD(0): V(s) <- V(s) + lr * (r + gamma * V(s') - V(s))
     # current_features: state we were in when we took the action
     # next_state_features: state we landed in after the action (used for bootstrap)
     def update(self, current_features, reward, next_state_features, game_over):
-        # discretize the current features
-        feature_buckets = self.discretize(current_features)
-        # look up the value of the current state
-        value = self.q_table.get(feature_buckets, 0.0)
+        # flat index of the current state and its value
+        state = self.state_index(current_features)
+        value = self.q_table[state]
 
         if game_over:
             # if the game is over, the value of the next state is 0
             next_value = 0.0
         else:
-            next_buckets = self.discretize(next_state_features)
-            next_value = self.q_table.get(next_buckets, 0.0)
+            next_value = self.q_table[self.state_index(next_state_features)]
 
         # calculate the TD target
         td_target = reward + self.gamma * next_value
         # update the new Q-score using Bellman equation
-        new_q_score = value + self.learning_rate * (td_target - value)
-        self.q_table[feature_buckets] = new_q_score
+        self.q_table[state] = value + self.learning_rate * (td_target - value)
+
+    # decays exploration and learning rate over time, called once per episode
+    def update_epsilon(self):
+        self.epsilon = max(self.epsilon_min, self.epsilon * self.epsilon_decay)
+        self.learning_rate = max(self.learning_rate_min, self.learning_rate * self.learning_rate_decay)
+
+    # saves the value table, the schedules and the RNG states; `extra` is stored as is
+    def save_checkpoint(self, path, **extra):
+        checkpoint.atomic_save({
+            'q_table': self.q_table.copy(),
+            'epsilon': self.epsilon,
+            'learning_rate': self.learning_rate,
+            'rng': checkpoint.get_rng_state(),
+            'extra': extra,
+        }, path)
+
+    # restores a save_checkpoint file and returns its `extra` dict
+    def load_checkpoint(self, path):
+        state = checkpoint.load(path)
+        self.q_table[:] = state['q_table']
+        self.epsilon = state['epsilon']
+        self.learning_rate = state['learning_rate']
+        checkpoint.set_rng_state(state['rng'])
+        return state['extra']
+
+    # the value table as a single .npy file, enough to deploy or evaluate the policy
+    def save(self, path):
+        np.save(path, self.q_table)
+
+    def load(self, path):
+        table = np.load(path)
+        if table.shape != (NUM_STATES,):
+            raise ValueError(f"{path} holds a {table.shape} table, expected ({NUM_STATES},)")
+        self.q_table[:] = table
+
+
+# checks the vectorized discretize and greedy scoring against the per-candidate versions
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    agent = TabularAgent()
+    features = np.stack([rng.integers(0, 200, 5000), rng.integers(0, 60, 5000),
+                         rng.integers(0, 60, 5000), rng.integers(0, 21, 5000)], axis=1)
+    expected = [agent.state_index(f) for f in features]
+    assert np.array_equal(discretize_batch(features), expected)
+
+    agent.q_table[:] = rng.normal(size=NUM_STATES)
+    agent.epsilon = 0.0
+    for _ in range(200):
+        k = rng.integers(1, 35)
+        next_states = {(i, 0): (None, float(rng.choice([1, 11, -24])), False) for i in range(k)}
+        candidate_features = features[rng.integers(0, len(features), k)]
+        action = agent.select_action(next_states, candidate_features)
+
+        # the original loop: strict > keeps the first best candidate
+        best_score, best_action = -float('inf'), None
+        for (key, (_, reward, _)), f in zip(next_states.items(), candidate_features):
+            score = reward + agent.gamma * agent.q_table[agent.state_index(f)]
+            if score > best_score:
+                best_score, best_action = score, key
+        assert action == best_action
+
+    print("Vectorized discretize and action selection match the per-candidate loop.")
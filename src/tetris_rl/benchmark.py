@@ -0,0 +1,407 @@
+import json
+import platform
+import random
+import time
+import numpy as np
+import torch
+from tetris_rl.environment import TetrisEngine, TETROMINOS, BOARD_HEIGHT, BOARD_WIDTH
+from tetris_rl.bitboard import BitboardTetrisEngine
+from tetris_rl.vec_env import VecTetrisEngine
+from tetris_rl.features import get_features, get_features_batch
+from tetris_rl.agents.dqn import DQNAgent
+from tetris_rl.agents.replay import PrioritizedReplayBuffer, ReplayBuffer
+from tetris_rl.models.dqn import INPUT_SIZE
+
+# micro benchmarks of the hot paths, each measured in isolation on fixed seeded boards:
+#   engine      -> get_next_states + step placements/sec (and candidates/sec) for every engine
+#   vec_engine  -> VecTetrisEngine games in lockstep with greedy DQN moves (generate,
+#                  batched features, one select_best call, step) at several widths
+#   features    -> get_features / get_features_batch boards/sec
+#   act         -> DQNAgent.act latency
+#   learn       -> DQNAgent.learn steps/sec
+#   recall      -> ReplayBuffer.recall cost (and recall_boards on packed boards)
+# results are plain dicts so they can be dumped as JSON and compared with a baseline
+# metric names say which way is better: *_per_sec higher, *_us lower
+
+# same order as the C++ PieceType enum
+PIECE_NAMES = list(TETROMINOS.keys())
+
+# fraction of the board height the stacks reach
+FILL_LEVELS = {'empty': 0.0, 'low': 0.25, 'mid': 0.5, 'high': 0.75}
+
+
+# seeded boards whose stacks reach about `fill` of the height
+# every column gets a random height around the level and a few holes below it,
+# no row is full and the top row stays empty, like boards seen during play
+def make_corpus(fill, count, seed):
+    rng = np.random.default_rng(seed)
+    boards = np.zeros((count, BOARD_HEIGHT, BOARD_WIDTH), dtype=int)
+    level = int(round(fill * (BOARD_HEIGHT - 1)))
+
+    for board in boards:
+        if level == 0:
+            continue
+        heights = np.clip(level + rng.integers(-3, 4, size=BOARD_WIDTH), 0, BOARD_HEIGHT - 1)
+        for col, height in enumerate(heights):
+            board[BOARD_HEIGHT - height:, col] = 1
+        # holes under the surface
+        board[rng.random(board.shape) < 0.1] = 0
+        # a full row would be cleared by the first placement and skew the numbers
+        for row in board:
+            if row.all():
+                row[rng.integers(BOARD_WIDTH)] = 0
+
+    pieces = rng.integers(len(PIECE_NAMES), size=count)
+    return boards, pieces
+
+
+def piece_dict(index):
+    name = PIECE_NAMES[index]
+    return {'name': name, 'rotations': TETROMINOS[name]}
+
+
+def load_cpp():
+    try:
+        import tetris_rl.tetris_engine as tetris_engine
+    except ImportError:
+        return None
+    return tetris_engine
+
+
+# puts `board` and piece number `piece` into any of the engines
+def set_position(engine, board, piece):
+    if hasattr(engine, 'set_board'):
+        engine.set_board(board.astype(np.int32))
+        engine.set_piece(int(piece))
+        return
+
+    engine.board = board.copy()
+    engine.current_piece = piece_dict(piece)
+    if isinstance(engine, TetrisEngine):
+        engine.cached_states = None
+
+
+# candidates of the current position as {(rot, x): (board, reward, game_over)} for any engine
+def candidates(engine):
+    if hasattr(engine, 'get_next_states_array'):
+        boards, rotations, xs, rewards, game_overs, _ = engine.get_next_states_array()
+        return {
+            (int(rot), int(x)): (board, float(reward), bool(game_over))
+            for rot, x, board, reward, game_over in zip(rotations, xs, boards, rewards, game_overs)
+        }
+    return engine.get_next_states()
+
+
+# runs a benchmark `repeats` times and keeps the best value of every metric, which is
+# far less noisy than a single run on a busy machine
+def best_of(repeats, bench, *args):
+    best = bench(*args)
+    for _ in range(repeats - 1):
+        for metric, value in bench(*args).items():
+            if metric.endswith('_per_sec'):
+                best[metric] = max(best[metric], value)
+            elif metric.endswith('_us'):
+                best[metric] = min(best[metric], value)
+    return best
+
+
+def percentiles_us(samples):
+    samples = np.asarray(samples) * 1e6
+    return {
+        'mean_us': float(samples.mean()),
+        'p50_us': float(np.percentile(samples, 50)),
+        'p95_us': float(np.percentile(samples, 95)),
+    }
+
+
+# get_next_states + step on every corpus position
+# the C++ engine goes through get_next_states_array(with_boards=False), the path the
+# training script uses; positions are loaded outside the timed region
+def bench_engine(make, boards, pieces):
+    engine = make()
+    generate_time = 0.0
+    step_time = 0.0
+    placements = 0
+    array_api = hasattr(engine, 'get_next_states_array')
+    # engines with a board-free candidate path are timed on it, like the raw C++
+    # engine with with_boards=False: training and evaluation only ever use that path
+    arrays_api = hasattr(engine, 'get_next_arrays')
+
+    for board, piece in zip(boards, pieces):
+        set_position(engine, board, piece)
+
+        start = time.perf_counter()
+        if array_api:
+            _, rotations, xs, _, _, _ = engine.get_next_states_array(with_boards=False)
+            actions = list(zip(rotations.tolist(), xs.tolist()))
+        elif arrays_api:
+            actions = engine.get_next_arrays()[0]
+        else:
+            actions = list(engine.get_next_states().keys())
+        generate_time += time.perf_counter() - start
+        placements += len(actions)
+
+        if not actions:
+            continue
+        rot, x = actions[len(actions) // 2]
+        start = time.perf_counter()
+        if array_api:
+            engine.step(rot, x)
+        else:
+            engine.step((rot, x))
+        step_time += time.perf_counter() - start
+
+    return {
+        'positions': len(boards),
+        'candidates': placements,
+        'candidates_per_sec': placements / generate_time,
+        'placements_per_sec': len(boards) / (generate_time + step_time),
+        'step_us': step_time / len(boards) * 1e6,
+    }
+
+
+def bench_features(boards, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for board in boards:
+            get_features(board)
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        get_features_batch(boards)
+    batch = time.perf_counter() - start
+
+    total = len(boards) * repeats
+    return {
+        'boards_per_sec': total / single,
+        'batch_boards_per_sec': total / batch,
+    }
+
+
+# greedy DQN play on `num_envs` games in lockstep, about `placements` placements in total
+# (finished games restart inside step, so every lockstep step places num_envs pieces)
+def bench_vec_engine(agent, num_envs, placements, seed):
+    agent.epsilon = 0.0
+    env = VecTetrisEngine(num_envs, seed=seed)
+    steps = max(1, placements // num_envs)
+
+    start = time.perf_counter()
+    for _ in range(steps):
+        candidates = env.get_next_states()
+        features = get_features_batch(candidates['board'])
+        env.step(agent.act_vec(env, candidates, features))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'num_envs': num_envs,
+        'placements_per_sec': steps * num_envs / elapsed,
+        'lockstep_us': elapsed / steps * 1e6,
+    }
+
+
+# greedy act() latency on the candidates of every corpus position
+def bench_act(agent, positions):
+    agent.epsilon = 0.0
+    samples = []
+    for next_states in positions:
+        start = time.perf_counter()
+        agent.act(next_states)
+        samples.append(time.perf_counter() - start)
+    return percentiles_us(samples)
+
+
+def fill_buffer(buffer, count, seed):
+    rng = np.random.default_rng(seed)
+    states = rng.integers(0, 40, size=(count, INPUT_SIZE)).astype(np.float32)
+    next_states = rng.integers(0, 40, size=(count, INPUT_SIZE)).astype(np.float32)
+    rewards = rng.choice([1.0, 11.0, -24.0], size=count).astype(np.float32)
+    game_overs = rng.random(count) < 0.02
+    buffer.save_many(states, rewards, next_states, game_overs)
+
+
+def bench_learn(batch_size, steps, seed):
+    agent = DQNAgent(batch_size=batch_size, queue_len=10000)
+    fill_buffer(agent.buffer, 10000, seed)
+    # one step outside the timing to warm up the allocator
+    agent.learn()
+
+    start = time.perf_counter()
+    for _ in range(steps):
+        agent.learn()
+    elapsed = time.perf_counter() - start
+    return {'batch_size': batch_size, 'steps_per_sec': steps / elapsed}
+
+
+def bench_recall(batch_size, calls, seed):
+    buffer = ReplayBuffer(100000)
+    fill_buffer(buffer, 100000, seed)
+
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        buffer.recall(batch_size)
+        samples.append(time.perf_counter() - start)
+    return dict(batch_size=batch_size, **percentiles_us(samples))
+
+
+# recall_weighted plus the priority update of the sampled slots on a 1M slot sum tree
+def bench_recall_prioritized(batch_size, calls, seed):
+    buffer = PrioritizedReplayBuffer(1 << 20)
+    fill_buffer(buffer, 1 << 20, seed)
+    td_errors = np.random.default_rng(seed).exponential(size=(calls, batch_size))
+
+    samples = []
+    for errors in td_errors:
+        start = time.perf_counter()
+        *_, idx = buffer.recall_weighted(batch_size)
+        buffer.update_priorities(idx, errors)
+        samples.append(time.perf_counter() - start)
+    return dict(batch_size=batch_size, **percentiles_us(samples))
+
+
+# recall_boards on a buffer of bit-packed boards (unpacking included)
+def bench_recall_boards(batch_size, calls, seed):
+    rng = np.random.default_rng(seed)
+    buffer = ReplayBuffer(100000, storage='boards')
+    boards = rng.random((100000, BOARD_HEIGHT, BOARD_WIDTH)) < 0.4
+    buffer.save_many(None, np.zeros(100000, dtype=np.float32), None,
+                     np.zeros(100000, dtype=bool), boards=boards, next_boards=boards)
+
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        buffer.recall_boards(batch_size)
+        samples.append(time.perf_counter() - start)
+    return dict(batch_size=batch_size, bytes_per_transition=buffer.nbytes() / buffer.capacity,
+                **percentiles_us(samples))
+
+
+# every engine must return the same candidate set, boards, rewards and game overs
+# for the same board and piece; returns the number of positions compared and a list
+# of mismatch descriptions (empty if they all agree)
+def check_parity(engines, boards, pieces):
+    mismatches = []
+    for i, (board, piece) in enumerate(zip(boards, pieces)):
+        results = {}
+        for name, engine in engines.items():
+            set_position(engine, board, piece)
+            results[name] = candidates(engine)
+
+        reference_name = next(iter(results))
+        reference = results[reference_name]
+        for name, states in results.items():
+            if states.keys() != reference.keys():
+                mismatches.append(f"position {i} ({PIECE_NAMES[piece]}): {name} and {reference_name} "
+                                  f"return different placements")
+                continue
+            for action, (next_board, reward, game_over) in states.items():
+                ref_board, ref_reward, ref_game_over = reference[action]
+                if (not np.array_equal(np.asarray(next_board) != 0, np.asarray(ref_board) != 0)
+                        or float(reward) != float(ref_reward) or bool(game_over) != bool(ref_game_over)):
+                    mismatches.append(f"position {i} ({PIECE_NAMES[piece]}) {action}: "
+                                      f"{name} differs from {reference_name}")
+    return len(boards), mismatches
+
+
+# runs the whole suite, quick=True shrinks the corpora for a smoke run
+def run_suite(seed=0, quick=False, repeats=3):
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    # the numbers should not depend on how many cores torch decides to use
+    torch.set_num_threads(1)
+
+    count = 50 if quick else 400
+    cpp = load_cpp()
+    engines = {'python': TetrisEngine, 'bitboard': BitboardTetrisEngine}
+    if cpp is not None:
+        engines['cpp'] = cpp.TetrisEngine
+
+    results = {}
+    corpora = {}
+    for i, (level, fill) in enumerate(FILL_LEVELS.items()):
+        corpora[level] = make_corpus(fill, count, seed + i)
+
+    for level, (boards, pieces) in corpora.items():
+        for name, make in engines.items():
+            results[f'engine/{name}/{level}'] = best_of(repeats, bench_engine, make, boards, pieces)
+        results[f'features/{level}'] = best_of(repeats, bench_features, boards, 1 if quick else 5)
+
+    agent = DQNAgent()
+    python_engine = TetrisEngine()
+    for level, (boards, pieces) in corpora.items():
+        positions = []
+        for board, piece in zip(boards, pieces):
+            set_position(python_engine, board, piece)
+            next_states = python_engine.get_next_states()
+            if next_states:
+                positions.append(next_states)
+        results[f'act/{level}'] = best_of(repeats, bench_act, agent, positions)
+
+    for num_envs in (1, 16, 256):
+        results[f'vec_engine/{num_envs}'] = best_of(repeats, bench_vec_engine, agent, num_envs,
+                                                    2000 if quick else 20000, seed)
+
+    for batch_size in (64, 256):
+        results[f'learn/{batch_size}'] = best_of(repeats, bench_learn, batch_size, 20 if quick else 200, seed)
+        results[f'recall/{batch_size}'] = best_of(repeats, bench_recall, batch_size, 50 if quick else 1000, seed)
+        results[f'recall_boards/{batch_size}'] = best_of(repeats, bench_recall_boards, batch_size,
+                                                         50 if quick else 1000, seed)
+        results[f'recall_prioritized/{batch_size}'] = best_of(repeats, bench_recall_prioritized, batch_size,
+                                                              50 if quick else 1000, seed)
+
+    parity_engines = {name: make() for name, make in engines.items()}
+    positions = 0
+    mismatches = []
+    for level, (boards, pieces) in corpora.items():
+        checked, found = check_parity(parity_engines, boards, pieces)
+        positions += checked
+        mismatches += found
+
+    return {
+        'meta': {
+            'seed': seed,
+            'quick': quick,
+            'repeats': repeats,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'torch_threads': torch.get_num_threads(),
+            'cpp_engine': cpp is not None,
+        },
+        'results': results,
+        'parity': {
+            'engines': list(parity_engines),
+            'positions': positions,
+            'mismatches': mismatches,
+        },
+    }
+
+
+# metrics that got worse than the baseline by more than `tolerance` (relative)
+# returns a list of (benchmark, metric, baseline, current) tuples
+def compare(report, baseline, tolerance=0.2):
+    regressions = []
+    for name, metrics in report['results'].items():
+        base_metrics = baseline['results'].get(name)
+        if base_metrics is None:
+            continue
+        for metric, value in metrics.items():
+            base = base_metrics.get(metric)
+            if base is None or base == 0:
+                continue
+            if metric.endswith('_per_sec') and value < base * (1 - tolerance):
+                regressions.append((name, metric, base, value))
+            elif metric.endswith('_us') and value > base * (1 + tolerance):
+                regressions.append((name, metric, base, value))
+    return regressions
+
+
+def save_report(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+def load_report(path):
+    with open(path) as f:
+        return json.load(f)
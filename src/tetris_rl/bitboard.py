@@ -0,0 +1,610 @@
+import numpy as np
+import random
+from tetris_rl.environment import BOARD_HEIGHT, BOARD_WIDTH, TETROMINOS
+
+# a drop-in replacement for environment.TetrisEngine that keeps every row of the
+# board as a 10-bit integer (bit c set -> column c is filled)
+# collision checks, drops and line clears become a handful of integer operations
+# instead of per-cell numpy indexing, which is where the python engine spends its time
+
+# a row with every column filled
+FULL_ROW = (1 << BOARD_WIDTH) - 1
+
+# lookup table from a row mask to its 10 cells, used to turn masks back into boards
+ROW_TABLE = np.array(
+    [[(mask >> c) & 1 for c in range(BOARD_WIDTH)] for mask in range(1 << BOARD_WIDTH)],
+    dtype=int,
+)
+
+# column weights used to pack a 20x10 board into row masks
+COLUMN_BITS = 1 << np.arange(BOARD_WIDTH)
+
+
+# builds the pre-shifted masks for every piece, rotation and column offset
+# PLACEMENTS[name][rot_idx] is a list of (x, cells, profile, min_dy) tuples where
+#   cells   -> ((dy, row_mask), ...) the piece rows already shifted to column x
+#   profile -> ((col, bottom_dy, top_dy), ...) the lowest and highest piece cell
+#              in every column it covers
+#   min_dy  -> the highest row offset of the piece (used for the out of bounds check)
+# only offsets where the piece stays inside the walls are kept, the same
+# x range (-2 to BOARD_WIDTH + 2) the python engine scans
+def build_placements():
+    placements = {}
+
+    for name, rotations in TETROMINOS.items():
+        per_rotation = []
+
+        for shape_coords in rotations:
+            options = []
+
+            for x in range(-2, BOARD_WIDTH + 2):
+                cols = [x + px for (_, px) in shape_coords]
+                if min(cols) < 0 or max(cols) >= BOARD_WIDTH:
+                    continue
+
+                masks = {}
+                bottoms = {}
+                tops = {}
+                for (py, px) in shape_coords:
+                    masks[py] = masks.get(py, 0) | (1 << (x + px))
+                    bottoms[x + px] = max(bottoms.get(x + px, py), py)
+                    tops[x + px] = min(tops.get(x + px, py), py)
+
+                cells = tuple(sorted(masks.items()))
+                profile = tuple((c, bottoms[c], tops[c]) for c in sorted(bottoms))
+                min_dy = min(py for (py, _) in shape_coords)
+                options.append((x, cells, profile, min_dy))
+
+            per_rotation.append(options)
+
+        placements[name] = per_rotation
+
+    return placements
+
+
+PLACEMENTS = build_placements()
+
+
+# PLACEMENTS of every piece flattened into arrays, so all the candidates of a position
+# can be dropped and scored with a handful of numpy operations instead of a python
+# loop per candidate; rows are in engine order (rotation, then x)
+#   actions           -> [(rot_idx, x), ...]
+#   options           -> the matching (x, cells, profile, min_dy) tuples
+#   cols, bottom, top -> (P, 4) columns covered by the piece with the lowest and highest
+#                        piece cell in each (pieces covering fewer columns repeat their
+#                        first column, col_valid marks the real ones)
+#   cell_dy, cell_mask -> (P, 4) rows of the piece and their masks (padded the same way,
+#                        cell_valid marks the real ones)
+#   min_dy            -> (P,) highest row offset of the piece
+def build_placement_arrays():
+    arrays = {}
+
+    for name, rotations in PLACEMENTS.items():
+        actions, options = [], []
+        cols, bottom, top, col_valid = [], [], [], []
+        cell_dy, cell_mask, cell_valid, min_dys = [], [], [], []
+
+        for rot_idx, per_rotation in enumerate(rotations):
+            for option in per_rotation:
+                x, cells, profile, min_dy = option
+                actions.append((rot_idx, x))
+                options.append(option)
+                pad = 4 - len(profile)
+                cols.append([c for (c, _, _) in profile] + [profile[0][0]] * pad)
+                bottom.append([b for (_, b, _) in profile] + [profile[0][1]] * pad)
+                top.append([t for (_, _, t) in profile] + [profile[0][2]] * pad)
+                col_valid.append([True] * len(profile) + [False] * pad)
+                pad = 4 - len(cells)
+                cell_dy.append([dy for (dy, _) in cells] + [cells[0][0]] * pad)
+                cell_mask.append([mask for (_, mask) in cells] + [cells[0][1]] * pad)
+                cell_valid.append([True] * len(cells) + [False] * pad)
+                min_dys.append(min_dy)
+
+        arrays[name] = {
+            'actions': actions,
+            'options': options,
+            'cols': np.array(cols, dtype=np.intp),
+            'bottom': np.array(bottom, dtype=np.int64),
+            'top': np.array(top, dtype=np.int64),
+            'col_valid': np.array(col_valid),
+            'cell_dy': np.array(cell_dy, dtype=np.intp),
+            'cell_mask': np.array(cell_mask, dtype=np.int64),
+            'cell_valid': np.array(cell_valid),
+            'min_dy': np.array(min_dys, dtype=np.int64),
+            'indices': np.arange(len(actions)),
+            'index': {action: k for k, action in enumerate(actions)},
+        }
+
+    return arrays
+
+
+PLACEMENT_ARRAYS = build_placement_arrays()
+# (P, 1) candidate indices for the row-wise scatters of score_placements
+ROW_INDEX = np.arange(max(len(a['actions']) for a in PLACEMENT_ARRAYS.values()))[:, None]
+
+
+# converts a list/array of row masks into a 20x10 board
+def rows_to_board(rows):
+    return ROW_TABLE[np.asarray(rows, dtype=np.intp)]
+
+
+# converts a 20x10 board into a list of row masks
+def board_to_rows(board):
+    return [int(mask) for mask in (np.asarray(board) != 0).dot(COLUMN_BITS)]
+
+
+# index of the first filled row of every column (BOARD_HEIGHT if the column is empty)
+def get_column_tops(rows):
+    tops = [BOARD_HEIGHT] * BOARD_WIDTH
+    seen = 0
+
+    for r, row in enumerate(rows):
+        new = row & ~seen
+        if new:
+            seen |= new
+            for c in range(BOARD_WIDTH):
+                if new >> c & 1:
+                    tops[c] = r
+            if seen == FULL_ROW:
+                break
+
+    return tops
+
+
+# checks if the piece rows hit the floor or another piece when placed at row y
+def collides(rows, cells, y):
+    for (dy, mask) in cells:
+        r = y + dy
+        if r >= BOARD_HEIGHT:
+            return True
+        if r >= 0 and rows[r] & mask:
+            return True
+    return False
+
+
+# finds the row a piece lands on when dropped from the top at a given column offset
+# returns None if the piece can't be placed there
+def drop_piece(rows, tops, cells, profile, min_dy):
+    if rows[0] == 0:
+        # with an empty top row a piece can never start inside an overhang,
+        # so the landing row only depends on the first filled cell of each column
+        y = min(tops[c] - 1 - bottom for (c, bottom, _) in profile)
+    else:
+        # the top row is occupied (only on game over boards), fall back to
+        # probing row by row exactly like the python engine does
+        if collides(rows, cells, 0):
+            return None
+        y = 0
+        while not collides(rows, cells, y + 1):
+            y += 1
+
+    # part of the piece would stick out of the top of the board
+    if y + min_dy < 0:
+        return None
+
+    return y
+
+
+# column heights and per-column hole counts of a board, computed from scratch
+def get_column_stats(rows):
+    board = ROW_TABLE[np.asarray(rows, dtype=np.intp)]
+    tops = np.where(board.any(axis=0), board.argmax(axis=0), BOARD_HEIGHT)
+    heights = BOARD_HEIGHT - tops
+    # every empty cell under the top block is a hole
+    holes = heights - board.sum(axis=0)
+
+    return heights.tolist(), holes.tolist()
+
+
+# column stats of an afterstate derived from the parent's stats and the piece footprint
+# only valid if the piece was dropped onto the column tops and no line was cleared:
+# the piece then sits above every old block, the gap under it becomes new holes
+def update_column_stats(heights, holes, profile, y):
+    heights = list(heights)
+    holes = list(holes)
+
+    for (c, bottom, top) in profile:
+        holes[c] += (BOARD_HEIGHT - heights[c]) - 1 - (y + bottom)
+        heights[c] = BOARD_HEIGHT - (y + top)
+
+    return heights, holes
+
+
+# [agg_height, holes, bumpiness, max_height] from the column stats,
+# same values as features.get_features
+def features_from_stats(heights, holes):
+    bumpiness = 0
+    for c in range(BOARD_WIDTH - 1):
+        bumpiness += abs(heights[c] - heights[c + 1])
+
+    return [sum(heights), sum(holes), bumpiness, max(heights)]
+
+
+# (N, 4) features of N row lists in one numpy pass, same values as features_from_stats
+def batch_features(rows_list):
+    boards = ROW_TABLE[np.array(rows_list, dtype=np.intp)]
+    tops = np.where(boards.any(axis=1), boards.argmax(axis=1), BOARD_HEIGHT)
+    heights = BOARD_HEIGHT - tops
+    # every empty cell under the top block of a column is a hole
+    holes = heights - boards.sum(axis=1)
+
+    features = np.empty((len(rows_list), 4), dtype=np.int64)
+    features[:, 0] = heights.sum(axis=1)
+    features[:, 1] = holes.sum(axis=1)
+    features[:, 2] = np.abs(heights[:, 1:] - heights[:, :-1]).sum(axis=1)
+    features[:, 3] = heights.max(axis=1)
+    return features
+
+
+# every legal placement of a piece on a board with an empty top row (pieces then drop
+# straight onto the column tops), scored from the parent's column stats and row masks
+# returns (placement indices into PLACEMENT_ARRAYS[name], landing rows, rewards,
+# game overs, cleared lines, (K, 4) features); no afterstate rows or boards are built,
+# only candidates that clear lines are placed for real to recompute their features
+def score_placements(rows, heights, holes, name):
+    a = PLACEMENT_ARRAYS[name]
+    h = np.array(heights, dtype=np.int64)
+    tops = BOARD_HEIGHT - h
+
+    # landing row of every placement, same as drop_piece
+    y = (tops[a['cols']] - 1 - a['bottom']).min(axis=1)
+    top_row = y + a['min_dy']
+    k = len(y)
+
+    # every placement is scored, the ones sticking out of the top of the board are
+    # dropped at the end (their negative rows only wrap around to garbage values)
+
+    # rows the piece completes
+    filled = np.array(rows, dtype=np.int64)[y[:, None] + a['cell_dy']] | a['cell_mask']
+    lines = ((filled == FULL_ROW) & a['cell_valid']).sum(axis=1)
+
+    # column stats of the afterstates without line clears: the covered columns grow
+    # to the piece's highest cell, the gap under its lowest cell becomes new holes
+    cols = a['cols']
+    new_heights = np.empty((k, BOARD_WIDTH), dtype=np.int64)
+    new_heights[:] = h
+    new_heights[ROW_INDEX[:k], cols] = BOARD_HEIGHT - (y[:, None] + a['top'])
+    new_holes = ((tops[cols] - 1 - (y[:, None] + a['bottom'])) * a['col_valid']).sum(axis=1)
+
+    features = np.empty((k, 4), dtype=np.int64)
+    features[:, 0] = new_heights.sum(axis=1)
+    features[:, 1] = sum(holes) + new_holes
+    features[:, 2] = np.abs(new_heights[:, 1:] - new_heights[:, :-1]).sum(axis=1)
+    features[:, 3] = new_heights.max(axis=1)
+
+    if top_row.min() >= 0:
+        # usual case, every placement is legal
+        legal = a['indices']
+    else:
+        legal = np.flatnonzero(top_row >= 0)
+        y, top_row, lines, features = y[legal], top_row[legal], lines[legal], features[legal]
+
+    # cleared lines shift whole rows, place those few for real and recompute them together
+    if lines.any():
+        clears = np.flatnonzero(lines)
+        cleared_rows = []
+        for i in clears:
+            _, cells, _, _ = a['options'][legal[i]]
+            next_rows, _, _, lines[i] = place_piece(rows, cells, int(y[i]))
+            cleared_rows.append(next_rows)
+        features[clears] = batch_features(cleared_rows)
+
+    # same reward scheme as place_piece; with an empty top row the game only ends when
+    # the piece reaches row 0 and no line is cleared (clears add empty rows on top)
+    game_overs = (lines == 0) & (top_row == 0)
+    rewards = 1.0 + (lines ** 2) * 10.0 - 25.0 * game_overs
+
+    return legal, y, rewards, game_overs, lines, features
+
+
+# locks a piece into the rows and clears any full lines
+# returns the new rows, the reward, if the game is over and the number of cleared lines
+def place_piece(rows, cells, y):
+    next_rows = list(rows)
+    full = False
+
+    for (dy, mask) in cells:
+        next_rows[y + dy] |= mask
+        if next_rows[y + dy] == FULL_ROW:
+            full = True
+
+    lines = 0
+    if full:
+        # keep only rows that are not full and add empty rows on top
+        next_rows = [row for row in next_rows if row != FULL_ROW]
+        lines = BOARD_HEIGHT - len(next_rows)
+        next_rows = [0] * lines + next_rows
+
+    # same reward scheme as environment.TetrisEngine
+    reward = 1.0 + (lines ** 2) * 10
+
+    is_game_over = next_rows[0] != 0
+    if is_game_over:
+        reward -= 25
+
+    return next_rows, reward, is_game_over, lines
+
+
+class BitboardTetrisEngine:
+    def __init__(self):
+        # piece generator, the global `random` module unless seed() was called
+        self.rng = random
+        self.reset()
+
+    # own piece generator, same sequence as environment.TetrisEngine.seed
+    def seed(self, seed):
+        self.rng = random.Random(seed)
+
+    # piece generator state, for checkpoints (the module's state until seed() is called)
+    def get_rng_state(self):
+        return self.rng.getstate()
+
+    def set_rng_state(self, state):
+        self.rng.setstate(state)
+
+    # reset the game state
+    def reset(self):
+        # every row starts empty
+        self.rows = [0] * BOARD_HEIGHT
+        self.score = 0
+        # lines cleared this game
+        self.lines = 0
+        self.game_over = False
+        self.current_piece = self.get_new_piece()
+        # column heights, hole counts and features of the board, kept up to date so
+        # candidate features can be derived from them instead of rescanning every cell
+        self.heights = [0] * BOARD_WIDTH
+        self.holes = [0] * BOARD_WIDTH
+        self.features = [0, 0, 0, 0]
+        # (action -> index, placements, landing rows) of the candidates from the last
+        # get_next_states/get_next_arrays call
+        self.candidates = None
+        # (K, 4) features of those candidates, in the same order as the returned dict
+        self.next_features = None
+
+        return self.board
+
+    # the board as a 20x10 matrix, built on demand from the row masks
+    @property
+    def board(self):
+        return rows_to_board(self.rows)
+
+    @board.setter
+    def board(self, board):
+        self.set_rows(board_to_rows(board))
+
+    # replaces the board with a list of row masks (use this instead of assigning
+    # self.rows so the column stats stay in sync)
+    def set_rows(self, rows):
+        self.rows = list(rows)
+        self.heights, self.holes = get_column_stats(self.rows)
+        self.features = features_from_stats(self.heights, self.holes)
+        self.candidates = None
+        self.next_features = None
+
+    # function to get a new piece randomly (same draw as the python engine)
+    def get_new_piece(self):
+        shape_name = self.rng.choice(list(TETROMINOS.keys()))
+
+        return {
+            'name': shape_name,
+            'rotations': TETROMINOS[shape_name],
+        }
+
+    # scores every legal placement of the current piece without building any board
+    # returns (actions, (K, 4) features, (K,) rewards, (K,) game overs) and keeps what
+    # step() needs to commit one of them
+    def generate_candidates(self):
+        rows = self.rows
+        name = self.current_piece['name']
+
+        if rows[0] == 0:
+            legal, ys, rewards, game_overs, _, features = score_placements(rows, self.heights, self.holes, name)
+            placements = PLACEMENT_ARRAYS[name]
+            if legal is placements['indices']:
+                # every placement is legal, reuse the shared lists
+                actions, options, index = placements['actions'], placements['options'], placements['index']
+            else:
+                actions = [placements['actions'][i] for i in legal]
+                options = [placements['options'][i] for i in legal]
+                index = dict(zip(actions, range(len(actions))))
+            ys = ys.tolist()
+        else:
+            # the top row is occupied (only on game over boards): pieces can start inside
+            # an overhang, drop_piece probes row by row and nothing is incremental
+            actions, options, ys, rewards, game_overs, next_rows_list = [], [], [], [], [], []
+            tops = get_column_tops(rows)
+            for rot_idx, per_rotation in enumerate(PLACEMENTS[name]):
+                for option in per_rotation:
+                    x, cells, profile, min_dy = option
+                    y = drop_piece(rows, tops, cells, profile, min_dy)
+                    if y is None:
+                        continue
+                    next_rows, reward, is_game_over, _ = place_piece(rows, cells, y)
+                    actions.append((rot_idx, x))
+                    options.append(option)
+                    ys.append(y)
+                    rewards.append(reward)
+                    game_overs.append(is_game_over)
+                    next_rows_list.append(next_rows)
+            index = dict(zip(actions, range(len(actions))))
+            rewards = np.array(rewards, dtype=np.float64)
+            game_overs = np.array(game_overs, dtype=bool)
+            features = batch_features(next_rows_list) if actions else np.empty((0, 4), dtype=np.int64)
+
+        # step() places the chosen candidate, nothing else is ever placed for real
+        self.candidates = (index, options, ys)
+        self.next_features = features
+        return actions, features, rewards, game_overs
+
+    # candidates without boards: (actions, features, rewards, game_overs), the input
+    # of the agents' act_arrays (same contract as engines.CppTetrisEngine)
+    def get_next_arrays(self):
+        return self.generate_candidates()
+
+    # generate possible next states, same format as environment.TetrisEngine:
+    # a dictionary mapping (rotation idx, x) to (board, reward, game_over)
+    # the features of every candidate are left in self.next_features
+    # the boards are only built here, for callers that ask for them, in one lookup
+    # into ROW_TABLE for all the candidates
+    def get_next_states(self):
+        actions, _, rewards, game_overs = self.generate_candidates()
+        if not actions:
+            return {}
+
+        _, options, ys = self.candidates
+        next_rows = [place_piece(self.rows, option[1], y)[0] for option, y in zip(options, ys)]
+        boards = ROW_TABLE[np.array(next_rows, dtype=np.intp)]
+        return dict(zip(actions, zip(boards, rewards.tolist(), game_overs.tolist())))
+
+    # executes an action given by the player where the action is a tuple
+    # (rotation idx, x_position)
+    def step(self, action):
+        rot_idx, x = action
+
+        if self.candidates is not None:
+            # the landing row was found by the last get_next_states/get_next_arrays call
+            index, options, ys = self.candidates
+            k = index.get((rot_idx, x))
+            placement = None if k is None else (options[k][1], options[k][2], ys[k])
+        else:
+            placement = self.drop_placement(rot_idx, x)
+
+        if placement is None:
+            # if an illegal move is attempted, end the game with negative reward
+            return -10, True
+
+        cells, profile, y = placement
+        next_rows, reward, self.game_over, lines = place_piece(self.rows, cells, y)
+
+        # carry the column stats over to the new board; without a line clear the
+        # piece sits on the old column tops (as long as the top row was empty)
+        if lines == 0 and self.rows[0] == 0:
+            self.heights, self.holes = update_column_stats(self.heights, self.holes, profile, y)
+        else:
+            self.heights, self.holes = get_column_stats(next_rows)
+        self.rows = next_rows
+        self.features = features_from_stats(self.heights, self.holes)
+
+        self.score += reward
+        self.lines += lines
+        self.current_piece = self.get_new_piece()
+        # new piece, the cached candidates are stale
+        self.candidates = None
+        self.next_features = None
+        return reward, self.game_over
+
+    # drops a single piece without generating the other candidates
+    # returns (cells, profile, landing row) or None if the move is illegal
+    def drop_placement(self, rot_idx, x):
+        placement = self.find_placement(rot_idx, x)
+        if placement is None:
+            return None
+
+        cells, profile, min_dy = placement
+        y = drop_piece(self.rows, get_column_tops(self.rows), cells, profile, min_dy)
+        if y is None:
+            return None
+        return cells, profile, y
+
+    # looks up the pre-shifted masks of the current piece for a given action
+    def find_placement(self, rot_idx, x):
+        rotations = PLACEMENTS[self.current_piece['name']]
+        if not 0 <= rot_idx < len(rotations):
+            return None
+
+        for (px, cells, profile, min_dy) in rotations[rot_idx]:
+            if px == x:
+                return cells, profile, min_dy
+
+        return None
+
+
+if __name__ == "__main__":
+    import time
+    from tetris_rl.environment import TetrisEngine
+
+    # play the same seeded games on both engines and make sure every
+    # candidate set matches exactly
+    for seed in range(20):
+        random.seed(seed)
+        reference = TetrisEngine()
+        random.seed(seed)
+        engine = BitboardTetrisEngine()
+
+        while not reference.game_over:
+            expected = reference.get_next_states()
+            actions, features, rewards, game_overs = engine.get_next_arrays()
+            actual = engine.get_next_states()
+            assert expected.keys() == actual.keys()
+            # the board-free candidates are the same ones, in the same order
+            assert actions == list(actual)
+            assert rewards.tolist() == [reward for (_, reward, _) in actual.values()]
+            assert game_overs.tolist() == [game_over for (_, _, game_over) in actual.values()]
+            assert np.array_equal(features, engine.next_features)
+            for action, (board, reward, game_over) in expected.items():
+                assert np.array_equal(board, actual[action][0])
+                assert reward == actual[action][1]
+                assert game_over == actual[action][2]
+
+            if not expected:
+                break
+
+            action = random.Random(seed * 1000 + len(expected)).choice(sorted(expected))
+            state = random.getstate()
+            reference.step(action)
+            random.setstate(state)
+            engine.step(action)
+            assert np.array_equal(reference.board, engine.board)
+
+    print("Bitboard engine matches the python engine.")
+
+    # the incrementally maintained features must match get_features on random
+    # boards (including overhangs, holes and nearly full rows) for every piece
+    from tetris_rl.features import get_features
+    rng = np.random.default_rng(0)
+    engine = BitboardTetrisEngine()
+    for trial in range(3000):
+        if trial % 10 == 0:
+            fill = (rng.random((BOARD_HEIGHT, BOARD_WIDTH)) < rng.random()).astype(int)
+            fill[:rng.integers(0, BOARD_HEIGHT + 1)] = 0
+            engine.board = fill
+        engine.current_piece = engine.get_new_piece()
+
+        next_states = engine.get_next_states()
+        for (board, _, _), features in zip(next_states.values(), engine.next_features):
+            assert np.array_equal(get_features(board), features)
+            assert get_features(board).dtype == features.dtype
+
+        if not next_states:
+            engine.reset()
+            continue
+        _, done = engine.step(list(next_states)[rng.integers(len(next_states))])
+        assert np.array_equal([engine.heights, engine.holes], get_column_stats(engine.rows))
+        assert np.array_equal(engine.features, get_features(engine.board))
+        if done:
+            engine.reset()
+
+    print("Incremental features match get_features.")
+
+    # compare placements/sec on random play; the bitboard engine is timed on the
+    # board-free get_next_arrays, the path training and evaluation take
+    for engine_cls in (TetrisEngine, BitboardTetrisEngine):
+        random.seed(0)
+        env = engine_cls()
+        placements = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < 2.0:
+            if engine_cls is BitboardTetrisEngine:
+                actions = env.get_next_arrays()[0]
+            else:
+                actions = list(env.get_next_states().keys())
+            if not actions:
+                env.reset()
+                continue
+            _, done = env.step(random.choice(actions))
+            placements += 1
+            if done:
+                env.reset()
+        elapsed = time.perf_counter() - start
+        print(f"{engine_cls.__name__}: {placements / elapsed:.0f} placements/sec")
@@ -0,0 +1,157 @@
+import numpy as np
+from collections import OrderedDict
+from tetris_rl.features import get_features_batch
+
+# the same afterstates show up over and over (early game boards, boards right after
+# a line clear, the same board reached with different rotations), so agents can keep
+# their features and value estimates in a bounded LRU cache instead of recomputing them
+
+
+# packs a board into a 25 byte key, one bit per cell
+def board_key(board):
+    return np.packbits(np.asarray(board) != 0).tobytes()
+
+
+# packs a (N, 20, 10) stack of boards into N keys
+def board_keys(boards):
+    boards = np.asarray(boards)
+    packed = np.packbits((boards != 0).reshape(len(boards), -1), axis=1)
+    return [row.tobytes() for row in packed]
+
+
+# packs a (N, 4) feature batch into N keys (the value network only sees the features,
+# so boards with the same features share one value entry)
+def feature_keys(features):
+    packed = np.ascontiguousarray(features, dtype=np.float32)
+    return [row.tobytes() for row in packed]
+
+
+# bounded least recently used cache with counters for sizing it
+class LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # returns the cached value (and marks it as recently used) or None
+    def get(self, key):
+        value = self.data.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.data.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+
+        # drop the least recently used entry once we are over capacity
+        if len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+    # drops every entry, e.g. when the model the values came from changed
+    def clear(self):
+        self.data = OrderedDict()
+        self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def __len__(self):
+        return len(self.data)
+
+
+# get_features_batch through a cache keyed by the packed boards
+# only the boards that miss are sent to get_features_batch, in one call
+def get_features_cached(boards, cache):
+    boards = np.asarray(boards)
+    if len(boards) == 0:
+        return get_features_batch(boards)
+
+    keys = board_keys(boards)
+    cached = [cache.get(key) for key in keys]
+
+    missing = [i for i, features in enumerate(cached) if features is None]
+    if missing:
+        computed = get_features_batch(boards[missing])
+        for i, features in zip(missing, computed):
+            cache.put(keys[i], features)
+            cached[i] = features
+
+    return np.stack(cached)
+
+
+if __name__ == "__main__":
+    from tetris_rl.agents.dqn import DQNAgent
+    from tetris_rl.environment import TetrisEngine
+
+    # candidate boards of a few random games, every position twice so the second
+    # pass is served from the cache
+    rng = np.random.default_rng(0)
+    env = TetrisEngine()
+    env.seed(0)
+    positions = []
+    while len(positions) < 200:
+        next_states = env.get_next_states()
+        if not next_states:
+            env.reset()
+            continue
+        positions.append(np.stack([board for (board, _, _) in next_states.values()]))
+        actions = list(next_states)
+        _, done = env.step(actions[rng.integers(len(actions))])
+        if done:
+            env.reset()
+
+    # cached features equal the uncached ones, and a repeated board is a hit
+    cache = LRUCache(100000)
+    for boards in positions + positions:
+        assert np.array_equal(get_features_cached(boards, cache), get_features_batch(boards))
+    unique = len({key for boards in positions for key in board_keys(boards)})
+    total = sum(len(boards) for boards in positions)
+    assert cache.misses == unique and cache.hits == 2 * total - unique
+    assert len(cache) == unique and cache.evictions == 0
+
+    # a cache smaller than the working set evicts and never exceeds its size
+    small = LRUCache(50)
+    for boards in positions:
+        get_features_cached(boards, small)
+    assert len(small) == 50 and small.evictions == small.misses - 50
+
+    # cached values equal the model's, single states included, until the weights change
+    cached_agent = DQNAgent(cache_size=100000)
+    plain_agent = DQNAgent()
+    plain_agent.model.load_state_dict(cached_agent.model.state_dict())
+    plain_agent.invalidate_values()
+    # (a cached value can come from a forward pass over another batch, which may round
+    # the last float32 bit differently)
+    for boards in positions + positions:
+        features = get_features_batch(boards)
+        assert np.allclose(cached_agent.predict_values(features), plain_agent.predict_values(features),
+                           rtol=1e-6, atol=1e-6)
+        assert np.isclose(cached_agent.predict_value(features[0]), plain_agent.predict_value(features[0]),
+                          rtol=1e-6, atol=1e-6)
+    values = cached_agent.value_cache
+    assert values.hits > 0 and values.hits + values.misses == 2 * (total + len(positions))
+
+    cached_agent.invalidate_values()
+    assert len(values) == 0 and values.invalidations == 1
+
+    print(f"Cached features and values match: {cache.stats()['hit_rate']:.1%} feature hits, "
+          f"{values.stats()['hit_rate']:.1%} value hits.")
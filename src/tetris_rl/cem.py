@@ -0,0 +1,133 @@
+import multiprocessing as mp
+import time
+import numpy as np
+from tetris_rl.agents.linear import LinearAgent, NUM_WEIGHTS
+from tetris_rl.engines import make_engine, rollout_linear
+from tetris_rl.evaluation import play_episode
+
+# cross-entropy method for the linear policy of agents/linear.py, no gradients involved:
+# every generation samples `population` weight vectors from a diagonal gaussian, plays
+# `games` seeded games with each of them and refits the gaussian to the best elite_frac
+# of the population; `noise` is added to the refitted variance (decayed by noise_decay
+# every generation) so the distribution doesn't collapse onto a local optimum too early
+#
+# the whole population of a generation is scored in one parallel batch:
+#   'cpp'                -> one engines.rollout_linear call over the (population, weights)
+#                           matrix, the games run natively on OpenMP threads
+#   'python'/'bitboard'  -> a spawn process pool, one task per (member, game)
+# every member of a generation plays the same pieces (seeds seed + generation * games + i),
+# so members are compared on equal games, and the next generation gets new ones
+
+# objectives: mean score or mean lines cleared over the games of a member
+OBJECTIVES = ('score', 'lines')
+
+
+# state of a pool worker, set up once by init_worker
+_worker = None
+
+
+def init_worker(engine_name, max_pieces):
+    global _worker
+    _worker = (make_engine(engine_name), LinearAgent(), max_pieces)
+
+
+# plays one game of one population member, returns (score, lines, pieces)
+def run_game(task):
+    weights, seed = task
+    env, agent, max_pieces = _worker
+    agent.set_weights(weights)
+    return play_episode(env, agent, seed, max_pieces)
+
+
+# scores, lines and pieces of every member on the same `games` games, (population, games) each
+def score_population(population, games, seed, max_pieces, engine_name, threads, pool):
+    if engine_name == 'cpp':
+        return rollout_linear(population, games, seed, max_pieces, threads)
+
+    tasks = [(weights, seed + i) for weights in population for i in range(games)]
+    results = np.array(pool.map(run_game, tasks), dtype=np.float64)
+    return tuple(results[:, k].reshape(len(population), games) for k in range(3))
+
+
+# returns (LinearAgent with the final mean weights, per-generation history)
+#   population   -> weight vectors per generation
+#   elite_frac   -> fraction of the population the distribution is refitted to
+#   games        -> seeded games per member and generation
+#   init_std     -> initial standard deviation of every weight (the mean starts at 0)
+#   noise        -> extra variance added after every refit, times noise_decay ** generation
+#   learn_reward -> also tune the reward weight (otherwise it stays 1)
+#   workers      -> OpenMP threads ('cpp') or pool processes, 0 for all cores
+def train_cem(engine_name='cpp', generations=30, population=50, elite_frac=0.2, games=5,
+              max_pieces=2000, init_std=1.0, noise=0.5, noise_decay=0.9, learn_reward=False,
+              objective='score', seed=0, workers=0, save_path=None):
+    if objective not in OBJECTIVES:
+        raise ValueError(f"unknown objective '{objective}', expected one of {OBJECTIVES}")
+    num_elite = max(1, int(round(population * elite_frac)))
+    if num_elite > population:
+        raise ValueError("elite_frac must be at most 1")
+
+    dims = NUM_WEIGHTS + 1 if learn_reward else NUM_WEIGHTS
+    rng = np.random.default_rng(seed)
+    mean = np.zeros(dims)
+    if learn_reward:
+        mean[-1] = 1.0
+    std = np.full(dims, float(init_std))
+
+    pool = None
+    if engine_name != 'cpp':
+        processes = workers if workers > 0 else mp.cpu_count()
+        pool = mp.get_context('spawn').Pool(processes, initializer=init_worker,
+                                            initargs=(engine_name, max_pieces))
+
+    print(f"Starting CEM on the {engine_name} engine...")
+    print(f"{generations} generations x {population} policies x {games} games, {num_elite} elites.")
+    history = []
+    best_fitness, best_weights = -np.inf, mean.copy()
+    start_time = time.perf_counter()
+
+    try:
+        for generation in range(generations):
+            samples = mean + std * rng.standard_normal((population, dims))
+
+            gen_start = time.perf_counter()
+            scores, lines, pieces = score_population(samples, games, seed + generation * games, max_pieces,
+                                                     engine_name, workers, pool)
+            elapsed = time.perf_counter() - gen_start
+
+            fitness = np.asarray(scores if objective == 'score' else lines, dtype=np.float64).mean(axis=1)
+            # stable sort: equal fitness keeps the sampling order
+            elite = np.argsort(-fitness, kind='stable')[:num_elite]
+            mean = samples[elite].mean(axis=0)
+            std = np.sqrt(samples[elite].var(axis=0) + noise * noise_decay ** generation)
+
+            if fitness[elite[0]] > best_fitness:
+                best_fitness, best_weights = fitness[elite[0]], samples[elite[0]].copy()
+
+            record = {
+                'generation': generation + 1,
+                'mean_fitness': float(fitness.mean()),
+                'elite_fitness': float(fitness[elite].mean()),
+                'best_fitness': float(fitness[elite[0]]),
+                'mean_lines': float(np.mean(lines)),
+                'weights': mean.tolist(),
+                'std': std.tolist(),
+                'placements_per_sec': float(np.sum(pieces)) / elapsed if elapsed > 0 else float('inf'),
+            }
+            history.append(record)
+            print(f"Generation: {generation + 1} | Mean: {record['mean_fitness']:.1f} | "
+                  f"Elite: {record['elite_fitness']:.1f} | Best: {record['best_fitness']:.1f} | "
+                  f"Weights: {np.array2string(mean, precision=3)} | Std: {std.mean():.3f} | "
+                  f"Placements/sec: {record['placements_per_sec']:.0f}")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    print(f"Done in {time.perf_counter() - start_time:.1f}s, best member {best_fitness:.1f} "
+          f"with {np.array2string(best_weights, precision=3)}.")
+
+    agent = LinearAgent(mean)
+    if save_path is not None:
+        agent.save(save_path)
+        print(f"Saved the weights to {save_path}.")
+    return agent, history
@@ -0,0 +1,42 @@
+import inspect
+import os
+import random
+import numpy as np
+import torch
+
+# helpers shared by the agents' save_checkpoint/load_checkpoint
+
+
+# state of every global RNG the training loop draws from
+def get_rng_state():
+    return {
+        'python': random.getstate(),
+        'numpy': np.random.get_state(),
+        'torch': torch.get_rng_state(),
+    }
+
+
+def set_rng_state(state):
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+
+
+# writes to a temporary file first so a crash mid-save never leaves a torn checkpoint
+def atomic_save(state, path):
+    tmp = f"{path}.tmp"
+    torch.save(state, tmp)
+    os.replace(tmp, path)
+
+
+# torch.load only has weights_only since torch 1.13 (and defaults it to True since 2.6)
+LOAD_HAS_WEIGHTS_ONLY = 'weights_only' in inspect.signature(torch.load).parameters
+
+
+# checkpoints hold RNG states and numpy arrays, not only tensors, so they can't be
+# loaded with weights_only; only load checkpoints you wrote yourself
+def load(path):
+    if LOAD_HAS_WEIGHTS_ONLY:
+        return torch.load(path, weights_only=False)
+    # older versions always unpickle everything
+    return torch.load(path)
@@ -0,0 +1,208 @@
+from tetris_rl.environment import TetrisEngine
+from tetris_rl.bitboard import BitboardTetrisEngine
+
+# names accepted by make_engine
+ENGINE_NAMES = ('python', 'bitboard', 'cpp')
+
+
+# wraps the pybind11 C++ engine so it follows the same contract as the python engines:
+# get_next_states() -> {(rot, x): (board, reward, game_over)}, step((rot, x)) -> (reward, game_over)
+class CppTetrisEngine:
+    def __init__(self):
+        # imported here so the python engines work without the compiled module
+        import tetris_rl.tetris_engine as tetris_engine
+        self.env = tetris_engine.TetrisEngine()
+        # (K, 4) features of the candidates returned by the last get_next_states call
+        self.next_features = None
+
+    # own piece generator (std::mt19937), the sequence after the next reset() only
+    # depends on seed; it differs from the python engines' sequence for the same seed
+    def seed(self, seed):
+        self.env.seed(seed)
+
+    # piece generator state as a string, for checkpoints
+    def get_rng_state(self):
+        return self.env.get_rng_state()
+
+    def set_rng_state(self, state):
+        self.env.set_rng_state(state)
+
+    def reset(self):
+        self.env.reset()
+        self.next_features = None
+        return self.board
+
+    # numpy view on the engine's board, it follows the engine as it steps
+    @property
+    def board(self):
+        return self.env.board
+
+    @property
+    def score(self):
+        return self.env.score
+
+    # PieceType of the piece to place, an int in 0..6 (planner.PIECE_NAMES order)
+    @property
+    def current_piece(self):
+        return self.env.current_piece
+
+    @property
+    def lines(self):
+        return self.env.lines
+
+    @property
+    def game_over(self):
+        return self.env.game_over
+
+    def get_next_states(self):
+        # the boards come back as one (K, 20, 10) array, each candidate gets a view of it
+        boards, rotations, xs, rewards, game_overs, self.next_features = self.env.get_next_states_array()
+        return {
+            (rot, x): (board, reward, game_over)
+            for rot, x, board, reward, game_over
+            in zip(rotations.tolist(), xs.tolist(), boards, rewards.tolist(), game_overs.tolist())
+        }
+
+    # candidates without boards: (actions, features, rewards, game_overs), the input
+    # of DQNAgent.act_arrays; skips building the (K, 20, 10) boards entirely
+    def get_next_arrays(self):
+        _, rotations, xs, rewards, game_overs, features = self.env.get_next_states_array(with_boards=False)
+        return list(zip(rotations.tolist(), xs.tolist())), features, rewards, game_overs
+
+    def step(self, action):
+        step_res = self.env.step(action[0], action[1])
+        self.next_features = None
+        return step_res.reward, step_res.game_over
+
+
+# creates an engine by name: 'python' (environment.py), 'bitboard' (bitboard.py)
+# or 'cpp' (the compiled tetris_engine module)
+def make_engine(name):
+    if name == 'python':
+        return TetrisEngine()
+    if name == 'bitboard':
+        return BitboardTetrisEngine()
+    if name == 'cpp':
+        return CppTetrisEngine()
+    raise ValueError(f"unknown engine '{name}', expected one of {ENGINE_NAMES}")
+
+
+# plays whole games inside the C++ engine under a greedy linear policy: every candidate
+# scores reward_weight * reward + (game over ? 0 : weights . features), no python per move
+#   weights      -> 4 feature weights ([agg_height, holes, bumpiness, max_height]),
+#                   optionally followed by the reward weight (default 1); a (P, 4|5)
+#                   matrix plays the games of P policies in one parallel batch
+#   episodes     -> game i plays the pieces of CppTetrisEngine.seed(seed + i), for every policy
+#   threads      -> OpenMP threads, 0 for all cores (the results don't depend on it)
+#   trajectories -> also return every placement: a dict of piece, rotation, x, reward,
+#                   game_over, features (the afterstate) and per-game offsets
+# returns (scores, lines, pieces) numpy arrays of shape (episodes,), or (P, episodes)
+# for a weight matrix (plus the trajectory dict)
+def rollout_linear(weights, episodes=1, seed=0, max_pieces=5000, threads=0, trajectories=False):
+    import tetris_rl.tetris_engine as tetris_engine
+    return tetris_engine.rollout_linear(weights, episodes=episodes, seed=seed, max_pieces=max_pieces,
+                                        threads=threads, trajectories=trajectories)
+
+
+# turns a rollout_linear trajectory into replay transitions (state, reward, next_state,
+# game_over) for ReplayBuffer.save_many; the state before the first move of a game is
+# the empty board, whose features are all 0
+def trajectory_transitions(trajectory):
+    import numpy as np
+    next_states = trajectory['features']
+    states = np.empty_like(next_states)
+    states[1:] = next_states[:-1]
+    starts = trajectory['offsets'][:-1]
+    starts = starts[starts < len(next_states)]
+    states[starts] = 0.0
+    return states, trajectory['reward'], next_states, trajectory['game_over'].astype(np.float32)
+
+
+# plays one greedy linear game step by step through CppTetrisEngine, the reference
+# rollout_linear has to reproduce
+def play_linear(weights, seed, max_pieces=5000):
+    import numpy as np
+    weights = np.asarray(weights, dtype=np.float64)
+    reward_weight = weights[4] if len(weights) > 4 else 1.0
+    env = CppTetrisEngine()
+    env.seed(seed)
+    env.reset()
+    pieces = 0
+    while pieces < max_pieces:
+        actions, features, rewards, game_overs = env.get_next_arrays()
+        if not actions:
+            break
+        f = features.astype(np.float64)
+        values = f[:, 0] * weights[0] + f[:, 1] * weights[1] + f[:, 2] * weights[2] + f[:, 3] * weights[3]
+        scores = reward_weight * rewards.astype(np.float64) + np.where(game_overs, 0.0, values)
+        _, game_over = env.step(actions[int(np.argmax(scores))])
+        pieces += 1
+        if game_over:
+            break
+    return env.score, env.lines, pieces
+
+
+# randomized check that every available engine's candidate features (maintained
+# incrementally from the column stats) match features.get_features on the boards,
+# and that the native rollouts play the same games as the step-by-step engine
+if __name__ == "__main__":
+    import random
+    import numpy as np
+    from tetris_rl.features import get_features
+
+    names = []
+    for name in ENGINE_NAMES:
+        try:
+            make_engine(name)
+            names.append(name)
+        except ImportError:
+            print(f"skipping '{name}', the engine is not built")
+
+    random.seed(0)
+    for name in names:
+        engine = make_engine(name)
+        engine.reset()
+        checked = 0
+
+        for _ in range(3000):
+            states = engine.get_next_states()
+            if not states:
+                engine.reset()
+                continue
+
+            if engine.next_features is not None:
+                assert len(engine.next_features) == len(states)
+                for (board, _, _), features in zip(states.values(), engine.next_features):
+                    assert np.array_equal(features, get_features(board))
+                checked += len(states)
+
+            _, game_over = engine.step(random.choice(list(states.keys())))
+            if game_over:
+                engine.reset()
+
+        print(f"{name}: {checked} candidate features match get_features")
+
+    if 'cpp' in names:
+        import time
+        rng = np.random.default_rng(0)
+        for trial in range(20):
+            weights = np.append(rng.normal(size=4) * [0.5, 2.0, 0.5, 0.5] - [0.5, 3.0, 0.5, 0.5], rng.uniform(0, 2))
+            if trial % 2:
+                weights = weights[:4]
+            scores, lines, pieces = rollout_linear(weights, episodes=3, seed=trial * 3, max_pieces=500)
+            for i in range(3):
+                assert (scores[i], lines[i], pieces[i]) == play_linear(weights, trial * 3 + i, 500)
+        print("rollout_linear plays the same games as CppTetrisEngine")
+
+        population = rng.normal(size=(6, 5))
+        batch = rollout_linear(population, episodes=4, seed=7, max_pieces=300)
+        for p in range(len(population)):
+            single = rollout_linear(population[p], episodes=4, seed=7, max_pieces=300)
+            assert all(np.array_equal(b[p], s) for b, s in zip(batch, single))
+        print("a batch of policies plays the same games as one policy at a time")
+
+        weights = [-0.51, -0.36, -0.18, 0.0, 0.76]
+        start = time.perf_counter()
+        scores, lines, pieces = rollout_linear(weights, episodes=20, seed=0, max_pieces=20000)
+        elapsed = time.perf_counter() - start
+        print(f"rollout_linear: {pieces.sum() / elapsed:.0f} placements/sec, mean lines {lines.mean():.0f}")
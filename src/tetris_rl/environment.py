@@ -19,7 +19,7 @@ TETROMINOS = {
         [(0, -1), (0, 0), (0, 1), (-1, 0)], # 0: Up
         [(-1, 0), (0, 0), (1, 0), (0, 1)],  # 1: Right (was typo: (0,0) duplicated)
         [(0, -1), (0, 0), (0, 1), (1, 0)],  # 2: Down
-        [(0, 0), (-1, 0), (0, 1), (1, 0)]   # 3: Left
+        [(-1, 0), (0, -1), (0, 0), (1, 0)]  # 3: Left (was a copy of Right)
     ],
     'S': [
         [(0, -1), (0, 0), (-1, 0), (-1, 1)],
@@ -45,17 +45,40 @@ TETROMINOS = {
 
 class TetrisEngine:
     def __init__(self):
+        # piece generator, the global `random` module unless seed() was called
+        self.rng = random
         self.reset()
 
+    # gives this engine its own piece generator; the piece sequence after the next
+    # reset() only depends on `seed` (and matches the bitboard engine for the same seed)
+    def seed(self, seed):
+        self.rng = random.Random(seed)
+
+    # piece generator state, for checkpoints (the module's state until seed() is called)
+    def get_rng_state(self):
+        return self.rng.getstate()
+
+    def set_rng_state(self, state):
+        self.rng.setstate(state)
+
     # reset the game state
     def reset(self):
         # create a new game matrix
         self.board = np.zeros((BOARD_HEIGHT, BOARD_WIDTH), dtype=int)
         # reset score
         self.score = 0
+        # lines cleared this game
+        self.lines = 0
         self.game_over = False
         # assign a new first piece
         self.current_piece = self.get_new_piece()
+        # candidates from the last get_next_states call, only valid for the current piece
+        self.cached_states = None
+        # lines each of those candidates clears
+        self.cached_lines = None
+        # this engine scans whole boards, it leaves the candidate features to the agents
+        # (the bitboard and C++ engines fill this with a (K, 4) array)
+        self.next_features = None
         
         # return our board matrix
         return self.board
@@ -63,7 +86,7 @@ class TetrisEngine:
     # function to get a new piece randomly
     def get_new_piece(self):
         # select a new shape randomly
-        shape_name = random.choice(list(TETROMINOS.keys()))
+        shape_name = self.rng.choice(list(TETROMINOS.keys()))
 
         # return a dict with name and possible rotations
         return {
@@ -91,6 +114,7 @@ class TetrisEngine:
     # mapping to state, reward, value pairs
     def get_next_states(self):
         states = {}
+        cleared = {}
         piece_rotations = self.current_piece['rotations']
 
         for rot_idx, shape_coords in enumerate(piece_rotations):
@@ -134,7 +158,11 @@ class TetrisEngine:
                     reward -= 25
 
                 states[(rot_idx, x)] = (cleared_board, reward, is_game_over)
+                cleared[(rot_idx, x)] = int(lines)
 
+        # keep the candidates so step() can commit the chosen one without recomputing
+        self.cached_states = states
+        self.cached_lines = cleared
         return states
     
     # executes and action given by the player where the action is a tuple
@@ -142,12 +170,19 @@ class TetrisEngine:
     def step(self, action):
         rot_idx, x = action
 
-        possible_states = self.get_next_states()
+        # the training loops always call get_next_states before step, reuse its candidates
+        possible_states = self.cached_states
+        if possible_states is None:
+            possible_states = self.get_next_states()
 
         if (rot_idx, x) in possible_states:
             self.board, reward, self.game_over = possible_states[(rot_idx, x)]
             self.score += reward
+            self.lines += self.cached_lines[(rot_idx, x)]
             self.current_piece = self.get_new_piece()
+            # new piece, the cached candidates are stale
+            self.cached_states = None
+            self.cached_lines = None
             return reward, self.game_over
         else:
             # if an illegal move is attempted, end the game with negative reward
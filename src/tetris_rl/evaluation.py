@@ -0,0 +1,186 @@
+import multiprocessing as mp
+import sys
+import time
+import numpy as np
+from tetris_rl.engines import make_engine, rollout_linear
+from tetris_rl.inference import NumpyDQNPolicy
+from tetris_rl.planner import LookaheadPlanner
+
+# greedy evaluation of a trained policy, without any learning or exploration
+# every episode i plays the piece sequence of engine.seed(seed + i), so two policies
+# evaluated with the same seed see exactly the same games, and the results don't
+# depend on how many worker processes played them
+# (the python and bitboard engines share a piece sequence per seed, the C++ engine
+# has its own generator)
+# depth > 1 plays the moves of a LookaheadPlanner around the agent's values instead
+# of the agent's own one-ply choice
+# DQN policies saved as .npz play on the numpy snapshot and never import torch,
+# which makes the pool workers start much faster
+
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+# builds a greedy agent from a file written by agent.save (None: an untrained policy)
+def load_policy(agent_name, policy_path=None, hidden_layer_size=64):
+    if agent_name == 'dqn' and policy_path is not None and str(policy_path).endswith('.npz'):
+        return NumpyDQNPolicy.load(policy_path)
+    if agent_name == 'linear':
+        from tetris_rl.agents.linear import LinearAgent
+        agent = LinearAgent()
+        if policy_path is not None:
+            agent.load(policy_path)
+        return agent
+
+    # imported here so .npz policies don't pull in torch
+    from tetris_rl.training import make_agent
+    # evaluation never learns, so the DQN gets a one-slot replay buffer
+    agent = make_agent(agent_name, queue_len=1, hidden_layer_size=hidden_layer_size)
+    if policy_path is not None:
+        agent.load(policy_path)
+    agent.epsilon = 0.0
+    return agent
+
+
+# planner for the evaluation options, None for the agent's own greedy choice
+def make_planner(agent, depth=1, beam_width=4, time_budget=None):
+    if depth <= 1:
+        return None
+    return LookaheadPlanner.for_agent(agent, depth=depth, beam_width=beam_width, time_budget=time_budget)
+
+
+# plays one greedy game on a seeded piece sequence, returns (score, lines, pieces)
+def play_episode(env, agent, seed, max_pieces=5000, planner=None):
+    env.seed(seed)
+    env.reset()
+    use_arrays = hasattr(agent, 'act_arrays') and hasattr(env, 'get_next_arrays')
+    game_over = False
+    pieces = 0
+
+    while not game_over and pieces < max_pieces:
+        if planner is not None:
+            action = planner.act(env)
+            if action is None:
+                break
+        elif use_arrays:
+            actions, features, rewards, game_overs = env.get_next_arrays()
+            if not actions:
+                break
+            action = agent.act_arrays(actions, features, rewards, game_overs)
+        else:
+            possible_moves = env.get_next_states()
+            if not possible_moves:
+                break
+            if hasattr(agent, 'act'):
+                action = agent.act(possible_moves, env.next_features)
+            else:
+                action = agent.select_action(possible_moves, env.next_features)
+
+        _, game_over = env.step(action)
+        pieces += 1
+
+    return env.score, env.lines, pieces
+
+
+# statistics over the per-episode results
+def summarize(scores, lines, pieces, elapsed):
+    scores = np.asarray(scores, dtype=np.float64)
+    lines = np.asarray(lines, dtype=np.float64)
+    pieces = np.asarray(pieces, dtype=np.float64)
+
+    summary = {
+        'episodes': len(scores),
+        'mean_score': float(scores.mean()),
+        'std_score': float(scores.std()),
+        'min_score': float(scores.min()),
+        'max_score': float(scores.max()),
+    }
+    for q, value in zip(PERCENTILES, np.percentile(scores, PERCENTILES)):
+        summary[f'p{q}_score'] = float(value)
+    summary['median_score'] = summary['p50_score']
+    summary['mean_lines'] = float(lines.mean())
+    summary['max_lines'] = float(lines.max())
+    summary['mean_pieces'] = float(pieces.mean())
+    summary['episodes_per_sec'] = len(scores) / elapsed if elapsed > 0 else float('inf')
+    summary['pieces_per_sec'] = float(pieces.sum()) / elapsed if elapsed > 0 else float('inf')
+    return summary
+
+
+def format_summary(summary):
+    return (f"Episodes: {summary['episodes']} | Mean: {summary['mean_score']:.1f} "
+            f"(std {summary['std_score']:.1f}) | Median: {summary['median_score']:.1f} | "
+            f"P10/P90: {summary['p10_score']:.1f}/{summary['p90_score']:.1f} | "
+            f"Min/Max: {summary['min_score']:.0f}/{summary['max_score']:.0f} | "
+            f"Lines: {summary['mean_lines']:.1f} | Pieces: {summary['mean_pieces']:.1f} | "
+            f"Episodes/sec: {summary['episodes_per_sec']:.2f}")
+
+
+# results dict: the summary plus the per-episode 'seeds', 'scores', 'lines' and 'pieces'
+def make_results(seeds, results, elapsed):
+    scores, lines, pieces = (list(column) for column in zip(*results))
+    out = summarize(scores, lines, pieces, elapsed)
+    out.update(seeds=list(seeds), scores=scores, lines=lines, pieces=pieces)
+    return out
+
+
+# evaluates an agent object in this process; its epsilon is restored afterwards
+def evaluate_agent(agent, engine_name='bitboard', episodes=100, seed=0, max_pieces=5000,
+                   depth=1, beam_width=4, time_budget=None):
+    env = make_engine(engine_name)
+    planner = make_planner(agent, depth, beam_width, time_budget)
+    seeds = range(seed, seed + episodes)
+    epsilon = agent.epsilon
+    agent.epsilon = 0.0
+    start = time.perf_counter()
+    try:
+        results = [play_episode(env, agent, s, max_pieces, planner) for s in seeds]
+    finally:
+        agent.epsilon = epsilon
+    return make_results(seeds, results, time.perf_counter() - start)
+
+
+# evaluates a linear policy (see engines.rollout_linear) with whole games played inside the
+# C++ engine on `threads` OpenMP threads (0: all cores); episode i uses seed + i like above
+def evaluate_linear(weights, episodes=100, seed=0, max_pieces=5000, threads=0):
+    seeds = range(seed, seed + episodes)
+    start = time.perf_counter()
+    scores, lines, pieces = rollout_linear(weights, episodes, seed, max_pieces, threads)
+    results = zip(scores.tolist(), lines.tolist(), pieces.tolist())
+    return make_results(seeds, results, time.perf_counter() - start)
+
+
+# state of a pool worker, set up once by init_worker
+_worker = None
+
+
+def init_worker(engine_name, agent_name, policy_path, hidden_layer_size, max_pieces, planner_options):
+    global _worker
+    agent = load_policy(agent_name, policy_path, hidden_layer_size)
+    if 'torch' in sys.modules:
+        # the workers already use every core, one torch thread each avoids oversubscription
+        sys.modules['torch'].set_num_threads(1)
+    _worker = (make_engine(engine_name), agent, max_pieces, make_planner(agent, *planner_options))
+
+
+def run_episode(seed):
+    env, agent, max_pieces, planner = _worker
+    return play_episode(env, agent, seed, max_pieces, planner)
+
+
+# evaluates a saved policy over `episodes` seeded games split across `workers` processes
+# (workers=1 plays them in this process)
+# depth, beam_width and time_budget configure the lookahead planner (depth 1: no planner)
+def evaluate(agent_name, policy_path=None, engine_name='bitboard', episodes=100, seed=0,
+             workers=1, max_pieces=5000, hidden_layer_size=64, depth=1, beam_width=4, time_budget=None):
+    if workers <= 1:
+        agent = load_policy(agent_name, policy_path, hidden_layer_size)
+        return evaluate_agent(agent, engine_name, episodes, seed, max_pieces, depth, beam_width, time_budget)
+
+    seeds = range(seed, seed + episodes)
+    ctx = mp.get_context('spawn')
+    start = time.perf_counter()
+    with ctx.Pool(workers, initializer=init_worker,
+                  initargs=(engine_name, agent_name, policy_path, hidden_layer_size, max_pieces,
+                            (depth, beam_width, time_budget))) as pool:
+        # map keeps the seed order, so the per-episode lists line up with `seeds`
+        results = pool.map(run_episode, seeds, chunksize=max(1, episodes // (4 * workers)))
+    return make_results(seeds, results, time.perf_counter() - start)
@@ -66,6 +66,32 @@ def get_features(board):
 
     return np.array([agg_height, holes, bumpiness, max_height])
 
+# Input: (N, 20, 10) stack of boards
+# Output: (N, 4) array of features, one [agg_height, holes, bumpiness, max_height] row per board
+# same values as get_features, but computed for every board with whole-array operations
+def get_features_batch(boards):
+    boards = np.asarray(boards)
+    filled = boards != 0
+    height = boards.shape[1]
+
+    # heights are computed once and shared by every feature
+    # a column with no blocks has argmax 0, so mask it out with any()
+    has_block = filled.any(axis=1)
+    tops = filled.argmax(axis=1)
+    heights = np.where(has_block, height - tops, 0)
+
+    # every block of a column is at or below its top, so the empty cells
+    # under the top are the height minus the number of blocks
+    holes = heights - filled.sum(axis=1)
+
+    features = np.empty((boards.shape[0], 4), dtype=heights.dtype)
+    features[:, 0] = heights.sum(axis=1)
+    features[:, 1] = holes.sum(axis=1)
+    features[:, 2] = np.abs(np.diff(heights, axis=1)).sum(axis=1)
+    features[:, 3] = heights.max(axis=1)
+
+    return features
+
 if __name__ == "__main__":
     
     test_board = np.zeros((20, 10), dtype=int)
@@ -86,3 +112,11 @@ if __name__ == "__main__":
     assert features[1] == 1
     assert features[2] == 4
     assert features[3] == 3
+
+    # the batched version has to agree with get_features on random boards
+    rng = np.random.default_rng(0)
+    boards = (rng.random((500, 20, 10)) < rng.random((500, 1, 1))).astype(int)
+    boards[:50] = 0
+    batch = get_features_batch(boards)
+    for board, row in zip(boards, batch):
+        assert np.array_equal(get_features(board), row)
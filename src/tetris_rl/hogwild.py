@@ -0,0 +1,162 @@
+import multiprocessing as mp
+import queue
+import random
+import time
+from collections import deque
+import numpy as np
+from tetris_rl.agents.tabular import TabularAgent, NUM_STATES
+from tetris_rl.engines import make_engine
+from tetris_rl.features import get_features
+
+# parallel tabular training: K worker processes each play their own games and apply
+# TD(0) updates straight into one value table in shared memory, without locks
+# (Hogwild: updates to the same state may occasionally overwrite each other, which
+# with 3584 states and tiny updates costs far less than synchronizing would)
+#
+# average_every switches to a reproducible mode instead: every worker updates a
+# private copy of the table, and every average_every episodes the workers meet at a
+# barrier and continue from the mean of their tables; with seeded workers the result
+# no longer depends on how the OS schedules the processes
+
+MAX_PIECES_IN_GAME = 5000
+
+# start epsilon, per-episode decay and floor of the default TabularAgent schedule
+DEFAULT_SCHEDULE = (0.5, 0.9997, 0.02)
+
+
+# spreads `episodes` over the workers; the averaging mode needs the same count everywhere
+def split_episodes(episodes, num_workers, equal):
+    if equal:
+        return [-(-episodes // num_workers)] * num_workers
+    return [episodes // num_workers + (1 if i < episodes % num_workers else 0) for i in range(num_workers)]
+
+
+# body of a worker process
+def run_worker(worker_id, engine_name, episodes, schedule, shared_table, private_tables,
+               average_every, barrier, stats, cache_size, seed):
+    random.seed(seed)
+    np.random.seed(seed)
+
+    env = make_engine(engine_name)
+    agent = TabularAgent(cache_size)
+    agent.epsilon, agent.epsilon_decay, agent.epsilon_min = schedule
+
+    table = np.frombuffer(shared_table, dtype=np.float64)
+    if average_every:
+        # private table, merged with the others at the barrier
+        private = np.frombuffer(private_tables, dtype=np.float64).reshape(-1, NUM_STATES)
+        agent.q_table = private[worker_id]
+        agent.q_table[:] = table
+    else:
+        # the shared table itself, every update is visible to the other workers right away
+        agent.q_table = table
+
+    for episode in range(episodes):
+        board = env.reset()
+        game_over = False
+        pieces = 0
+        state_after = get_features(board)
+
+        while not game_over:
+            state_before = state_after
+            possible_moves = env.get_next_states()
+            if not possible_moves:
+                break
+
+            action = agent.select_action(possible_moves, env.next_features)
+            reward, game_over = env.step(action)
+
+            state_after = agent.chosen_features
+            agent.update(state_before, reward, state_after, game_over)
+
+            pieces += 1
+            if pieces >= MAX_PIECES_IN_GAME:
+                game_over = True
+
+        agent.update_epsilon()
+        stats.put((worker_id, env.score, pieces))
+
+        last = episode + 1 == episodes
+        if average_every and ((episode + 1) % average_every == 0 or last):
+            average_tables(worker_id, table, private, barrier)
+
+
+# every worker waits for the others, worker 0 writes the mean into the shared table
+# and then all of them continue from it
+def average_tables(worker_id, table, private, barrier):
+    barrier.wait()
+    if worker_id == 0:
+        table[:] = private.mean(axis=0)
+    barrier.wait()
+    private[worker_id] = table
+
+
+# trains a TabularAgent with num_workers processes, returns it with the final table
+#   schedules     -> one (start epsilon, decay, min epsilon) per worker, decayed per
+#                    episode by every worker on its own (default: DEFAULT_SCHEDULE each)
+#   average_every -> None for lock-free Hogwild updates, or the number of episodes
+#                    between table averages for the reproducible mode
+#   report_every  -> print the aggregated progress every this many finished episodes
+def train_tabular_parallel(num_workers=4, engine_name='bitboard', episodes=10000, schedules=None,
+                           average_every=None, report_every=100, cache_size=0, seed=0):
+    if schedules is None:
+        schedules = [DEFAULT_SCHEDULE] * num_workers
+    if len(schedules) != num_workers:
+        raise ValueError("need one epsilon schedule per worker")
+
+    ctx = mp.get_context('spawn')
+    shared_table = ctx.RawArray('d', NUM_STATES)
+    private_tables = ctx.RawArray('d', num_workers * NUM_STATES) if average_every else None
+    barrier = ctx.Barrier(num_workers) if average_every else None
+    stats = ctx.Queue()
+
+    counts = split_episodes(episodes, num_workers, equal=bool(average_every))
+    workers = [
+        ctx.Process(target=run_worker, daemon=True,
+                    args=(i, engine_name, counts[i], schedules[i], shared_table, private_tables,
+                          average_every, barrier, stats, cache_size, seed + 1 + i))
+        for i in range(num_workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    mode = f"averaging every {average_every} episodes" if average_every else "lock-free shared table"
+    print(f"Starting to train the tabular agent with {num_workers} workers ({mode})...")
+    print(f"{sum(counts)} episodes.")
+
+    table = np.frombuffer(shared_table, dtype=np.float64)
+    score_window = deque(maxlen=100)
+    finished = 0
+    pieces_total = 0
+    start_time = time.perf_counter()
+
+    try:
+        while finished < sum(counts):
+            try:
+                worker_id, score, pieces = stats.get(timeout=1.0)
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    raise RuntimeError("the tabular workers exited before finishing their episodes")
+                continue
+
+            finished += 1
+            pieces_total += pieces
+            score_window.append(score)
+
+            if finished % report_every == 0:
+                avg = sum(score_window) / len(score_window)
+                elapsed = time.perf_counter() - start_time
+                print(f"Episode: {finished} | Score: {score} | Avg100: {avg:.1f} | "
+                      f"States: {np.count_nonzero(table)} | Episodes/sec: {finished / elapsed:.1f} | "
+                      f"Pieces/sec: {pieces_total / elapsed:.0f}")
+
+        for worker in workers:
+            worker.join()
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+
+    agent = TabularAgent()
+    agent.q_table[:] = table
+    return agent
@@ -0,0 +1,115 @@
+import random
+import numpy as np
+
+# torch-free forward pass of models.dqn.DQNModel for action selection
+# the network is tiny (4 -> 64 -> 64 -> 64 -> 1), so for the few dozen candidates of a
+# move most of a torch forward call is dispatch overhead; a snapshot of the weights as
+# contiguous float32 numpy arrays evaluates the same batch with plain matmul + ReLU
+# this module never imports torch: snapshots saved as .npz can be loaded and played
+# (NumpyDQNPolicy) by processes that don't have or don't want to import torch
+
+# layer names of DQNModel, in forward order
+LAYERS = ('fc1', 'fc2', 'fc3', 'out')
+
+
+class NumpyDQN:
+    # layers: [(weight (in, out), bias (out,)), ...] in forward order
+    def __init__(self, layers):
+        self.layers = [(np.ascontiguousarray(w, dtype=np.float32), np.ascontiguousarray(b, dtype=np.float32))
+                       for w, b in layers]
+
+    # snapshot of a DQNModel (or any module with the same layer names)
+    @classmethod
+    def from_model(cls, model):
+        return cls.from_state_dict({k: v.detach().cpu().numpy() for k, v in model.state_dict().items()})
+
+    # from a {name: array} state dict in torch's (out, in) weight layout
+    @classmethod
+    def from_state_dict(cls, state):
+        return cls([(np.asarray(state[f'{name}.weight']).T, state[f'{name}.bias']) for name in LAYERS])
+
+    # copies the current weights of a DQNModel into the existing arrays
+    def sync(self, model):
+        state = model.state_dict()
+        for (w, b), name in zip(self.layers, LAYERS):
+            w[:] = state[f'{name}.weight'].detach().cpu().numpy().T
+            b[:] = state[f'{name}.bias'].detach().cpu().numpy()
+
+    # (N, 4) or (4,) features -> (N,) float32 values, same as DQNModel.forward
+    def __call__(self, features):
+        x = np.asarray(features, dtype=np.float32).reshape(-1, self.layers[0][0].shape[0])
+        for w, b in self.layers[:-1]:
+            x = x @ w
+            x += b
+            np.maximum(x, 0.0, out=x)
+        w, b = self.layers[-1]
+        return (x @ w + b).reshape(-1)
+
+    # torch-free file with the weights, in the state dict layout
+    def save(self, path):
+        arrays = {}
+        for (w, b), name in zip(self.layers, LAYERS):
+            arrays[f'{name}.weight'] = w.T
+            arrays[f'{name}.bias'] = b
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            return cls.from_state_dict(dict(arrays))
+
+
+# greedy player on a NumpyDQN snapshot, with the action selection interface of
+# DQNAgent (act, act_arrays, predict_values) so evaluation and the planner can use it
+class NumpyDQNPolicy:
+    def __init__(self, model, gamma=0.98, epsilon=0.0):
+        self.model = model
+        self.gamma = gamma
+        self.epsilon = epsilon
+        self.chosen_features = None
+
+    @classmethod
+    def load(cls, path, **options):
+        return cls(NumpyDQN.load(path), **options)
+
+    def predict_values(self, features):
+        return self.model(features)
+
+    def act(self, next_states, features=None):
+        actions = list(next_states.keys())
+        rewards = np.array([reward for (_, reward, _) in next_states.values()], dtype=np.float32)
+        game_overs = np.array([game_over for (_, _, game_over) in next_states.values()], dtype=np.float32)
+        if features is None:
+            from tetris_rl.features import get_features_batch
+            features = get_features_batch(np.stack([board for (board, _, _) in next_states.values()]))
+        return self.act_arrays(actions, features, rewards, game_overs)
+
+    def act_arrays(self, actions, features, rewards, game_overs):
+        if random.random() < self.epsilon:
+            index = random.randrange(len(actions))
+        else:
+            scores = (np.asarray(rewards, dtype=np.float32)
+                      + self.gamma * self.model(features) * (1.0 - np.asarray(game_overs, dtype=np.float32)))
+            # argmax returns the first best candidate, same tie breaking as DQNAgent
+            index = int(np.argmax(scores))
+        self.chosen_features = features[index]
+        return actions[index]
+
+
+# the snapshot must match the torch model, before and after the weights change
+if __name__ == "__main__":
+    import torch
+    from tetris_rl.models import DQNModel
+
+    model = DQNModel()
+    snapshot = NumpyDQN.from_model(model)
+    features = np.random.default_rng(0).integers(0, 60, (500, 4)).astype(np.float32)
+    for _ in range(2):
+        with torch.no_grad():
+            expected = model(torch.from_numpy(features)).numpy()
+        assert np.allclose(snapshot(features), expected, rtol=1e-5, atol=1e-5)
+        with torch.no_grad():
+            for p in model.parameters():
+                p.add_(torch.randn_like(p) * 0.1)
+        snapshot.sync(model)
+    print("NumpyDQN matches DQNModel.")
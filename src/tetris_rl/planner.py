@@ -0,0 +1,261 @@
+import time
+import numpy as np
+from tetris_rl.environment import TETROMINOS
+from tetris_rl.bitboard import PLACEMENTS, board_to_rows, drop_piece, get_column_tops, place_piece, rows_to_board
+from tetris_rl.features import get_features_batch
+
+# lookahead over afterstates: instead of the one-ply reward + gamma * V(afterstate),
+# the planner also places the pieces that come after the current one
+#
+# the search runs depth by depth on the bitboard row masks:
+#   depth 1   -> every placement of the current piece (the one-ply greedy choice)
+#   depth d+1 -> for the best beam_width afterstates of every (board, piece) at depth d,
+#                every placement of every next piece (expectimax: the 7 pieces are
+#                equally likely) or of the known preview piece
+# the placements only move row masks around; the features and values of all the new
+# afterstates of a depth are computed in one batch, and boards reached twice at the
+# same depth (a transposition table per depth) are expanded and evaluated once
+# values are backed up as V(s) = sum_p P(p) * max_a (r + gamma * V(s')), afterstates
+# that weren't expanded keep their value estimate and game overs are worth 0
+#
+# time_budget (seconds) stops expanding further boards once it runs out; the first
+# depth is always complete, so the planner never does worse than the greedy choice
+
+# piece names in the order of the C++ engine's PieceType enum
+PIECE_NAMES = tuple(TETROMINOS)
+
+
+# value function for an agent: (N, 4) features -> (N,) float64 values
+def make_value_fn(agent):
+    if hasattr(agent, 'q_table'):
+        # imported here, the agents package pulls in torch (see inference.py)
+        from tetris_rl.agents.tabular import discretize_batch
+        return lambda features: agent.q_table[discretize_batch(features)]
+    return lambda features: np.asarray(agent.predict_values(features), dtype=np.float64)
+
+
+# every placement of a piece on a board, in engine order
+# yields ((rot_idx, x), next_rows, reward, game_over)
+def expand(rows, piece_name):
+    tops = get_column_tops(rows)
+
+    for rot_idx, options in enumerate(PLACEMENTS[piece_name]):
+        for (x, cells, profile, min_dy) in options:
+            y = drop_piece(rows, tops, cells, profile, min_dy)
+            if y is None:
+                continue
+
+            next_rows, reward, game_over, _ = place_piece(rows, cells, y)
+            yield (rot_idx, x), next_rows, reward, game_over
+
+
+# the boards of one depth, merged by board (the transposition table)
+class Level:
+    def __init__(self):
+        self.index = {}
+        self.rows = []
+        self.game_overs = []
+        # edges into this depth: parent node, (parent, piece) group, child node, reward
+        self.parents = []
+        self.groups = []
+        self.children = []
+        self.rewards = []
+        # probability of the piece behind every group
+        self.group_probs = []
+        self.hits = 0
+        # nodes of the depth above that were expanded into this one
+        self.expanded_parents = []
+        # r + gamma * V estimates of the boards, replaced by the backed up values
+        # for the boards that were expanded further
+        self.values = None
+
+    # adds an edge to the board, reusing the node if the board was seen at this depth
+    def add(self, parent, group, rows, reward, game_over):
+        key = tuple(rows)
+        child = self.index.get(key)
+        if child is None:
+            child = len(self.rows)
+            self.index[key] = child
+            self.rows.append(rows)
+            self.game_overs.append(game_over)
+        else:
+            self.hits += 1
+
+        self.parents.append(parent)
+        self.groups.append(group)
+        self.children.append(child)
+        self.rewards.append(reward)
+
+
+class LookaheadPlanner:
+    #   value_fn    -> (N, 4) features -> (N,) values, see make_value_fn
+    #   depth       -> number of pieces to look at, 1 is the greedy one-ply choice
+    #   beam_width  -> afterstates expanded per (board, piece), ranked by r + gamma * V
+    #   time_budget -> seconds per move (None: no limit)
+    def __init__(self, value_fn, gamma=0.98, depth=2, beam_width=4, time_budget=None):
+        if depth < 1 or beam_width < 1:
+            raise ValueError("depth and beam_width must be at least 1")
+        self.value_fn = value_fn
+        self.gamma = gamma
+        self.depth = depth
+        self.beam_width = beam_width
+        self.time_budget = time_budget
+        # nodes, leaf evaluations, transposition hits, reached depth and time of the last plan
+        self.last_stats = None
+
+    # builds a planner around an agent's value estimates and discount
+    @classmethod
+    def for_agent(cls, agent, **options):
+        return cls(make_value_fn(agent), gamma=agent.gamma, **options)
+
+    # best (rot_idx, x) for piece_name on a board given as row masks
+    # preview: names of the known pieces after the current one, deeper plies use expectimax
+    def plan(self, rows, piece_name, preview=()):
+        start = time.perf_counter()
+        deadline = None if self.time_budget is None else start + self.time_budget
+
+        levels = []
+        # the root is the only board of depth 0, expanded with the current piece
+        frontier = [(0, list(rows))]
+        actions = []
+        evaluated = 0
+
+        for d in range(self.depth):
+            if d == 0:
+                pieces = [(piece_name, 1.0)]
+            elif d - 1 < len(preview):
+                pieces = [(preview[d - 1], 1.0)]
+            else:
+                pieces = [(name, 1.0 / len(PIECE_NAMES)) for name in PIECE_NAMES]
+
+            level = Level()
+            for node, node_rows in frontier:
+                # the current piece is always expanded so there is an action to return
+                if d > 0 and deadline is not None and time.perf_counter() > deadline:
+                    break
+
+                for name, prob in pieces:
+                    group = len(level.group_probs)
+                    level.group_probs.append(prob)
+                    for action, next_rows, reward, game_over in expand(node_rows, name):
+                        level.add(node, group, next_rows, reward, game_over)
+                        if d == 0:
+                            actions.append(action)
+                level.expanded_parents.append(node)
+
+            if not level.rows:
+                break
+
+            # one batched feature and value pass over every new board of this depth
+            game_overs = np.array(level.game_overs, dtype=bool)
+            features = get_features_batch(rows_to_board(level.rows)).astype(np.float64)
+            values = np.asarray(self.value_fn(features), dtype=np.float64)
+            level.values = np.where(game_overs, 0.0, values)
+            evaluated += len(level.rows)
+            levels.append(level)
+
+            if d + 1 == self.depth:
+                break
+
+            # keep the best beam_width afterstates of every (board, piece) group
+            groups = np.array(level.groups)
+            children = np.array(level.children)
+            scores = np.array(level.rewards) + self.gamma * level.values[children]
+            # a game over can't be expanded
+            scores[game_overs[children]] = -np.inf
+            order = np.lexsort((-scores, groups))
+            first = np.searchsorted(groups[order], groups[order])
+            keep = order[(np.arange(len(order)) - first < self.beam_width) & np.isfinite(scores[order])]
+            selected = np.unique(children[keep])
+            frontier = [(child, level.rows[child]) for child in selected]
+
+        # back the values up from the deepest level to the root
+        for d in range(len(levels) - 1, -1, -1):
+            level = levels[d]
+            children = np.array(level.children)
+            groups = np.array(level.groups)
+            scores = np.array(level.rewards) + self.gamma * level.values[children]
+            if d == 0:
+                break
+
+            best = np.full(len(level.group_probs), -np.inf)
+            np.maximum.at(best, groups, scores)
+            # a piece without any legal placement ends the game, worth 0
+            # (its group has no edges, so it adds 0 to whatever parent it maps to)
+            best[np.isinf(best)] = 0.0
+            group_parents = np.zeros(len(level.group_probs), dtype=np.intp)
+            group_parents[groups] = np.array(level.parents)
+
+            parent = levels[d - 1]
+            backed = np.zeros(len(parent.rows))
+            np.add.at(backed, group_parents, np.array(level.group_probs) * best)
+            nodes = np.array(level.expanded_parents, dtype=np.intp)
+            parent.values[nodes] = backed[nodes]
+
+        self.last_stats = {
+            'nodes': sum(len(level.rows) for level in levels),
+            'evaluated': evaluated,
+            'transpositions': sum(level.hits for level in levels),
+            'depth': len(levels),
+            'seconds': time.perf_counter() - start,
+        }
+
+        if not levels:
+            return None
+        # argmax returns the first best placement, same tie breaking as the agents
+        return actions[int(np.argmax(scores))]
+
+    # plans the move of an engine's current piece (python, bitboard or C++ engine)
+    def act(self, env, preview=()):
+        if hasattr(env, 'rows'):
+            rows = env.rows
+        else:
+            rows = board_to_rows(env.board)
+
+        piece = env.current_piece
+        piece_name = piece['name'] if isinstance(piece, dict) else PIECE_NAMES[piece]
+        return self.plan(rows, piece_name, preview)
+
+
+# depth 1 must match the tabular agent's greedy choice, deeper searches are timed
+if __name__ == "__main__":
+    import random
+    from tetris_rl.agents import TabularAgent
+    from tetris_rl.bitboard import BitboardTetrisEngine
+
+    rng = np.random.default_rng(0)
+    agent = TabularAgent()
+    agent.q_table[:] = rng.normal(size=len(agent.q_table))
+    agent.epsilon = 0.0
+    greedy = LookaheadPlanner.for_agent(agent, depth=1)
+
+    env = BitboardTetrisEngine()
+    env.seed(0)
+    env.reset()
+    for _ in range(300):
+        states = env.get_next_states()
+        if not states:
+            break
+        action = agent.select_action(states, env.next_features)
+        assert greedy.act(env) == action
+        _, game_over = env.step(action)
+        if game_over:
+            env.reset()
+    print("Depth 1 planner matches the greedy tabular agent.")
+
+    random.seed(0)
+    for depth, beam_width in ((2, 4), (2, 34), (3, 2)):
+        planner = LookaheadPlanner.for_agent(agent, depth=depth, beam_width=beam_width)
+        env.seed(1)
+        env.reset()
+        moves, evaluated, seconds = 0, 0, 0.0
+        while moves < 20:
+            action = planner.act(env)
+            evaluated += planner.last_stats['evaluated']
+            seconds += planner.last_stats['seconds']
+            moves += 1
+            _, game_over = env.step(action)
+            if game_over:
+                env.reset()
+        print(f"depth {depth}, beam {beam_width}: {evaluated / moves:.0f} evaluations/move, "
+              f"{1000 * seconds / moves:.1f} ms/move")
@@ -0,0 +1,172 @@
+import csv
+import json
+import time
+
+# lightweight instrumentation for the training loops
+#   with telemetry.phase('moves'): ...   -> accumulates the time spent in a phase
+#   telemetry.count('pieces')            -> bumps a counter
+#   telemetry.report(episode=..., ...)   -> prints rates and phase shares, appends a log record
+# phases are exclusive: entering a phase pauses the one around it, so the shares add
+# up to at most 100% (the rest is reported as 'other')
+# NULL_TELEMETRY has the same interface and does nothing, it is the default everywhere
+
+# phase names used by the scripts and agents, in the order they are printed
+PHASES = ('moves', 'convert', 'features', 'act', 'step', 'insert', 'sample', 'gradient', 'priorities', 'update',
+          'checkpoint')
+
+
+# accumulated time of one phase, reused for every entry so timing allocates nothing
+class Phase:
+    def __init__(self, telemetry):
+        self.telemetry = telemetry
+        self.total = 0.0
+        self.start = 0.0
+        self.parent = None
+
+    def __enter__(self):
+        now = time.perf_counter()
+        parent = self.telemetry.current
+        if parent is not None:
+            parent.total += now - parent.start
+        self.parent = parent
+        self.telemetry.current = self
+        self.start = now
+        return self
+
+    def __exit__(self, *exc):
+        now = time.perf_counter()
+        self.total += now - self.start
+        self.telemetry.current = self.parent
+        if self.parent is not None:
+            # the outer phase picks up where it left off
+            self.parent.start = now
+        return False
+
+
+class Telemetry:
+    # log_path: streaming log, one record per report(); .csv writes CSV, anything else JSONL
+    def __init__(self, log_path=None):
+        self.enabled = True
+        self.phases = {}
+        self.counters = {}
+        self.current = None
+
+        self.start_time = time.perf_counter()
+        self.last_time = self.start_time
+        self.last_counters = {}
+
+        self.log_file = None
+        self.csv_writer = None
+        self.log_path = log_path
+        if log_path is not None:
+            self.log_file = open(log_path, 'w', newline='')
+
+    def phase(self, name):
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = Phase(self)
+        return phase
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    # phases seen so far, the known ones in PHASES order first
+    def phase_names(self):
+        names = [name for name in PHASES if name in self.phases]
+        return names + [name for name in self.phases if name not in PHASES]
+
+    # rates and phase shares since the last snapshot, then starts a new interval
+    def snapshot(self):
+        now = time.perf_counter()
+        elapsed = now - self.last_time
+
+        record = {'elapsed': now - self.start_time, 'interval': elapsed}
+        for name, value in self.counters.items():
+            delta = value - self.last_counters.get(name, 0)
+            record[name] = value
+            record[f'{name}_per_sec'] = delta / elapsed if elapsed > 0 else 0.0
+
+        accounted = 0.0
+        for name in self.phase_names():
+            phase = self.phases[name]
+            accounted += phase.total
+            record[f'{name}_sec'] = phase.total
+            record[f'{name}_share'] = phase.total / elapsed if elapsed > 0 else 0.0
+            phase.total = 0.0
+        record['other_share'] = max(0.0, 1.0 - accounted / elapsed) if elapsed > 0 else 0.0
+
+        self.last_time = now
+        self.last_counters = dict(self.counters)
+        return record
+
+    # prints one summary line and appends fields + snapshot to the log
+    def report(self, **fields):
+        record = dict(fields)
+        record.update(self.snapshot())
+
+        rates = [f"{name}/s: {record[name + '_per_sec']:.0f}" for name in self.counters]
+        shares = [f"{name} {record[name + '_share']:.0%}" for name in self.phase_names()]
+        shares.append(f"other {record['other_share']:.0%}")
+        print(f"  {' | '.join(rates)} | {' '.join(shares)}")
+
+        self.write(record)
+        return record
+
+    def write(self, record):
+        if self.log_file is None:
+            return
+
+        if self.log_path.endswith('.csv'):
+            if self.csv_writer is None:
+                # columns are fixed by the first record, later phases are ignored
+                self.csv_writer = csv.DictWriter(self.log_file, fieldnames=list(record),
+                                                 extrasaction='ignore', restval='')
+                self.csv_writer.writeheader()
+            self.csv_writer.writerow(record)
+        else:
+            self.log_file.write(json.dumps(record) + '\n')
+        self.log_file.flush()
+
+    def close(self):
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
+
+
+# stand-in for a phase when telemetry is off
+class NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_PHASE = NullPhase()
+
+
+# telemetry switched off: every call returns right away and nothing is recorded
+class NullTelemetry:
+    enabled = False
+
+    def phase(self, name):
+        return NULL_PHASE
+
+    def count(self, name, n=1):
+        pass
+
+    def report(self, **fields):
+        return None
+
+    def close(self):
+        pass
+
+
+NULL_TELEMETRY = NullTelemetry()
+
+
+# Telemetry(log_path) when profiling is on, NULL_TELEMETRY otherwise
+def make_telemetry(enabled=True, log_path=None):
+    if not enabled:
+        return NULL_TELEMETRY
+    return Telemetry(log_path)
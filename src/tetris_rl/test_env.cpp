@@ -2,7 +2,11 @@
 #include <unordered_map>
 #include <cstring>
 #include <random>
+#include <sstream>
+#include <string>
 #include <algorithm>
+#include <cstdlib>
+#include <stdexcept>
 #include <omp.h>
 
 constexpr int BOARD_HEIGHT = 20;
@@ -41,17 +45,23 @@ constexpr int PIECE_ROTATIONS[7] = {
     4   // 6: L
 };
 
+constexpr int NUM_FEATURES = 4;
+
 struct NextState {
     int rotation;
     int x;
     std::vector<int> board;
     float reward;
     bool game_over;
+    // [agg_height, holes, bumpiness, max_height] of the board after the move
+    float features[NUM_FEATURES];
 };
 
 struct StepResult {
     float reward;
     bool game_over;
+    // features of the board after the move, taken from the cached candidate
+    float features[NUM_FEATURES];
 };
 
 // Python (y,x) -> C++ Point{x,y} since .x=col, .y=row
@@ -97,48 +107,263 @@ constexpr Point TETROMINOES[7][4][4] = {
         {{-1, 0}, {0, 0}, {1, 0}, {-1, -1}},
         {{0, -1}, {0, 0}, {0, 1}, {1, -1}},
         {{-1, 0}, {0, 0}, {1, 0}, {1, 1}},
-        {{-1, 1}, {-1, 0}, {0, 0}, {0, 1}}
+        {{-1, 1}, {0, -1}, {0, 0}, {0, 1}}
     },
     // 6: L
     {
         {{-1, 0}, {0, 0}, {1, 0}, {1, -1}},
         {{0, -1}, {0, 0}, {0, 1}, {1, 1}},
         {{-1, 0}, {0, 0}, {1, 0}, {-1, 1}},
-        {{-1, -1}, {-1, 0}, {0, 0}, {0, 1}}
+        {{-1, -1}, {0, -1}, {0, 0}, {0, 1}}
+    }
+};
+
+// height and hole count of every column, the per-column state the features are built from
+template <typename Cell>
+void compute_column_stats(const Cell* board, int* heights, int* holes) {
+    for (int col = 0; col < BOARD_WIDTH; col++) {
+        heights[col] = 0;
+        int blocks = 0;
+
+        for (int row = 0; row < BOARD_HEIGHT; row++) {
+            if (board[(row * BOARD_WIDTH) + col] != 0) {
+                // the first block from the top sets the height
+                if (heights[col] == 0) {
+                    heights[col] = BOARD_HEIGHT - row;
+                }
+                blocks++;
+            }
+        }
+
+        // every empty cell under the top block is a hole
+        holes[col] = heights[col] - blocks;
+    }
+}
+
+// same features as tetris_rl/features.py: [agg_height, holes, bumpiness, max_height]
+// so DQN training doesn't have to send whole boards back to python
+template <typename Stat>
+void features_from_stats(const Stat* heights, const Stat* holes, float* out) {
+    int agg_height = 0;
+    int total_holes = 0;
+    int bumpiness = 0;
+    int max_height = 0;
+    for (int col = 0; col < BOARD_WIDTH; col++) {
+        agg_height += heights[col];
+        total_holes += holes[col];
+        max_height = std::max(max_height, static_cast<int>(heights[col]));
+        if (col + 1 < BOARD_WIDTH) {
+            bumpiness += std::abs(heights[col] - heights[col + 1]);
+        }
+    }
+
+    out[0] = static_cast<float>(agg_height);
+    out[1] = static_cast<float>(total_holes);
+    out[2] = static_cast<float>(bumpiness);
+    out[3] = static_cast<float>(max_height);
+}
+
+template <typename Cell>
+void compute_features(const Cell* board, float* out) {
+    int heights[BOARD_WIDTH];
+    int holes[BOARD_WIDTH];
+    compute_column_stats(board, heights, holes);
+    features_from_stats(heights, holes, out);
+}
+
+// one legal (rotation, x) of a piece with everything the fast path needs to drop it:
+// the lowest block of every covered column (bottom profile) is compared against the
+// column heights, so the landing row is found without probing row by row
+struct Placement {
+    int rotation;
+    int x;
+    // index into the (rotation, x) lookup table used by step()
+    int slot;
+    // highest row offset of the piece, to reject moves that stick out of the top
+    int min_dy;
+    int num_columns;
+    int columns[4];
+    // lowest and highest block of the piece in every covered column
+    int bottoms[4];
+    int tops[4];
+    // the piece as row masks (bit c -> column c), used by the rollout kernel
+    int num_rows;
+    int row_dy[4];
+    uint16_t row_masks[4];
+};
+
+// x offsets scanned by get_next_states go from -2 to BOARD_WIDTH + 1
+constexpr int X_OFFSET = 2;
+constexpr int X_SLOTS = BOARD_WIDTH + 4;
+constexpr int MAX_SLOTS = 4 * X_SLOTS;
+
+// every placement of every piece that stays inside the walls, in (rotation, x) order
+struct PlacementTable {
+    Placement placements[7][MAX_SLOTS];
+    int counts[7];
+
+    PlacementTable() {
+        for (int piece = 0; piece < 7; piece++) {
+            int count = 0;
+            for (int rot = 0; rot < PIECE_ROTATIONS[piece]; rot++) {
+                const auto& blocks = TETROMINOES[piece][rot];
+                for (int x = -X_OFFSET; x < BOARD_WIDTH + 2; x++) {
+                    bool inside = true;
+                    for (int i = 0; i < 4; i++) {
+                        int col = x + blocks[i].x;
+                        if (col < 0 || col >= BOARD_WIDTH) inside = false;
+                    }
+                    if (!inside) continue;
+
+                    Placement& placement = placements[piece][count++];
+                    placement.rotation = rot;
+                    placement.x = x;
+                    placement.slot = (rot * X_SLOTS) + x + X_OFFSET;
+                    placement.min_dy = 0;
+                    placement.num_columns = 0;
+                    placement.num_rows = 0;
+
+                    for (int i = 0; i < 4; i++) {
+                        int col = x + blocks[i].x;
+                        placement.min_dy = std::min(placement.min_dy, blocks[i].y);
+
+                        int c = 0;
+                        while (c < placement.num_columns && placement.columns[c] != col) c++;
+                        if (c == placement.num_columns) {
+                            placement.columns[c] = col;
+                            placement.bottoms[c] = blocks[i].y;
+                            placement.tops[c] = blocks[i].y;
+                            placement.num_columns++;
+                        } else {
+                            placement.bottoms[c] = std::max(placement.bottoms[c], blocks[i].y);
+                            placement.tops[c] = std::min(placement.tops[c], blocks[i].y);
+                        }
+
+                        int r = 0;
+                        while (r < placement.num_rows && placement.row_dy[r] != blocks[i].y) r++;
+                        if (r == placement.num_rows) {
+                            placement.row_dy[r] = blocks[i].y;
+                            placement.row_masks[r] = 0;
+                            placement.num_rows++;
+                        }
+                        placement.row_masks[r] |= static_cast<uint16_t>(1 << col);
+                    }
+                }
+            }
+            counts[piece] = count;
+        }
     }
 };
 
+static const PlacementTable PLACEMENT_TABLE;
+
+// afterstate of one placement, stored in a fixed arena inside the engine so
+// generating candidates never touches the heap
+struct Candidate {
+    uint8_t board[BOARD_HEIGHT * BOARD_WIDTH];
+    float reward;
+    bool game_over;
+    int lines;
+    float features[NUM_FEATURES];
+    // column stats of the afterstate, adopted by the engine when the move is played
+    uint8_t heights[BOARD_WIDTH];
+    uint8_t holes[BOARD_WIDTH];
+};
+
 class TetrisEngine {
 private:
     // for changing random logic in each training
     std::mt19937 rng;
     std::uniform_int_distribution<int> piece_dist;
+
+    // candidates of the last get_next_states call, so step() doesn't have to
+    // generate them again; only valid until the board or the piece changes
+    // candidates[p] belongs to PLACEMENT_TABLE.placements[current_piece][p]
+    Candidate candidates[MAX_SLOTS];
+    bool candidate_valid[MAX_SLOTS];
+    // placement indices of the legal candidates, in (rotation, x) order
+    int candidate_order[MAX_SLOTS];
+    int num_candidates;
+    // placement index of every (rotation, x) slot, -1 if illegal
+    int slot_to_candidate[MAX_SLOTS];
+    bool cache_valid;
+
+    // height and hole count of every column of the board, kept in sync by reset,
+    // step and set_board so candidates only have to update the columns they touch
+    uint8_t heights[BOARD_WIDTH];
+    uint8_t holes[BOARD_WIDTH];
 public:
     int board[BOARD_HEIGHT * BOARD_WIDTH];
     int score;
+    // lines cleared this game
+    int lines;
     bool game_over;
     PieceType current_piece;
 
-    TetrisEngine() : rng(std::random_device{}()), piece_dist(0, 6) {
+    TetrisEngine() : rng(std::random_device{}()), piece_dist(0, 6), num_candidates(0),
+                     cache_valid(false) {
         this->reset();
     }
 
     int* reset() {
         // set the board to 0
         memset(board, 0, BOARD_HEIGHT * BOARD_WIDTH * sizeof(int));
+        memset(heights, 0, sizeof(heights));
+        memset(holes, 0, sizeof(holes));
 
         this->score = 0;
+        this->lines = 0;
         this->game_over = false;
         this->current_piece = this->get_new_piece();
+        this->cache_valid = false;
 
         return this->board;
     }
 
+    // replaces the board (e.g. to set up a position for testing) and recomputes the column stats
+    void set_board(const int* cells) {
+        std::copy(cells, cells + (BOARD_HEIGHT * BOARD_WIDTH), this->board);
+
+        int column_heights[BOARD_WIDTH];
+        int column_holes[BOARD_WIDTH];
+        compute_column_stats(this->board, column_heights, column_holes);
+        std::copy(column_heights, column_heights + BOARD_WIDTH, this->heights);
+        std::copy(column_holes, column_holes + BOARD_WIDTH, this->holes);
+
+        this->cache_valid = false;
+    }
+
+    void set_piece(int piece) {
+        this->current_piece = static_cast<PieceType>(piece);
+        this->cache_valid = false;
+    }
+
+    // restarts the piece generator; the sequence after the next reset() only depends on seed
+    void seed(unsigned int seed) {
+        this->rng.seed(seed);
+    }
+
+    // text snapshot of the piece generator (the mt19937 state and the distribution), so a
+    // checkpoint can continue the exact piece sequence after set_rng_state
+    std::string get_rng_state() const {
+        std::ostringstream out;
+        out << this->rng << ' ' << this->piece_dist;
+        return out.str();
+    }
+
+    void set_rng_state(const std::string& state) {
+        std::istringstream in(state);
+        in >> this->rng >> this->piece_dist;
+        if (in.fail()) {
+            throw std::invalid_argument("not a TetrisEngine rng state");
+        }
+    }
+
     PieceType get_new_piece() {
         return static_cast<PieceType>(piece_dist(rng));
     }
 
-    bool is_valid_position(PieceType piece, int rotation, int x, int y) {
+    bool is_valid_position(PieceType piece, int rotation, int x, int y) const {
         // we get the relevant points for the piece and rotation
         const auto& blocks = TETROMINOES[piece][rotation];
 
@@ -168,7 +393,186 @@ public:
         return true;
     }
 
+    // list of NextState objects, kept for compatibility (allocates a vector per candidate)
     std::vector<NextState> get_next_states() {
+        this->update_cache();
+
+        std::vector<NextState> states;
+        states.reserve(this->num_candidates);
+        for (int k = 0; k < this->num_candidates; k++) {
+            const Placement& placement = this->candidate_placement(k);
+            const Candidate& candidate = this->candidate(k);
+
+            NextState state;
+            state.rotation = placement.rotation;
+            state.x = placement.x;
+            state.board = std::vector<int>(candidate.board, candidate.board + (BOARD_HEIGHT * BOARD_WIDTH));
+            state.reward = candidate.reward;
+            state.game_over = candidate.game_over;
+            std::copy(candidate.features, candidate.features + NUM_FEATURES, state.features);
+            states.push_back(state);
+        }
+
+        return states;
+    }
+
+    int candidate_count() const {
+        return this->num_candidates;
+    }
+
+    // k-th legal candidate of the last update_cache call, in (rotation, x) order
+    const Candidate& candidate(int k) const {
+        return this->candidates[this->candidate_order[k]];
+    }
+
+    const Placement& candidate_placement(int k) const {
+        return PLACEMENT_TABLE.placements[this->current_piece][this->candidate_order[k]];
+    }
+
+    // generates the candidates of the current piece into the arena and keeps them for step()
+    // fast path: no heap allocation, drops from column heights, deterministic order
+    void update_cache() {
+        const int count = PLACEMENT_TABLE.counts[this->current_piece];
+        const Placement* placements = PLACEMENT_TABLE.placements[this->current_piece];
+
+        // first filled row of every column (BOARD_HEIGHT if empty)
+        int tops[BOARD_WIDTH];
+        for (int col = 0; col < BOARD_WIDTH; col++) {
+            tops[col] = BOARD_HEIGHT - this->heights[col];
+        }
+
+        // serial on purpose: a piece has at most 34 placements of a few dozen
+        // instructions each, less work than waking up an OpenMP thread team
+        // (parallelism pays off across whole games, see rollout_linear)
+        for (int p = 0; p < count; p++) {
+            this->candidate_valid[p] = this->build_candidate(placements[p], tops, this->candidates[p]);
+        }
+
+        // collect the legal candidates in placement order
+        this->num_candidates = 0;
+        std::fill(this->slot_to_candidate, this->slot_to_candidate + MAX_SLOTS, -1);
+        for (int p = 0; p < count; p++) {
+            if (this->candidate_valid[p]) {
+                this->candidate_order[this->num_candidates++] = p;
+                this->slot_to_candidate[placements[p].slot] = p;
+            }
+        }
+
+        this->cache_valid = true;
+    }
+
+    // drops the piece for one placement and writes the afterstate into `out`
+    // returns false if the move is illegal
+    bool build_candidate(const Placement& placement, const int* tops, Candidate& out) const {
+        int y;
+        const bool profile_drop = tops_allow_profile_drop(tops);
+
+        if (profile_drop) {
+            // the piece falls until one of its column bottoms reaches the top block of that column
+            y = BOARD_HEIGHT;
+            for (int c = 0; c < placement.num_columns; c++) {
+                y = std::min(y, tops[placement.columns[c]] - 1 - placement.bottoms[c]);
+            }
+        } else {
+            // the top row is occupied (only on game over boards): a piece could start
+            // inside an overhang, so probe row by row like the python engine
+            if (!this->is_valid_position(this->current_piece, placement.rotation, placement.x, 0)) {
+                return false;
+            }
+            y = 0;
+            while (this->is_valid_position(this->current_piece, placement.rotation, placement.x, y + 1)) {
+                y++;
+            }
+        }
+
+        // part of the piece would stick out of the top of the board
+        if (y + placement.min_dy < 0) {
+            return false;
+        }
+
+        uint8_t* cells = out.board;
+        for (int i = 0; i < BOARD_HEIGHT * BOARD_WIDTH; i++) {
+            cells[i] = static_cast<uint8_t>(this->board[i] != 0);
+        }
+
+        const auto& blocks = TETROMINOES[this->current_piece][placement.rotation];
+        for (int i = 0; i < 4; i++) {
+            cells[((y + blocks[i].y) * BOARD_WIDTH) + placement.x + blocks[i].x] = 1;
+        }
+
+        // clear lines in one bottom-up pass: every kept row is copied straight
+        // to its final position, then the rows left over at the top are emptied
+        int cleared_lines = 0;
+        int write = BOARD_HEIGHT - 1;
+        for (int row = BOARD_HEIGHT - 1; row >= 0; row--) {
+            bool full = true;
+            for (int col = 0; col < BOARD_WIDTH; col++) {
+                if (cells[(row * BOARD_WIDTH) + col] == 0) {
+                    full = false;
+                    break;
+                }
+            }
+
+            if (full) {
+                cleared_lines++;
+                continue;
+            }
+            if (write != row) {
+                memcpy(cells + (write * BOARD_WIDTH), cells + (row * BOARD_WIDTH), BOARD_WIDTH);
+            }
+            write--;
+        }
+        if (write >= 0) {
+            memset(cells, 0, (write + 1) * BOARD_WIDTH);
+        }
+
+        out.game_over = false;
+        for (int col = 0; col < BOARD_WIDTH; col++) {
+            if (cells[col] != 0) {
+                out.game_over = true;
+                break;
+            }
+        }
+
+        if (profile_drop && cleared_lines == 0) {
+            // only the covered columns changed: they grow to the piece's top block and
+            // every empty cell between the piece and the old top becomes a hole
+            std::copy(this->heights, this->heights + BOARD_WIDTH, out.heights);
+            std::copy(this->holes, this->holes + BOARD_WIDTH, out.holes);
+            for (int c = 0; c < placement.num_columns; c++) {
+                const int col = placement.columns[c];
+                out.heights[col] = static_cast<uint8_t>(BOARD_HEIGHT - (y + placement.tops[c]));
+                out.holes[col] += static_cast<uint8_t>(tops[col] - 1 - (y + placement.bottoms[c]));
+            }
+        } else {
+            // cleared lines shift whole rows, recompute from scratch
+            int column_heights[BOARD_WIDTH];
+            int column_holes[BOARD_WIDTH];
+            compute_column_stats(cells, column_heights, column_holes);
+            std::copy(column_heights, column_heights + BOARD_WIDTH, out.heights);
+            std::copy(column_holes, column_holes + BOARD_WIDTH, out.holes);
+        }
+        features_from_stats(out.heights, out.holes, out.features);
+
+        out.lines = cleared_lines;
+        out.reward = 1.0f + (cleared_lines * cleared_lines) * 10.0f;
+        if (out.game_over) out.reward -= 25.0f;
+
+        return true;
+    }
+
+    // with an empty top row no piece can start inside an overhang, so the landing
+    // row only depends on the first filled cell of each column
+    static bool tops_allow_profile_drop(const int* tops) {
+        for (int col = 0; col < BOARD_WIDTH; col++) {
+            if (tops[col] == 0) return false;
+        }
+        return true;
+    }
+
+    // original OpenMP generator that probes every row, kept as a reference for
+    // checking the fast path (its output order depends on thread scheduling)
+    std::vector<NextState> get_next_states_reference() {
         // initialize the vector we'll return
         std::vector<NextState> global_states;
 
@@ -274,6 +678,8 @@ public:
                         }
                     }
 
+                    compute_features(future.board.data(), future.features);
+
                     future.reward = 1.0f + (cleared_lines * cleared_lines) * 10.0f;
 
                     if (future.game_over) future.reward -= 25.0f;
@@ -296,89 +702,568 @@ public:
     }
 
     StepResult step(int rot, int x_pos) {
-        std::vector<NextState> next_states = this->get_next_states();
-
-        bool found = false;
-        float reward = 0.0f;
-
-        for (const auto& state : next_states) {
-            if (state.rotation == rot && state.x == x_pos) {
-                found = true;
-                
-                // copy the vector into the board
-                std::copy(state.board.begin(), state.board.end(), this->board);
-
-                this->game_over = state.game_over;
-
-                reward = state.reward;
-
-                this->score += reward;
-
-                
-                if (!this->game_over) {
-                    this->current_piece = this->get_new_piece();
-                }
-
-                break;
+        // the training loop already generated the candidates to pick the action,
+        // so normally this is just a lookup into the cache
+        if (!this->cache_valid) {
+            this->update_cache();
+        }
 
-            }
+        int index = -1;
+        if (rot >= 0 && rot < PIECE_ROTATIONS[this->current_piece] && x_pos + X_OFFSET >= 0 && x_pos + X_OFFSET < X_SLOTS) {
+            index = this->slot_to_candidate[(rot * X_SLOTS) + x_pos + X_OFFSET];
         }
 
         StepResult res;
 
-        if (!found) {
+        if (index < 0) {
             res.reward = -10;
             res.game_over = true;
             this->game_over = true;
+            compute_features(this->board, res.features);
+            return res;
         }
-        else {
-            res.reward = reward;
-            res.game_over = this->game_over;
+
+        const Candidate& state = this->candidates[index];
+
+        // copy the candidate into the board
+        std::copy(state.board, state.board + (BOARD_HEIGHT * BOARD_WIDTH), this->board);
+        std::copy(state.features, state.features + NUM_FEATURES, res.features);
+        std::copy(state.heights, state.heights + BOARD_WIDTH, this->heights);
+        std::copy(state.holes, state.holes + BOARD_WIDTH, this->holes);
+
+        this->game_over = state.game_over;
+        this->score += state.reward;
+        this->lines += state.lines;
+
+        res.reward = state.reward;
+        res.game_over = this->game_over;
+
+        // the board changed, the cached candidates are stale
+        this->cache_valid = false;
+
+        if (!this->game_over) {
+            this->current_piece = this->get_new_piece();
         }
 
         return res;
     }
 
+    // features of the current board
+    std::vector<float> get_features() {
+        std::vector<float> features(NUM_FEATURES);
+        features_from_stats(this->heights, this->holes, features.data());
+        return features;
+    }
+
     // helper function to get the board for pybind
     std::vector<int> get_board() {
         return std::vector<int>(this->board, this->board + (BOARD_HEIGHT * BOARD_WIDTH));
     }
 };
 
+// whole games under a greedy linear policy, without going back to python per move:
+// every candidate is scored as reward_weight * reward + (game over ? 0 : w . features)
+// and the first best one is played, the same choice as scoring the candidates of
+// TetrisEngine.get_next_states_array in python
+// the board is kept as one 10-bit mask per row plus the column stats; a candidate that
+// clears no line only changes the columns it covers, so its features come from the
+// stats alone and the rows are only touched for the move that is actually played
+
+constexpr uint16_t FULL_ROW = (1 << BOARD_WIDTH) - 1;
+
+struct LinearPolicy {
+    double weights[NUM_FEATURES];
+    double reward_weight;
+};
+
+// one placement of a rollout, kept if trajectories are requested
+struct RolloutStep {
+    int8_t piece;
+    int8_t rotation;
+    int8_t x;
+    bool game_over;
+    float reward;
+    // features of the afterstate
+    float features[NUM_FEATURES];
+};
+
+struct RolloutResult {
+    int score;
+    int lines;
+    int pieces;
+};
+
+class RolloutBoard {
+public:
+    uint16_t rows[BOARD_HEIGHT];
+    int heights[BOARD_WIDTH];
+    int holes[BOARD_WIDTH];
+    // [agg_height, holes, bumpiness, max_height] of the board, refreshed by update_totals
+    int totals[NUM_FEATURES];
+
+    RolloutBoard() {
+        memset(rows, 0, sizeof(rows));
+        memset(heights, 0, sizeof(heights));
+        memset(holes, 0, sizeof(holes));
+        memset(totals, 0, sizeof(totals));
+    }
+
+    void update_totals() {
+        totals[0] = 0;
+        totals[1] = 0;
+        totals[2] = 0;
+        totals[3] = 0;
+        for (int col = 0; col < BOARD_WIDTH; col++) {
+            totals[0] += heights[col];
+            totals[1] += holes[col];
+            totals[3] = std::max(totals[3], heights[col]);
+            if (col + 1 < BOARD_WIDTH) {
+                totals[2] += std::abs(heights[col] - heights[col + 1]);
+            }
+        }
+    }
+
+    // features after a placement that clears no line, from the totals and the (at most 4)
+    // covered columns plus the bumpiness terms next to them (see update_features in bitboard.py)
+    void covered_features(const Placement& placement, int y, float* out) const {
+        int next[BOARD_WIDTH];
+        std::copy(heights, heights + BOARD_WIDTH, next);
+        int agg_height = totals[0];
+        int total_holes = totals[1];
+        int max_height = totals[3];
+        int lo = BOARD_WIDTH;
+        int hi = -1;
+        for (int c = 0; c < placement.num_columns; c++) {
+            const int col = placement.columns[c];
+            const int height = BOARD_HEIGHT - (y + placement.tops[c]);
+            total_holes += (BOARD_HEIGHT - heights[col]) - 1 - (y + placement.bottoms[c]);
+            agg_height += height - heights[col];
+            max_height = std::max(max_height, height);
+            next[col] = height;
+            lo = std::min(lo, col);
+            hi = std::max(hi, col);
+        }
+
+        int bumpiness = totals[2];
+        for (int col = std::max(lo - 1, 0); col < std::min(hi + 1, BOARD_WIDTH - 1); col++) {
+            bumpiness += std::abs(next[col] - next[col + 1]) - std::abs(heights[col] - heights[col + 1]);
+        }
+
+        out[0] = static_cast<float>(agg_height);
+        out[1] = static_cast<float>(total_holes);
+        out[2] = static_cast<float>(bumpiness);
+        out[3] = static_cast<float>(max_height);
+    }
+
+    void recompute_stats() {
+        for (int col = 0; col < BOARD_WIDTH; col++) {
+            heights[col] = 0;
+            int blocks = 0;
+            for (int row = 0; row < BOARD_HEIGHT; row++) {
+                if ((rows[row] >> col) & 1) {
+                    if (heights[col] == 0) {
+                        heights[col] = BOARD_HEIGHT - row;
+                    }
+                    blocks++;
+                }
+            }
+            holes[col] = heights[col] - blocks;
+        }
+    }
+
+    // landing row of a placement (the move is illegal if y + min_dy < 0); the top row
+    // is always empty while a game runs, so the piece simply falls onto the column tops
+    int drop(const Placement& placement) const {
+        int y = BOARD_HEIGHT;
+        for (int c = 0; c < placement.num_columns; c++) {
+            const int col = placement.columns[c];
+            y = std::min(y, (BOARD_HEIGHT - heights[col]) - 1 - placement.bottoms[c]);
+        }
+        return y;
+    }
+
+    bool clears_lines(const Placement& placement, int y) const {
+        for (int r = 0; r < placement.num_rows; r++) {
+            if ((rows[y + placement.row_dy[r]] | placement.row_masks[r]) == FULL_ROW) {
+                return true;
+            }
+        }
+        return false;
+    }
+
+    // locks the piece in and clears full rows, returns the number of cleared lines
+    int place(const Placement& placement, int y) {
+        for (int r = 0; r < placement.num_rows; r++) {
+            rows[y + placement.row_dy[r]] |= placement.row_masks[r];
+        }
+
+        int write = BOARD_HEIGHT - 1;
+        for (int row = BOARD_HEIGHT - 1; row >= 0; row--) {
+            if (rows[row] == FULL_ROW) continue;
+            rows[write--] = rows[row];
+        }
+        for (int row = write; row >= 0; row--) {
+            rows[row] = 0;
+        }
+        return write + 1;
+    }
+
+    // column stats after a placement that clears no line (see update_column_stats in bitboard.py)
+    void covered_stats(const Placement& placement, int y, int* out_heights, int* out_holes) const {
+        std::copy(heights, heights + BOARD_WIDTH, out_heights);
+        std::copy(holes, holes + BOARD_WIDTH, out_holes);
+        for (int c = 0; c < placement.num_columns; c++) {
+            const int col = placement.columns[c];
+            out_holes[col] += (BOARD_HEIGHT - heights[col]) - 1 - (y + placement.bottoms[c]);
+            out_heights[col] = BOARD_HEIGHT - (y + placement.tops[c]);
+        }
+    }
+};
+
+// scores one candidate, returns false if the move is illegal
+static bool score_placement(const RolloutBoard& board, const Placement& placement, const LinearPolicy& policy,
+                            double& score, float& reward, bool& game_over, float* features) {
+    const int y = board.drop(placement);
+    if (y + placement.min_dy < 0) return false;
+
+    int lines = 0;
+    if (!board.clears_lines(placement, y)) {
+        board.covered_features(placement, y, features);
+        // the top row was empty, it is filled only if the piece reaches it
+        game_over = y + placement.min_dy == 0;
+    } else {
+        RolloutBoard next = board;
+        lines = next.place(placement, y);
+        next.recompute_stats();
+        features_from_stats(next.heights, next.holes, features);
+        game_over = next.rows[0] != 0;
+    }
+
+    reward = 1.0f + (lines * lines) * 10.0f;
+    if (game_over) reward -= 25.0f;
+
+    score = policy.reward_weight * reward;
+    if (!game_over) {
+        score += policy.weights[0] * features[0] + policy.weights[1] * features[1]
+               + policy.weights[2] * features[2] + policy.weights[3] * features[3];
+    }
+    return true;
+}
+
+// plays one game with the piece sequence of TetrisEngine after seed(seed) and reset()
+static RolloutResult play_linear_episode(const LinearPolicy& policy, unsigned int seed, int max_pieces,
+                                         std::vector<RolloutStep>* trajectory) {
+    std::mt19937 rng(seed);
+    std::uniform_int_distribution<int> piece_dist(0, 6);
+    RolloutBoard board;
+    RolloutResult result = {0, 0, 0};
+
+    int piece = piece_dist(rng);
+    while (result.pieces < max_pieces) {
+        const int count = PLACEMENT_TABLE.counts[piece];
+        const Placement* placements = PLACEMENT_TABLE.placements[piece];
+
+        int best = -1;
+        double best_score = 0.0;
+        RolloutStep step;
+        for (int p = 0; p < count; p++) {
+            double score;
+            float reward;
+            bool game_over;
+            float features[NUM_FEATURES];
+            if (!score_placement(board, placements[p], policy, score, reward, game_over, features)) continue;
+
+            // strict > keeps the first best candidate
+            if (best < 0 || score > best_score) {
+                best = p;
+                best_score = score;
+                step.reward = reward;
+                step.game_over = game_over;
+                std::copy(features, features + NUM_FEATURES, step.features);
+            }
+        }
+        if (best < 0) break;
+
+        // play the move: rows always, column stats incrementally unless lines were cleared
+        const Placement& placement = placements[best];
+        const int y = board.drop(placement);
+        int heights[BOARD_WIDTH];
+        int holes[BOARD_WIDTH];
+        board.covered_stats(placement, y, heights, holes);
+        const int lines = board.place(placement, y);
+        if (lines == 0) {
+            std::copy(heights, heights + BOARD_WIDTH, board.heights);
+            std::copy(holes, holes + BOARD_WIDTH, board.holes);
+        } else {
+            board.recompute_stats();
+        }
+        board.update_totals();
+
+        result.score += step.reward;
+        result.lines += lines;
+        result.pieces++;
+
+        if (trajectory != nullptr) {
+            step.piece = static_cast<int8_t>(piece);
+            step.rotation = static_cast<int8_t>(placement.rotation);
+            step.x = static_cast<int8_t>(placement.x);
+            trajectory->push_back(step);
+        }
+
+        if (step.game_over) break;
+        piece = piece_dist(rng);
+    }
+
+    return result;
+}
+
+// plays `episodes` games for every policy, game i with seed + i (the same pieces for
+// every policy), all in one OpenMP loop (threads <= 0: all cores)
+// game i of policy p writes slot p * episodes + i, so the results don't depend on the thread count
+static void rollout_linear(const LinearPolicy* policies, int num_policies, int episodes, unsigned int seed,
+                           int max_pieces, int threads, RolloutResult* results,
+                           std::vector<RolloutStep>* trajectories) {
+    const int num_threads = threads > 0 ? threads : omp_get_max_threads();
+    const int games = num_policies * episodes;
+    #pragma omp parallel for schedule(dynamic, 1) num_threads(num_threads)
+    for (int g = 0; g < games; g++) {
+        const int i = g % episodes;
+        results[g] = play_linear_episode(policies[g / episodes], seed + static_cast<unsigned int>(i), max_pieces,
+                                         trajectories != nullptr ? &trajectories[g] : nullptr);
+    }
+}
+
 #include <pybind11/pybind11.h>
 // for converting vectors into python lists
 #include <pybind11/stl.h> 
+// for returning numpy arrays
+#include <pybind11/numpy.h>
 
 namespace py = pybind11;
 
+// converting every NextState into a python object with a 200 element list is slow
+// instead we copy all candidates into a single buffer and hand out numpy views of it:
+//   boards    -> (K, 20, 10) uint8 (None if with_boards is false)
+//   rotations -> (K,) int32
+//   xs        -> (K,) int32
+//   rewards   -> (K,) float32
+//   game_overs-> (K,) bool
+//   features  -> (K, 4) float32, same as tetris_rl.features.get_features
+// the buffer is freed by a capsule once all the arrays are garbage collected
+py::tuple next_states_to_numpy(const TetrisEngine& env, bool with_boards) {
+    const py::ssize_t count = static_cast<py::ssize_t>(env.candidate_count());
+    const size_t cells = BOARD_HEIGHT * BOARD_WIDTH;
+
+    // every block starts at a multiple of 4 bytes (cells is a multiple of 4)
+    const size_t boards_bytes = with_boards ? count * cells : 0;
+    const size_t features_offset = boards_bytes;
+    const size_t rotations_offset = features_offset + count * NUM_FEATURES * sizeof(float);
+    const size_t xs_offset = rotations_offset + count * sizeof(int32_t);
+    const size_t rewards_offset = xs_offset + count * sizeof(int32_t);
+    const size_t game_overs_offset = rewards_offset + count * sizeof(float);
+    const size_t total_bytes = game_overs_offset + count * sizeof(bool);
+
+    uint8_t* buffer = new uint8_t[total_bytes > 0 ? total_bytes : 1];
+    py::capsule owner(buffer, [](void* ptr) { delete[] static_cast<uint8_t*>(ptr); });
+
+    uint8_t* boards = buffer;
+    float* features = reinterpret_cast<float*>(buffer + features_offset);
+    int32_t* rotations = reinterpret_cast<int32_t*>(buffer + rotations_offset);
+    int32_t* xs = reinterpret_cast<int32_t*>(buffer + xs_offset);
+    float* rewards = reinterpret_cast<float*>(buffer + rewards_offset);
+    bool* game_overs = reinterpret_cast<bool*>(buffer + game_overs_offset);
+
+    for (py::ssize_t k = 0; k < count; k++) {
+        const Candidate& state = env.candidate(k);
+        const Placement& placement = env.candidate_placement(k);
+        if (with_boards) {
+            memcpy(boards + (k * cells), state.board, cells);
+        }
+        std::copy(state.features, state.features + NUM_FEATURES, features + (k * NUM_FEATURES));
+        rotations[k] = placement.rotation;
+        xs[k] = placement.x;
+        rewards[k] = state.reward;
+        game_overs[k] = state.game_over;
+    }
+
+    py::object boards_array = py::none();
+    if (with_boards) {
+        boards_array = py::array_t<uint8_t>({count, (py::ssize_t)BOARD_HEIGHT, (py::ssize_t)BOARD_WIDTH}, boards, owner);
+    }
+
+    return py::make_tuple(
+        boards_array,
+        py::array_t<int32_t>({count}, rotations, owner),
+        py::array_t<int32_t>({count}, xs, owner),
+        py::array_t<float>({count}, rewards, owner),
+        py::array_t<bool>({count}, game_overs, owner),
+        py::array_t<float>({count, (py::ssize_t)NUM_FEATURES}, features, owner)
+    );
+}
+
 // we have the same class structure as our python script
 PYBIND11_MODULE(tetris_engine, m) {
     
     // create classes for stepresult and nextstate structs
     py::class_<StepResult>(m, "StepResult")
         .def_readonly("reward", &StepResult::reward)
-        .def_readonly("game_over", &StepResult::game_over);
+        .def_readonly("game_over", &StepResult::game_over)
+        .def_property_readonly("features", [](const StepResult& res) {
+            return py::array_t<float>(NUM_FEATURES, res.features);
+        });
 
     py::class_<NextState>(m, "NextState")
         .def_readonly("rotation", &NextState::rotation)
         .def_readonly("x", &NextState::x)
         .def_readonly("board", &NextState::board)
         .def_readonly("reward", &NextState::reward)
-        .def_readonly("game_over", &NextState::game_over);
+        .def_readonly("game_over", &NextState::game_over)
+        .def_property_readonly("features", [](const NextState& state) {
+            return std::vector<float>(state.features, state.features + NUM_FEATURES);
+        });
 
     // bind the main tetrisengine class with its functions
     py::class_<TetrisEngine>(m, "TetrisEngine")
         .def(py::init<>()) // Expose the constructor
         .def("reset", &TetrisEngine::reset)
+        .def("seed", &TetrisEngine::seed)
+        .def("get_rng_state", &TetrisEngine::get_rng_state)
+        .def("set_rng_state", &TetrisEngine::set_rng_state)
         .def("step", &TetrisEngine::step)
         .def("get_next_states", &TetrisEngine::get_next_states)
         .def("get_board", &TetrisEngine::get_board)
+        .def("get_next_states_reference", &TetrisEngine::get_next_states_reference)
+        // numpy version of get_next_states: (boards, rotations, xs, rewards, game_overs, features)
+        // with_boards=False skips the (K, 20, 10) block when only the features are needed
+        .def("get_next_states_array", [](TetrisEngine& env, bool with_boards) {
+            env.update_cache();
+            return next_states_to_numpy(env, with_boards);
+        }, py::arg("with_boards") = true)
+        // (4,) float32 features of the current board
+        .def("get_features", [](TetrisEngine& env) {
+            std::vector<float> features = env.get_features();
+            return py::array_t<float>(features.size(), features.data());
+        })
+        // (20, 10) int32 read-only view on the engine's own board, no copy
+        // the view keeps the engine alive and always shows the current board
+        // (use set_board to change it, writing cells would desync the column stats)
+        .def_property_readonly("board", [](py::object self) {
+            TetrisEngine& env = self.cast<TetrisEngine&>();
+            py::array_t<int> view({BOARD_HEIGHT, BOARD_WIDTH}, env.board, self);
+            view.attr("setflags")(py::arg("write") = false);
+            return view;
+        })
+        .def("set_board", [](TetrisEngine& env, py::array_t<int, py::array::c_style | py::array::forcecast> board) {
+            if (board.size() != BOARD_HEIGHT * BOARD_WIDTH) {
+                throw std::invalid_argument("board must have 20 * 10 cells");
+            }
+            env.set_board(board.data());
+        })
+        .def("set_piece", [](TetrisEngine& env, int piece) {
+            if (piece < 0 || piece >= 7) {
+                throw std::invalid_argument("piece must be in 0..6");
+            }
+            env.set_piece(piece);
+        })
         
         .def_readwrite("score", &TetrisEngine::score)
+        .def_readwrite("lines", &TetrisEngine::lines)
         .def_readwrite("game_over", &TetrisEngine::game_over)
         .def_property_readonly("current_piece", [](const TetrisEngine& env) {
             return static_cast<int>(env.current_piece); // Convert enum to int for Python
         });
+
+    // rollout_linear(weights, episodes, seed, max_pieces, threads, trajectories)
+    //   weights -> (4,) feature weights, or (5,) with the weight of the reward last (default 1);
+    //              a (P, 4) or (P, 5) matrix plays the games of P policies in one batch
+    // returns (scores, lines, pieces) int32 arrays of shape (episodes,), or (P, episodes)
+    // for a matrix, plus with trajectories=True a dict of every placement in game order
+    // (policy by policy): piece, rotation, x (int8), reward (float32), game_over (bool),
+    // features (T, 4) float32 and offsets (games + 1,) int64
+    m.def("rollout_linear", [](py::array_t<double, py::array::c_style | py::array::forcecast> weights,
+                               int episodes, unsigned int seed, int max_pieces, int threads, bool trajectories) -> py::tuple {
+        if (weights.ndim() != 1 && weights.ndim() != 2) {
+            throw std::invalid_argument("weights must be a vector or a (policies, weights) matrix");
+        }
+        const bool batched = weights.ndim() == 2;
+        const int num_policies = batched ? static_cast<int>(weights.shape(0)) : 1;
+        const py::ssize_t dims = weights.shape(weights.ndim() - 1);
+        if (dims != NUM_FEATURES && dims != NUM_FEATURES + 1) {
+            throw std::invalid_argument("weights must have 4 feature weights and optionally a reward weight");
+        }
+        if (episodes < 0 || max_pieces < 0) {
+            throw std::invalid_argument("episodes and max_pieces must not be negative");
+        }
+
+        std::vector<LinearPolicy> policies(num_policies);
+        for (int p = 0; p < num_policies; p++) {
+            const double* row = weights.data() + (p * dims);
+            std::copy(row, row + NUM_FEATURES, policies[p].weights);
+            policies[p].reward_weight = dims > NUM_FEATURES ? row[NUM_FEATURES] : 1.0;
+        }
+
+        const int games = num_policies * episodes;
+        std::vector<RolloutResult> results(games);
+        std::vector<std::vector<RolloutStep>> steps(trajectories ? games : 0);
+        {
+            // the games don't touch python objects, other python threads can run meanwhile
+            py::gil_scoped_release release;
+            rollout_linear(policies.data(), num_policies, episodes, seed, max_pieces, threads, results.data(),
+                           trajectories ? steps.data() : nullptr);
+        }
+
+        std::vector<py::ssize_t> shape;
+        if (batched) shape.push_back(num_policies);
+        shape.push_back(episodes);
+        py::array_t<int32_t> scores(shape);
+        py::array_t<int32_t> lines(shape);
+        py::array_t<int32_t> pieces(shape);
+        for (int g = 0; g < games; g++) {
+            scores.mutable_data()[g] = results[g].score;
+            lines.mutable_data()[g] = results[g].lines;
+            pieces.mutable_data()[g] = results[g].pieces;
+        }
+        if (!trajectories) {
+            return py::make_tuple(scores, lines, pieces);
+        }
+
+        py::array_t<int64_t> offsets(games + 1);
+        offsets.mutable_data()[0] = 0;
+        for (int i = 0; i < games; i++) {
+            offsets.mutable_data()[i + 1] = offsets.data()[i] + static_cast<int64_t>(steps[i].size());
+        }
+        const py::ssize_t total = offsets.data()[games];
+
+        py::array_t<int8_t> piece(total);
+        py::array_t<int8_t> rotation(total);
+        py::array_t<int8_t> x(total);
+        py::array_t<float> reward(total);
+        py::array_t<bool> game_over(total);
+        py::array_t<float> features({total, (py::ssize_t)NUM_FEATURES});
+        py::ssize_t t = 0;
+        for (const auto& episode : steps) {
+            for (const RolloutStep& step : episode) {
+                piece.mutable_data()[t] = step.piece;
+                rotation.mutable_data()[t] = step.rotation;
+                x.mutable_data()[t] = step.x;
+                reward.mutable_data()[t] = step.reward;
+                game_over.mutable_data()[t] = step.game_over;
+                std::copy(step.features, step.features + NUM_FEATURES, features.mutable_data() + (t * NUM_FEATURES));
+                t++;
+            }
+        }
+
+        py::dict trajectory;
+        trajectory["piece"] = piece;
+        trajectory["rotation"] = rotation;
+        trajectory["x"] = x;
+        trajectory["reward"] = reward;
+        trajectory["game_over"] = game_over;
+        trajectory["features"] = features;
+        trajectory["offsets"] = offsets;
+        return py::make_tuple(scores, lines, pieces, trajectory);
+    }, py::arg("weights"), py::arg("episodes") = 1, py::arg("seed") = 0, py::arg("max_pieces") = 5000,
+       py::arg("threads") = 0, py::arg("trajectories") = false);
 }
 
 
@@ -0,0 +1,210 @@
+import os
+import random
+from collections import deque
+import numpy as np
+import torch
+from tetris_rl.agents import DQNAgent, TabularAgent
+from tetris_rl.engines import make_engine
+from tetris_rl.features import get_features
+from tetris_rl.telemetry import make_telemetry
+
+# single training loop behind scripts/train.py and the train_* scripts
+#   engine_name     -> 'python', 'bitboard' or 'cpp' (see engines.make_engine)
+#   agent_name      -> 'tabular' or 'dqn'
+#   learn_every     -> DQN: learn after every k-th placement
+#   gradient_steps  -> DQN: gradient steps per learn
+#   batch_size      -> DQN: samples per gradient step
+#   warmup          -> DQN: no learning until the buffer holds this many transitions
+#   prioritized     -> DQN: prioritized replay, sampled by TD error with importance-sampling weights
+#   cache_size      -> LRU cache entries for candidate features (and DQN values), 0 turns
+#                      the caches off, see tetris_rl/cache.py
+#   max_pieces      -> a game is cut off after this many placements (same cap as
+#                      evaluation.play_episode); None keeps each agent's own default:
+#                      DEFAULT_MAX_PIECES for the DQN, no limit for the tabular agent
+#   checkpoint_dir  -> save a checkpoint there every checkpoint_every episodes (and at the
+#                      end); the DQN replay buffer lives there as memory-mapped files
+#   resume          -> continue from the checkpoint in checkpoint_dir
+#   save_path       -> write the trained policy there at the end (agent.save: the tabular
+#                      value table as .npy, the DQN weights as a torch state dict)
+# the update-to-data ratio is gradient_steps * batch_size / learn_every samples per placement;
+# bigger batches less often are much cheaper per sample on a CPU than a 64 sample
+# update after every piece
+# the tabular agent does its TD(0) update after every placement and ignores the DQN options
+
+AGENT_NAMES = ('tabular', 'dqn')
+
+DEFAULT_MAX_PIECES = 5000
+
+
+def make_agent(agent_name, batch_size=64, queue_len=100000, hidden_layer_size=64, buffer_path=None,
+               prioritized=False, cache_size=0):
+    if agent_name == 'tabular':
+        return TabularAgent(cache_size)
+    if agent_name == 'dqn':
+        return DQNAgent(batch_size, queue_len, hidden_layer_size, cache_size=cache_size,
+                        buffer_path=buffer_path, prioritized=prioritized)
+    raise ValueError(f"unknown agent '{agent_name}', expected one of {AGENT_NAMES}")
+
+
+# returns the trained agent
+def train(engine_name='bitboard', agent_name='dqn', episodes=10000, batch_size=64,
+          queue_len=100000, hidden_layer_size=64, learn_every=1, gradient_steps=1, warmup=0,
+          max_pieces=None, report_every=100, profile=True, log_path=None, seed=None,
+          checkpoint_dir=None, checkpoint_every=100, resume=False, save_path=None, prioritized=False,
+          cache_size=0):
+    if learn_every < 1 or gradient_steps < 1:
+        raise ValueError("learn_every and gradient_steps must be at least 1")
+    if resume and checkpoint_dir is None:
+        raise ValueError("resume needs a checkpoint_dir")
+
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+        torch.manual_seed(seed)
+
+    env = make_engine(engine_name)
+    if seed is not None:
+        # the engines draw their pieces from their own generator (the C++ one from a
+        # std::mt19937 the python seeds above don't reach)
+        env.seed(seed)
+    checkpoint_path = None
+    buffer_path = None
+    if checkpoint_dir is not None:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        checkpoint_path = os.path.join(checkpoint_dir, 'checkpoint.pt')
+        buffer_path = os.path.join(checkpoint_dir, 'replay')
+    agent = make_agent(agent_name, batch_size, queue_len, hidden_layer_size, buffer_path, prioritized,
+                       cache_size)
+    is_dqn = agent_name == 'dqn'
+    if max_pieces is None and is_dqn:
+        max_pieces = DEFAULT_MAX_PIECES
+    if is_dqn and seed is not None:
+        # the buffer samples from its own generator
+        agent.buffer.rng = np.random.default_rng(seed)
+    # the C++ engine can hand the DQN agent its candidates as arrays, without boards
+    use_arrays = is_dqn and hasattr(env, 'get_next_arrays')
+
+    telemetry = make_telemetry(profile, log_path)
+    agent.telemetry = telemetry
+
+    print(f"Starting to train the {agent_name} agent on the {engine_name} engine...")
+    print(f"{episodes} episodes.")
+    if is_dqn:
+        print(f"Learning every {learn_every} placements: {gradient_steps} x {batch_size} "
+              f"{'prioritized' if prioritized else 'uniform'} samples, warmup {warmup}.")
+    # rolling window to see learning trend despite variance
+    score_window = deque(maxlen=100)
+    placements = 0
+    start_episode = 0
+
+    if resume:
+        extra = agent.load_checkpoint(checkpoint_path)
+        start_episode = extra['episode']
+        placements = extra['placements']
+        score_window.extend(extra['score_window'])
+        # continue the engine's piece sequence where the checkpoint left it
+        # (checkpoints written before the engine state was saved don't have it)
+        if 'engine_rng' in extra:
+            env.set_rng_state(extra['engine_rng'])
+        print(f"Resumed from {checkpoint_path} at episode {start_episode}.")
+    elif is_dqn and buffer_path is not None:
+        # a fresh run must not sample the transitions of an old one
+        agent.buffer.clear()
+
+    # training state that isn't part of the agent, stored with every checkpoint
+    def save_checkpoint(episode):
+        agent.save_checkpoint(checkpoint_path, episode=episode, placements=placements,
+                              score_window=list(score_window), engine_rng=env.get_rng_state())
+
+    try:
+        for episode in range(start_episode, episodes):
+            board = env.reset()
+            game_over = False
+            pieces = 0
+            state_after = get_features(board)
+
+            while not game_over:
+                # the afterstate of the previous move, no need to recompute it
+                state_before = state_after
+
+                if use_arrays:
+                    with telemetry.phase('moves'):
+                        actions, features, rewards, game_overs = env.get_next_arrays()
+                    if not actions:
+                        break
+                    with telemetry.phase('act'):
+                        action = agent.act_arrays(actions, features, rewards, game_overs)
+                else:
+                    with telemetry.phase('moves'):
+                        possible_moves = env.get_next_states()
+                    if not possible_moves:
+                        break
+                    with telemetry.phase('act'):
+                        if is_dqn:
+                            action = agent.act(possible_moves, env.next_features)
+                        else:
+                            action = agent.select_action(possible_moves, env.next_features)
+
+                with telemetry.phase('step'):
+                    reward, game_over = env.step(action)
+
+                # the agent already has the features of the afterstate it picked
+                state_after = agent.chosen_features
+
+                if is_dqn:
+                    with telemetry.phase('insert'):
+                        agent.buffer.save(state_before, reward, state_after, game_over)
+                    placements += 1
+                    if placements % learn_every == 0 and agent.buffer.size() >= warmup:
+                        for _ in range(gradient_steps):
+                            agent.learn()
+                else:
+                    with telemetry.phase('update'):
+                        agent.update(state_before, reward, state_after, game_over)
+                telemetry.count('pieces')
+
+                pieces += 1
+                # to avoid infinitely going game problem, set a limit to max pieces
+                if max_pieces is not None and pieces >= max_pieces:
+                    game_over = True
+
+            score_window.append(env.score)
+
+            # decay exploration (and the tabular learning rate) over time
+            agent.update_epsilon()
+
+            if (episode + 1) % report_every == 0:
+                avg = sum(score_window) / len(score_window)
+                if is_dqn:
+                    print(f"Episode: {episode + 1} | Score: {env.score} | Avg100: {avg:.1f} | "
+                          f"Epsilon: {agent.epsilon:.3f} | Buffer: {agent.buffer.size()} | "
+                          f"Learn steps: {agent.learn_steps}")
+                    telemetry.report(episode=episode + 1, score=env.score, avg100=avg,
+                                     epsilon=agent.epsilon, buffer=agent.buffer.size())
+                else:
+                    print(f"Episode: {episode + 1} | Score: {env.score} | Avg100: {avg:.1f} | "
+                          f"Epsilon: {agent.epsilon:.3f} | LR: {agent.learning_rate:.4f} | "
+                          f"States: {agent.num_states()}")
+                    telemetry.report(episode=episode + 1, score=env.score, avg100=avg,
+                                     epsilon=agent.epsilon, states=agent.num_states())
+
+            if checkpoint_path is not None and (episode + 1) % checkpoint_every == 0:
+                with telemetry.phase('checkpoint'):
+                    save_checkpoint(episode + 1)
+
+        if checkpoint_path is not None and episodes % checkpoint_every != 0 and episodes > start_episode:
+            save_checkpoint(episodes)
+    finally:
+        telemetry.close()
+
+    cache_stats = agent.cache_stats()
+    if cache_stats is not None:
+        for name, stats in cache_stats.items():
+            print(f"{name.capitalize()} cache: {stats['hits']} hits, {stats['misses']} misses "
+                  f"({stats['hit_rate']:.1%}), {stats['evictions']} evictions.")
+
+    if save_path is not None:
+        agent.save(save_path)
+        print(f"Saved the trained policy to {save_path}.")
+
+    return agent
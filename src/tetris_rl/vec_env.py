@@ -0,0 +1,257 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from tetris_rl.environment import BOARD_HEIGHT, TETROMINOS
+from tetris_rl.bitboard import FULL_ROW, PLACEMENTS, ROW_TABLE
+
+# runs N games in lockstep with the boards stored as one (N, 20) array of row masks
+# (same bit layout as bitboard.py), all candidate placements of all games are generated
+# with array operations so agents can score them with one batched call
+
+PIECE_NAMES = list(TETROMINOS.keys())
+NUM_PIECES = len(PIECE_NAMES)
+
+# piece rows are stored for dy = -1..2, the full range used by TETROMINOS
+MIN_DY = -1
+PIECE_ROWS = 4
+
+ROW_TABLE_U8 = ROW_TABLE.astype(np.uint8)
+
+
+# flattens bitboard.PLACEMENTS into arrays indexed by placement number
+# placements of piece p are PLACEMENT_START[p] .. PLACEMENT_START[p] + PLACEMENT_COUNT[p],
+# in (rotation, x) order
+def build_placement_tables():
+    rotations, xs, masks, min_dys, counts = [], [], [], [], []
+
+    for name in PIECE_NAMES:
+        count = 0
+        for rot_idx, options in enumerate(PLACEMENTS[name]):
+            for (x, cells, _, min_dy) in options:
+                row_masks = [0] * PIECE_ROWS
+                for (dy, mask) in cells:
+                    row_masks[dy - MIN_DY] = mask
+                rotations.append(rot_idx)
+                xs.append(x)
+                masks.append(row_masks)
+                min_dys.append(min_dy)
+                count += 1
+        counts.append(count)
+
+    counts = np.array(counts)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    return (np.array(rotations), np.array(xs), np.array(masks, dtype=np.int64),
+            np.array(min_dys), starts, counts)
+
+
+(PLACEMENT_ROTATION, PLACEMENT_X, PLACEMENT_MASKS,
+ PLACEMENT_MIN_DY, PLACEMENT_START, PLACEMENT_COUNT) = build_placement_tables()
+
+
+# converts an (N, 20) array of row masks into an (N, 20, 10) uint8 board stack
+def rows_to_boards(rows):
+    return ROW_TABLE_U8[rows]
+
+
+# generates every legal placement for every (board, piece) pair
+# rows: (N, 20) row masks, pieces: (N,) piece indices into PIECE_NAMES
+# returns a dict of flat arrays with one entry per candidate, grouped by board:
+#   env       -> which board the candidate belongs to
+#   rotation  -> rotation index
+#   x         -> column offset
+#   rows      -> (K, 20) row masks of the afterstate (lines already cleared)
+#   lines     -> number of lines cleared
+#   reward    -> same reward scheme as environment.TetrisEngine
+#   game_over -> if the afterstate has a block in the top row
+#   offsets   -> (N + 1,) candidates of board i are offsets[i]:offsets[i + 1]
+def generate_placements(rows, pieces):
+    rows = np.asarray(rows, dtype=np.int64)
+    pieces = np.asarray(pieces)
+    num_boards = len(rows)
+
+    # expand every board into all placements of its piece
+    counts = PLACEMENT_COUNT[pieces]
+    env = np.repeat(np.arange(num_boards), counts)
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    placement = np.repeat(PLACEMENT_START[pieces], counts) + np.arange(len(env)) - first
+    masks = PLACEMENT_MASKS[placement]
+
+    # pad one empty row above the board (for cells at dy = -1) and full rows
+    # below it so the floor behaves like any other block
+    padded = np.zeros((len(env), BOARD_HEIGHT + PIECE_ROWS), dtype=np.int64)
+    padded[:, 1:BOARD_HEIGHT + 1] = rows[env]
+    padded[:, BOARD_HEIGHT + 1:] = FULL_ROW
+
+    # collides[k, y] -> the piece of candidate k overlaps something at row y
+    windows = sliding_window_view(padded, PIECE_ROWS, axis=1)
+    collides = (windows & masks[:, None, :]).any(axis=2)
+
+    # the piece must fit at the top, then it falls until the next row collides
+    y = collides[:, 1:].argmax(axis=1)
+    valid = ~collides[:, 0] & (y + PLACEMENT_MIN_DY[placement] >= 0)
+
+    env, placement, masks, y = env[valid], placement[valid], masks[valid], y[valid]
+    next_rows = rows[env]
+
+    # lock the piece rows into the boards
+    for k in range(PIECE_ROWS):
+        has_row = masks[:, k] != 0
+        target = y[has_row] + k + MIN_DY
+        next_rows[has_row, target] |= masks[has_row, k]
+
+    # clear full lines by moving full rows to the top (stable sort) and emptying them
+    full = next_rows == FULL_ROW
+    lines = full.sum(axis=1)
+    cleared = lines > 0
+    if cleared.any():
+        order = np.argsort(~full[cleared], axis=1, kind='stable')
+        shifted = np.take_along_axis(next_rows[cleared], order, axis=1)
+        shifted[np.arange(BOARD_HEIGHT) < lines[cleared][:, None]] = 0
+        next_rows[cleared] = shifted
+
+    game_over = next_rows[:, 0] != 0
+    reward = (1.0 + (lines ** 2) * 10 - 25.0 * game_over).astype(np.float32)
+
+    offsets = np.zeros(num_boards + 1, dtype=np.int64)
+    np.cumsum(np.bincount(env, minlength=num_boards), out=offsets[1:])
+
+    return {
+        'env': env,
+        'rotation': PLACEMENT_ROTATION[placement],
+        'x': PLACEMENT_X[placement],
+        'rows': next_rows,
+        'lines': lines,
+        'reward': reward,
+        'game_over': game_over,
+        'offsets': offsets,
+    }
+
+
+class VecTetrisEngine:
+    def __init__(self, num_envs, seed=None):
+        self.num_envs = num_envs
+        self.rng = np.random.default_rng(seed)
+        self.reset()
+
+    # resets every game and returns the (N, 20, 10) board stack
+    def reset(self):
+        self.rows = np.zeros((self.num_envs, BOARD_HEIGHT), dtype=np.int64)
+        self.scores = np.zeros(self.num_envs)
+        self.pieces_placed = np.zeros(self.num_envs, dtype=np.int64)
+        self.current_pieces = self.get_new_pieces(self.num_envs)
+
+        # score and length of the games that finished on the last step
+        self.final_scores = np.zeros(self.num_envs)
+        self.final_pieces = np.zeros(self.num_envs, dtype=np.int64)
+
+        self.candidates = None
+
+        return self.boards
+
+    # resets only the games selected by a boolean mask
+    def reset_envs(self, mask):
+        count = int(np.count_nonzero(mask))
+        self.rows[mask] = 0
+        self.scores[mask] = 0
+        self.pieces_placed[mask] = 0
+        self.current_pieces[mask] = self.get_new_pieces(count)
+
+    def get_new_pieces(self, count):
+        return self.rng.integers(0, NUM_PIECES, size=count)
+
+    # the (N, 20, 10) board stack, built on demand from the row masks
+    @property
+    def boards(self):
+        return rows_to_boards(self.rows)
+
+    # generates all candidate placements for all games in one call
+    # (see generate_placements for the returned arrays), plus a 'board' entry
+    # with the (K, 20, 10) afterstate boards
+    def get_next_states(self):
+        candidates = generate_placements(self.rows, self.current_pieces)
+        candidates['board'] = rows_to_boards(candidates['rows'])
+
+        self.candidates = candidates
+        return candidates
+
+    # picks a uniformly random candidate for every game (-1 if a game has none)
+    def random_actions(self):
+        offsets = self.candidates['offsets']
+        counts = np.diff(offsets)
+        picks = offsets[:-1] + (self.rng.random(self.num_envs) * counts).astype(np.int64)
+
+        return np.where(counts > 0, picks, -1)
+
+    # applies one action per game, where actions[i] is the index of the chosen
+    # candidate in the arrays from the last get_next_states call
+    # a negative index, or an index outside game i's candidates, is an illegal move
+    # finished games are reset automatically, their final score is kept in final_scores
+    # returns (rewards, dones) arrays
+    def step(self, actions):
+        if self.candidates is None:
+            raise RuntimeError("get_next_states must be called before step")
+
+        actions = np.asarray(actions, dtype=np.int64)
+        offsets = self.candidates['offsets']
+        legal = (actions >= offsets[:-1]) & (actions < offsets[1:])
+
+        # if an illegal move is attempted, end the game with negative reward
+        rewards = np.full(self.num_envs, -10.0)
+        dones = np.ones(self.num_envs, dtype=bool)
+
+        chosen = actions[legal]
+        self.rows[legal] = self.candidates['rows'][chosen]
+        rewards[legal] = self.candidates['reward'][chosen]
+        dones[legal] = self.candidates['game_over'][chosen]
+
+        self.scores[legal] += rewards[legal]
+        self.pieces_placed[legal] += 1
+        self.current_pieces = self.get_new_pieces(self.num_envs)
+
+        self.final_scores[dones] = self.scores[dones]
+        self.final_pieces[dones] = self.pieces_placed[dones]
+        self.reset_envs(dones)
+
+        self.candidates = None
+
+        return rewards, dones
+
+
+if __name__ == "__main__":
+    import time
+    from tetris_rl.bitboard import BitboardTetrisEngine
+
+    # every candidate of the vectorized generator must match the bitboard engine
+    env = VecTetrisEngine(64, seed=0)
+    reference = BitboardTetrisEngine()
+    for _ in range(200):
+        candidates = env.get_next_states()
+        for i in range(env.num_envs):
+            reference.set_rows(int(row) for row in env.rows[i])
+            name = PIECE_NAMES[env.current_pieces[i]]
+            reference.current_piece = {'name': name, 'rotations': TETROMINOS[name]}
+            expected = reference.get_next_states()
+
+            start, end = candidates['offsets'][i], candidates['offsets'][i + 1]
+            actions = list(zip(candidates['rotation'][start:end], candidates['x'][start:end]))
+            assert sorted(expected) == actions
+            for k, action in zip(range(start, end), actions):
+                board, reward, game_over = expected[action]
+                assert np.array_equal(board, candidates['board'][k])
+                assert reward == candidates['reward'][k]
+                assert game_over == candidates['game_over'][k]
+
+        env.step(env.random_actions())
+
+    print("VecTetrisEngine matches the bitboard engine.")
+
+    for num_envs in (1, 16, 256):
+        env = VecTetrisEngine(num_envs, seed=0)
+        placements = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < 2.0:
+            env.get_next_states()
+            env.step(env.random_actions())
+            placements += num_envs
+        elapsed = time.perf_counter() - start
+        print(f"{num_envs} envs: {placements / elapsed:.0f} placements/sec")